@@ -1,38 +1,206 @@
-from fastapi import APIRouter, HTTPException, Depends
+import os
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from app.services.backup_restore_services import BackupRestoreServices
-from app.database.session import get_db
+from app.services.jobs import JobService, get_job_runner, job_reference
+from app.database.session import get_db, SessionLocal
+from app.config import BACKUP_CODEC, BACKUP_SYNC_INTERVAL, RESTORE_BATCH_SIZE
 
 router = APIRouter()
 
+def submit_job(db: Session, kind: str, params: dict, files: list = ()) -> JSONResponse:
+    """
+    Registra un trabajo en segundo plano y devuelve su id para consultarlo en `GET /jobs/{id}`.
+    """
+    try:
+        job_id = JobService(db.get_bind()).create_job(kind, params, files)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error registrando el trabajo: {str(e)}")
+    get_job_runner().submit(job_id)
+    return JSONResponse(status_code=202, content=job_reference(job_id))
+
 @router.post("/backup/{table_name}/")
-def backup_table_endpoint(table_name: str, db: Session = Depends(get_db)):
+def backup_table_endpoint(
+    table_name: str,
+    codec: str = BACKUP_CODEC,
+    sync_interval: int = BACKUP_SYNC_INTERVAL,
+    background: bool = False,  # Ejecutar el backup como un trabajo en segundo plano
+    db: Session = Depends(get_db)
+):
     """
     Endpoint para realizar un backup de una tabla específica en formato Avro.
     """
     file_path = f"/tmp/{table_name}_backup.avro"
+    if background:
+        file = {"file_name": f"{table_name}_backup.avro", "table_name": table_name, "file_path": file_path}
+        return submit_job(db, "backup", {"codec": codec, "sync_interval": sync_interval}, [file])
+
     try:
         # Realizar el backup de la tabla
         backup_service = BackupRestoreServices(db)
-        backup_service.backup_table(table_name, file_path)
-        
-        return {"message": f"Backup de la tabla '{table_name}' creado exitosamente.", "file_path": file_path}
+        size = backup_service.backup_table(table_name, file_path, codec, sync_interval)
+
+        return {"message": f"Backup de la tabla '{table_name}' creado exitosamente.", "file_path": file_path, "bytes": size}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creando el backup: {str(e)}")
+
+@router.get("/backup/{table_name}/download")
+def download_backup_endpoint(
+    table_name: str,
+    codec: str = BACKUP_CODEC,
+    sync_interval: int = BACKUP_SYNC_INTERVAL,
+):
+    """
+    Endpoint para descargar el backup de una tabla en formato Avro a medida que se genera.
+    También deja una copia en el archivo de backup de la tabla.
+    """
+    file_path = f"/tmp/{table_name}_backup.avro"
+
+    # El generador usa su propia sesión, ya que se consume después de que el endpoint retorna
+    session = SessionLocal()
+    try:
+        stream = BackupRestoreServices(session).stream_backup_table(table_name, file_path, codec, sync_interval)
+        first_chunk = next(stream)
     except Exception as e:
+        session.close()
         raise HTTPException(status_code=500, detail=f"Error creando el backup: {str(e)}")
 
+    def content():
+        try:
+            yield first_chunk
+            yield from stream
+        finally:
+            stream.close()
+            session.close()
+
+    headers = {
+        "Content-Disposition": f"attachment; filename={table_name}_backup.avro"
+    }
+    return StreamingResponse(content(), media_type="application/avro", headers=headers)
+
 @router.post("/restore/{table_name}/")
-def restore_table_endpoint(table_name: str, db: Session = Depends(get_db)):
+def restore_table_endpoint(
+    table_name: str,
+    mode: str = "append",  # 'append' agrega las filas; 'swap' reemplaza el contenido de forma atómica; 'merge' inserta o actualiza por llave primaria
+    batch_size: int = RESTORE_BATCH_SIZE,
+    background: bool = False,  # Ejecutar la restauración como un trabajo reanudable en segundo plano
+    defer_indexes: bool = False,  # Eliminar los índices no únicos durante la carga y reconstruirlos al terminar
+    db: Session = Depends(get_db)
+):
     """
     Endpoint para restaurar una tabla desde un archivo de backup en formato Avro.
     """
+    if mode not in ("append", "swap", "merge"):
+        raise HTTPException(status_code=400, detail="Modo no soportado. Usa 'append', 'swap' o 'merge'.")
+
     file_path = f"/tmp/{table_name}_backup.avro"
+    if background:
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail=f"No se encontró el archivo de backup para la tabla '{table_name}'.")
+        file = {"file_name": os.path.basename(file_path), "table_name": table_name, "file_path": file_path, "size": os.path.getsize(file_path)}
+        return submit_job(db, "restore", {"mode": mode, "batch_size": batch_size, "defer_indexes": defer_indexes}, [file])
+
     try:
         # Restaurar la tabla desde el backup
         backup_service = BackupRestoreServices(db)
-        backup_service.restore_table(db,table_name, file_path)
-        return {"message": f"Tabla '{table_name}' restaurada exitosamente desde el backup.", "file_path": file_path}
+        stats = backup_service.restore_table(db, table_name, file_path, mode, batch_size, defer_indexes=defer_indexes)
+        return {"message": f"Tabla '{table_name}' restaurada exitosamente desde el backup.", "file_path": file_path, "stats": stats}
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"No se encontró el archivo de backup para la tabla '{table_name}'.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error restaurando la tabla: {str(e)}")
 
+@router.post("/backup/")
+def backup_database_endpoint(
+    tables: Optional[List[str]] = Query(None),  # Por defecto, todas las tablas de la metadata
+    codec: str = BACKUP_CODEC,
+    background: bool = False,  # Crear el snapshot como un trabajo en segundo plano
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint para crear un backup consistente (snapshot) de varias tablas, exportadas en paralelo.
+    """
+    if background:
+        return submit_job(db, "snapshot", {"tables": tables, "codec": codec})
+
+    try:
+        backup_service = BackupRestoreServices(db)
+        manifest = backup_service.backup_database(tables, codec)
+        return {"message": f"Snapshot '{manifest['snapshot']}' creado exitosamente.", "manifest": manifest}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creando el snapshot: {str(e)}")
+
+@router.post("/restore/snapshot/{snapshot_name}/")
+def restore_database_endpoint(
+    snapshot_name: str,
+    tables: Optional[List[str]] = Query(None),  # Por defecto, todas las tablas del snapshot
+    mode: str = "append",
+    defer_indexes: bool = False,  # Eliminar los índices no únicos durante la carga y reconstruirlos al terminar
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint para restaurar en paralelo, en orden de llaves foráneas, las tablas de un snapshot.
+    """
+    if mode not in ("append", "swap"):
+        raise HTTPException(status_code=400, detail="Modo no soportado. Usa 'append' o 'swap'.")
+
+    try:
+        backup_service = BackupRestoreServices(db)
+        results = backup_service.restore_database(snapshot_name, tables, mode, defer_indexes=defer_indexes)
+        return {"snapshot": snapshot_name, "results": results}
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No se encontró el snapshot '{snapshot_name}'.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error restaurando el snapshot: {str(e)}")
+
+@router.post("/backup/{table_name}/incremental")
+def backup_incremental_endpoint(
+    table_name: str,
+    watermark_column: Optional[str] = None,  # Por defecto, la llave primaria de la metadata
+    full: bool = False,  # Forzar un nuevo backup base
+    codec: str = BACKUP_CODEC,
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint para crear un backup incremental (o base) de una tabla y registrarlo en el catálogo.
+    """
+    try:
+        backup_service = BackupRestoreServices(db)
+        entry = backup_service.backup_incremental(table_name, watermark_column, full, codec)
+        return {"message": f"Backup {entry['backup_type']} de la tabla '{table_name}' creado exitosamente.", "backup": entry}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creando el backup incremental: {str(e)}")
+
+@router.get("/backup/{table_name}/catalog")
+def backup_catalog_endpoint(table_name: str, db: Session = Depends(get_db)):
+    """
+    Endpoint para consultar el catálogo de backups base e incrementales de una tabla.
+    """
+    try:
+        backup_service = BackupRestoreServices(db)
+        return {"table_name": table_name, "backups": backup_service.list_backup_catalog(table_name)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error consultando el catálogo de backups: {str(e)}")
+
+@router.post("/restore/{table_name}/chain/")
+def restore_backup_chain_endpoint(
+    table_name: str,
+    base_id: Optional[int] = None,  # Por defecto, el backup base más reciente
+    mode: str = "append",
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint para restaurar una tabla desde un backup base seguido de sus incrementales.
+    """
+    if mode not in ("append", "swap"):
+        raise HTTPException(status_code=400, detail="Modo no soportado. Usa 'append' o 'swap'.")
+
+    try:
+        backup_service = BackupRestoreServices(db)
+        return backup_service.restore_backup_chain(table_name, base_id, mode)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"No se encontró el backup: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error restaurando la cadena de backups: {str(e)}")
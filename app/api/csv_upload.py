@@ -1,7 +1,11 @@
-import os
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from app.services.csv_loader import CSVLoaderService
+from app.services.ingest_scheduler import IngestSchedulerService
+from app.services.jobs import JobService, get_job_runner, job_reference
+from app.services.merge_loader import LOAD_MODES
+from app.services.schema_registry import schema_registry
 from app.database.session import get_db
 
 router = APIRouter()
@@ -9,61 +13,81 @@ router = APIRouter()
 @router.post("/upload-metadata/")
 def upload_metadata(
     file: UploadFile = File(...),
+    mode: str = "sync",  # 'sync' sincroniza por (table_name, column_name); 'append' solo inserta
     db: Session = Depends(get_db)
 ):
     """
     Cargar la metadata desde un archivo CSV en la tabla `metadata`.
+    El archivo se lee directamente desde la subida, sin copiarlo a un archivo temporal.
     """
-    # Guardar el archivo temporalmente
-    temp_file_path = f"/tmp/{file.filename}"
-    with open(temp_file_path, "wb") as f:
-        f.write(file.file.read())
+    if mode not in ("sync", "append"):
+        raise HTTPException(status_code=400, detail="Modo no soportado. Usa 'sync' o 'append'.")
 
     try:
         # Inicializar el servicio CSV con la sesión
         csv_service = CSVLoaderService(db)
 
         # Cargar la metadata desde el archivo
-        csv_service.load_table_structures(temp_file_path)
+        summary = csv_service.load_table_structures(file.file, mode)
 
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error procesando la metadata: {str(e)}"
         )
-    finally:
-        os.remove(temp_file_path)
 
-    return {"message": f"Metadata cargada correctamente desde {file.filename}."}
+    return {"message": f"Metadata cargada correctamente desde {file.filename}.", "changes": summary}
 
 @router.post("/upload-csv/")
 def upload_multiple_csv(
     files: list[UploadFile] = File(...),  # Acepta múltiples archivos CSV
+    mode: str = "append",  # 'append' inserta las filas; 'merge' inserta las nuevas y actualiza las existentes
+    background: bool = False,  # Devolver de inmediato el id de un trabajo que carga los archivos
+    defer_indexes: bool = False,  # Eliminar los índices no únicos durante la carga y reconstruirlos al terminar
     db: Session = Depends(get_db)
 ):
     """
     Endpoint para cargar múltiples archivos CSV en las tablas definidas por la metadata.
+    Cada archivo se procesa en streaming con memoria acotada por `UPLOAD_BUFFER_SIZE`.
+    Las tablas independientes se cargan en paralelo, respetando el orden de las llaves foráneas.
+    Cada resultado incluye las filas cargadas, las rechazadas por motivo y el archivo de cuarentena.
+    Con `background=true` los archivos se guardan en disco y se cargan en un trabajo en segundo plano,
+    confirmando cada bloque; el avance se consulta en `GET /jobs/{id}`.
     """
-    try:
-        csv_service = CSVLoaderService(db)  # Servicio de carga de CSV
+    if mode not in LOAD_MODES:
+        raise HTTPException(status_code=400, detail="Modo no soportado. Usa 'append' o 'merge'.")
 
-        results = []  # Para almacenar el estado de cada archivo
+    if background:
+        try:
+            job_id = JobService(db.get_bind()).create_csv_job([(file.filename, file.file) for file in files], mode, defer_indexes)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error registrando el trabajo de carga: {str(e)}")
+        get_job_runner().submit(job_id)
+        return JSONResponse(status_code=202, content=job_reference(job_id))
+
+    try:
+        scheduler = IngestSchedulerService(db)  # Planificador de carga de CSV
 
-        for file in files:
-            temp_file_path = f"/tmp/{file.filename}"  # Ruta temporal para cada archivo
-            with open(temp_file_path, "wb") as f:
-                f.write(file.file.read())
+        # Cargar en la base de datos leyendo cada subida por bloques
+        uploads = [(CSVLoaderService.table_name_from_filename(file.filename), file.file) for file in files]
+        outcomes = scheduler.load_files(uploads, mode=mode, defer_indexes=defer_indexes)
 
-            try:
-                csv_service.load_csv_to_table(temp_file_path)  # Cargar en la base de datos
-                results.append({"filename": file.filename, "status": "success"})
-            except Exception as e:
-                results.append({"filename": file.filename, "status": "error", "detail": str(e)})
-            finally:
-                os.remove(temp_file_path)  # Eliminar archivo temporal
+        results = []  # Para almacenar el estado de cada archivo
+        for file, outcome in zip(files, outcomes):
+            if isinstance(outcome, Exception):
+                results.append({"filename": file.filename, "status": "error", "detail": str(outcome)})
+            else:
+                results.append({"filename": file.filename, "status": "success", **outcome})
 
         return {"results": results}  # Devuelve un informe para todos los archivos
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando los archivos CSV: {str(e)}")
 
+
+@router.get("/schema-registry/stats")
+def schema_registry_stats():
+    """
+    Devuelve los contadores de aciertos y fallos del registro de esquemas.
+    """
+    return schema_registry.stats()
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.instrumentation import instrumentation
+
+router = APIRouter()
+
+
+@router.get("/internal/stats", response_class=PlainTextResponse)
+def internal_stats():
+    """
+    Expone en formato Prometheus las latencias por ruta, los tiempos por etapa,
+    el estado del pool de conexiones y las filas por segundo de las cargas.
+    """
+    return PlainTextResponse(instrumentation.render(), media_type="text/plain; version=0.0.4")
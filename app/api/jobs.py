@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from app.services.jobs import JobNotResumable, JobService, get_job_runner, job_reference
+from app.database.session import get_db
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}")
+def get_job_endpoint(job_id: str, db: Session = Depends(get_db)):
+    """
+    Endpoint para consultar el estado de un trabajo: filas cargadas, velocidad y avance de cada archivo.
+    """
+    job = JobService(db.get_bind()).get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No se encontró el trabajo '{job_id}'.")
+    return job
+
+@router.post("/jobs/{job_id}/resume")
+def resume_job_endpoint(job_id: str, db: Session = Depends(get_db)):
+    """
+    Endpoint para reanudar un trabajo fallido o interrumpido desde sus últimos puntos de control.
+    """
+    try:
+        if not JobService(db.get_bind()).check_resumable(job_id):
+            raise HTTPException(status_code=404, detail=f"No se encontró el trabajo '{job_id}'.")
+    except JobNotResumable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    get_job_runner().submit(job_id)
+    return JSONResponse(status_code=202, content=job_reference(job_id))
@@ -1,86 +1,253 @@
-from fastapi import APIRouter, Depends, HTTPException
+import itertools
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from app.database.session import get_db
-from app.services.metrics_service import MetricsService
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response
+from app.services.metrics_service import MetricFilters, MetricsService
+from app.services.result_cache import data_versions, metrics_cache, make_etag, etag_matches
+from app.services.metrics_export import EXPORT_FORMATS, MetricsExporter, validate_export_format
+from app.services.chart_renderer import CHART_FORMATS, validate_chart_options
+from app.config import METRICS_CACHE_MAX_BODY, METRICS_DEFAULT_YEAR
+from fastapi.responses import Response, StreamingResponse
 
 router = APIRouter()
 
-@router.get("/metrics/employees-per-quarter")
-def employees_per_quarter(format: str = "json", db: Session = Depends(get_db)):
+# Tablas de las que depende cada métrica: sus versiones forman parte de la clave de caché
+METRIC_TABLES = {
+    "employees_per_quarter": ("hired_employees", "departments", "jobs", "hiring_rollup"),
+    "above_average_departments": ("hired_employees", "departments", "hiring_rollup"),
+}
+
+
+def metric_filters(
+    year: int = METRICS_DEFAULT_YEAR,
+    quarter_from: int = 1,
+    quarter_to: int = 4,
+    department_id: int = None,
+    job_id: int = None,
+) -> MetricFilters:
     """
-    Endpoint para generar un reporte de empleados contratados por trimestre en 2021.
+    Filtros opcionales de las métricas tomados de la URL; sin parámetros se usan el año por defecto y todo el año.
     """
     try:
-        metrics_service = MetricsService(db)
-        df = metrics_service.get_employees_per_quarter()
-
-        if format == "json":
-            data = metrics_service.generate_file(df, format, "employees_per_quarter.json")
-            return JSONResponse(content=data)
-        elif format in ["csv", "html"]:
-            file_path = metrics_service.generate_file(df, format, f"employees_per_quarter.{format}")
-            return FileResponse(file_path, media_type=f"text/{format}", filename=f"employees_per_quarter.{format}")
-        else:
-            raise HTTPException(status_code=400, detail="Formato no soportado. Usa 'json', 'csv' o 'html'.")
+        return MetricFilters(year, quarter_from, quarter_to, department_id, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def get_metric_result(metrics_service: MetricsService, metric: str, versions: tuple, filters: MetricFilters):
+    """
+    Obtiene el DataFrame de una métrica desde la caché o ejecutando su consulta.
+    """
+    compute = getattr(metrics_service, f"get_{metric}")
+    return metrics_cache.get_or_compute((metric, "result", filters.key(), versions), lambda: compute(filters))
+
+
+def cached_response(request: Request, key: tuple, build, headers: dict = None) -> Response:
+    """
+    Responde con el contenido en caché para la clave (o lo genera con `build`), agregando su ETag.
+    Si el cliente ya tiene esa versión (`If-None-Match`), responde 304 sin consultar la base de datos.
+    """
+    etag = make_etag(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    body, media_type = metrics_cache.get_or_compute(key, build)
+    return Response(body, media_type=media_type, headers={"ETag": etag, **(headers or {})})
+
+
+def report_context(request: Request, metric: str, format: str, filters: MetricFilters):
+    """
+    Valida el formato de un reporte y resuelve la solicitud sin consultar la base de datos cuando es posible.
+    Devuelve (respuesta, clave, encabezados, tipo de contenido); la respuesta es None si hay que generar el reporte.
+    """
+    try:
+        validate_export_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    versions = data_versions.snapshot(METRIC_TABLES[metric])
+    key = (metric, format, filters.key(), versions)
+    etag = make_etag(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag}), key, None, None
+
+    headers = {"ETag": etag}
+    if format != "json":
+        headers["Content-Disposition"] = f"attachment; filename={metric}.{format}"
+    media_type = EXPORT_FORMATS[format]
+
+    cached = metrics_cache.get(key)
+    if cached is not None:
+        return Response(cached, media_type=media_type, headers=headers), key, headers, media_type
+    return None, key, headers, media_type
+
+
+class BodyCollector:
+    """
+    Acumula los bloques de una respuesta en streaming para guardarla en caché si no supera el tamaño máximo.
+    """
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.chunks = []
+        self.size = 0
+
+    def add(self, chunk: bytes):
+        if self.chunks is None:
+            return
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size > METRICS_CACHE_MAX_BODY:
+            self.chunks = None
+
+    def store(self):
+        if self.chunks is not None:
+            metrics_cache.set(self.key, b"".join(self.chunks))
+
+
+def metric_report(request: Request, db: Session, metric: str, format: str, filters: MetricFilters) -> Response:
+    """
+    Genera el reporte de una métrica en el formato solicitado (json, ndjson, csv, html o parquet).
+    Las filas se envían en streaming desde el cursor; si el resultado es pequeño se guarda en caché
+    mientras se envía, y las siguientes solicitudes lo responden desde memoria.
+    """
+    response, key, headers, media_type = report_context(request, metric, format, filters)
+    if response is not None:
+        return response
+
+    try:
+        chunks = MetricsExporter(db.get_bind()).stream(metric, format, filters)
+        first_chunk = next(chunks)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando métricas: {str(e)}")
 
+    def content():
+        collector = BodyCollector(key)
+        try:
+            for chunk in itertools.chain([first_chunk], chunks):
+                collector.add(chunk)
+                yield chunk
+        finally:
+            # Cierra la sesión de la exportación aunque el cliente se desconecte
+            chunks.close()
+        collector.store()
+
+    return StreamingResponse(content(), media_type=media_type, headers=headers)
+
+
+@router.get("/metrics/employees-per-quarter")
+def employees_per_quarter(
+    request: Request,
+    format: str = "json",
+    filters: MetricFilters = Depends(metric_filters),
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint para generar un reporte de empleados contratados por trimestre (2021 por defecto).
+    Acepta `year`, `quarter_from`, `quarter_to`, `department_id` y `job_id`.
+    """
+    return metric_report(request, db, "employees_per_quarter", format, filters)
 
 
 @router.get("/metrics/above-average-departments")
-def above_average_departments(format: str = "json", db: Session = Depends(get_db)):
+def above_average_departments(
+    request: Request,
+    format: str = "json",
+    filters: MetricFilters = Depends(metric_filters),
+    db: Session = Depends(get_db)
+):
     """
     Endpoint para generar un reporte de departamentos que contrataron más empleados que el promedio.
+    Acepta los mismos filtros que el reporte por trimestre.
     """
-    try:
-        metrics_service = MetricsService(db)
-        df = metrics_service.get_above_average_departments()
-
-        if format == "json":
-            data = metrics_service.generate_file(df, format, "above_average_departments.json")
-            return JSONResponse(content=data)
-        elif format in ["csv", "html"]:
-            file_path = metrics_service.generate_file(df, format, f"above_average_departments.{format}")
-            return FileResponse(file_path, media_type=f"text/{format}", filename=f"above_average_departments.{format}")
-        else:
-            raise HTTPException(status_code=400, detail="Formato no soportado. Usa 'json', 'csv' o 'html'.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generando métricas: {str(e)}")
-    
+    return metric_report(request, db, "above_average_departments", format, filters)
+
+
 @router.get("/metrics/employees-per-quarter/chart")
-def employees_per_quarter_chart(db: Session = Depends(get_db)):
+def employees_per_quarter_chart(
+    request: Request,
+    format: str = "png",  # 'png' o 'svg'
+    dpi: int = 100,
+    filters: MetricFilters = Depends(metric_filters),
+    db: Session = Depends(get_db)
+):
     """
-    Genera un gráfico de barras para empleados contratados por trimestre en 2021 y lo devuelve para descarga.
+    Genera un gráfico de barras para empleados contratados por trimestre (2021 por defecto) y lo devuelve para descarga.
     """
     try:
+        validate_chart_options(format, dpi)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    versions = data_versions.snapshot(METRIC_TABLES["employees_per_quarter"])
+
+    def build():
         metrics_service = MetricsService(db)
-        df = metrics_service.get_employees_per_quarter()
-        buffer = metrics_service.generate_employees_per_quarter_chart_in_memory(df)
+        df = get_metric_result(metrics_service, "employees_per_quarter", versions, filters)
+        buffer = metrics_service.generate_employees_per_quarter_chart_in_memory(df, format, dpi, filters.year)
+        return buffer.getvalue(), CHART_FORMATS[format]
 
-        headers = {
-            "Content-Disposition": "attachment; filename=employees_per_quarter_chart.png"
-        }
-        return Response(buffer.getvalue(), media_type="image/png", headers=headers)
+    headers = {
+        "Content-Disposition": f"attachment; filename=employees_per_quarter_chart.{format}"
+    }
+    try:
+        return cached_response(request, ("employees_per_quarter", "chart", format, dpi, filters.key(), versions), build, headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando el gráfico: {str(e)}")
 
 
 @router.get("/metrics/above-average-departments/chart")
-def above_average_departments_chart(db: Session = Depends(get_db)):
+def above_average_departments_chart(
+    request: Request,
+    format: str = "png",  # 'png' o 'svg'
+    dpi: int = 100,
+    filters: MetricFilters = Depends(metric_filters),
+    db: Session = Depends(get_db)
+):
     """
-    Genera un gráfico de barras para departamentos con contrataciones por encima del promedio en 2021 y lo devuelve para descarga.
+    Genera un gráfico de barras para departamentos con contrataciones por encima del promedio (2021 por defecto) y lo devuelve para descarga.
     """
     try:
+        validate_chart_options(format, dpi)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    versions = data_versions.snapshot(METRIC_TABLES["above_average_departments"])
+
+    def build():
         metrics_service = MetricsService(db)
-        df = metrics_service.get_above_average_departments()
-        buffer = metrics_service.generate_above_average_departments_chart_in_memory(df)
+        df = get_metric_result(metrics_service, "above_average_departments", versions, filters)
+        buffer = metrics_service.generate_above_average_departments_chart_in_memory(df, format, dpi, filters.year)
+        return buffer.getvalue(), CHART_FORMATS[format]
 
-        headers = {
-            "Content-Disposition": "attachment; filename=above_average_departments_chart.png"
-        }
-        return Response(buffer.getvalue(), media_type="image/png", headers=headers)
+    headers = {
+        "Content-Disposition": f"attachment; filename=above_average_departments_chart.{format}"
+    }
+    try:
+        return cached_response(request, ("above_average_departments", "chart", format, dpi, filters.key(), versions), build, headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando el gráfico: {str(e)}")
 
 
+@router.get("/metrics/cache/stats")
+def metrics_cache_stats():
+    """
+    Devuelve la tasa de aciertos, el tamaño y los descartes de la caché de métricas.
+    """
+    return metrics_cache.stats()
+
+
+@router.post("/metrics/rollup/rebuild")
+def rebuild_rollup(year: int = None, db: Session = Depends(get_db)):
+    """
+    Reconstruye desde `hired_employees` el resumen de contrataciones usado por las métricas.
+    Con `year` solo se recalcula ese año (lee únicamente sus particiones si la tabla está particionada).
+    """
+    try:
+        metrics_service = MetricsService(db)
+        rows = metrics_service.rebuild_rollup(year)
+        return {"message": "Resumen de contrataciones reconstruido.", "rows": rows}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reconstruyendo el resumen: {str(e)}")
@@ -0,0 +1,161 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.metrics import METRIC_TABLES, BodyCollector, metric_filters, report_context
+from app.database.async_session import get_async_db, get_async_engine
+from app.services.metrics_service import AsyncMetricsService, MetricFilters
+from app.services.metrics_export import AsyncMetricsExporter
+from app.services.result_cache import data_versions, metrics_cache, make_etag, etag_matches
+from app.services.chart_renderer import CHART_FORMATS, validate_chart_options
+
+# Versión asíncrona de los endpoints de métricas (DB_MODE=async): mismas rutas, caché y ETags que app.api.metrics
+router = APIRouter()
+
+
+async def get_metric_result(metrics_service: AsyncMetricsService, metric: str, versions: tuple, filters: MetricFilters):
+    """
+    Obtiene el DataFrame de una métrica desde la caché o ejecutando su consulta.
+    """
+    key = (metric, "result", filters.key(), versions)
+    df = metrics_cache.get(key)
+    if df is None:
+        df = await metrics_service.get_metric_frame(metric, filters)
+        metrics_cache.set(key, df)
+    return df
+
+
+async def metric_report(request: Request, metric: str, format: str, filters: MetricFilters) -> Response:
+    """
+    Genera el reporte de una métrica en streaming desde el cursor asíncrono.
+    """
+    response, key, headers, media_type = report_context(request, metric, format, filters)
+    if response is not None:
+        return response
+
+    try:
+        chunks = AsyncMetricsExporter(get_async_engine()).stream(metric, format, filters)
+        first_chunk = await chunks.__anext__()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando métricas: {str(e)}")
+
+    async def content():
+        collector = BodyCollector(key)
+        try:
+            collector.add(first_chunk)
+            yield first_chunk
+            async for chunk in chunks:
+                collector.add(chunk)
+                yield chunk
+        finally:
+            # Cierra la sesión de la exportación aunque el cliente se desconecte
+            await chunks.aclose()
+        collector.store()
+
+    return StreamingResponse(content(), media_type=media_type, headers=headers)
+
+
+async def metric_chart(
+    request: Request, db: AsyncSession, metric: str, format: str, dpi: int, filters: MetricFilters
+) -> Response:
+    """
+    Genera el gráfico de una métrica, respondiendo desde la caché o con 304 cuando es posible.
+    """
+    try:
+        validate_chart_options(format, dpi)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    versions = data_versions.snapshot(METRIC_TABLES[metric])
+    key = (metric, "chart", format, dpi, filters.key(), versions)
+    etag = make_etag(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    headers = {
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename={metric}_chart.{format}",
+    }
+    cached = metrics_cache.get(key)
+    if cached is not None:
+        body, media_type = cached
+        return Response(body, media_type=media_type, headers=headers)
+
+    try:
+        metrics_service = AsyncMetricsService(db)
+        df = await get_metric_result(metrics_service, metric, versions, filters)
+        buffer = await metrics_service.generate_chart_in_memory(metric, df, format, dpi, filters.year)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando el gráfico: {str(e)}")
+
+    metrics_cache.set(key, (buffer.getvalue(), CHART_FORMATS[format]))
+    return Response(buffer.getvalue(), media_type=CHART_FORMATS[format], headers=headers)
+
+
+@router.get("/metrics/employees-per-quarter")
+async def employees_per_quarter(request: Request, format: str = "json", filters: MetricFilters = Depends(metric_filters)):
+    """
+    Endpoint para generar un reporte de empleados contratados por trimestre (2021 por defecto).
+    """
+    return await metric_report(request, "employees_per_quarter", format, filters)
+
+
+@router.get("/metrics/above-average-departments")
+async def above_average_departments(
+    request: Request, format: str = "json", filters: MetricFilters = Depends(metric_filters)
+):
+    """
+    Endpoint para generar un reporte de departamentos que contrataron más empleados que el promedio.
+    """
+    return await metric_report(request, "above_average_departments", format, filters)
+
+
+@router.get("/metrics/employees-per-quarter/chart")
+async def employees_per_quarter_chart(
+    request: Request,
+    format: str = "png",  # 'png' o 'svg'
+    dpi: int = 100,
+    filters: MetricFilters = Depends(metric_filters),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Genera un gráfico de barras para empleados contratados por trimestre (2021 por defecto) y lo devuelve para descarga.
+    """
+    return await metric_chart(request, db, "employees_per_quarter", format, dpi, filters)
+
+
+@router.get("/metrics/above-average-departments/chart")
+async def above_average_departments_chart(
+    request: Request,
+    format: str = "png",  # 'png' o 'svg'
+    dpi: int = 100,
+    filters: MetricFilters = Depends(metric_filters),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Genera un gráfico de barras para departamentos con contrataciones por encima del promedio (2021 por defecto)
+    y lo devuelve para descarga.
+    """
+    return await metric_chart(request, db, "above_average_departments", format, dpi, filters)
+
+
+@router.get("/metrics/cache/stats")
+async def metrics_cache_stats():
+    """
+    Devuelve la tasa de aciertos, el tamaño y los descartes de la caché de métricas.
+    """
+    return metrics_cache.stats()
+
+
+@router.post("/metrics/rollup/rebuild")
+async def rebuild_rollup(year: int = None, db: AsyncSession = Depends(get_async_db)):
+    """
+    Reconstruye desde `hired_employees` el resumen de contrataciones usado por las métricas.
+    Con `year` solo se recalcula ese año (lee únicamente sus particiones si la tabla está particionada).
+    """
+    try:
+        rows = await AsyncMetricsService(db).rebuild_rollup(year)
+        return {"message": "Resumen de contrataciones reconstruido.", "rows": rows}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reconstruyendo el resumen: {str(e)}")
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+from app.services.partition_manager import PartitionManagerService
+from app.database.session import get_db
+
+router = APIRouter()
+
+@router.get("/partitions/{table_name}")
+def list_partitions_endpoint(table_name: str, db: Session = Depends(get_db)):
+    """
+    Endpoint para listar las particiones de una tabla con sus rangos y filas estimadas.
+    """
+    try:
+        return {"table_name": table_name, "partitions": PartitionManagerService(db.get_bind()).list_partitions(table_name)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/partitions/{table_name}/{period}/detach")
+def detach_partition_endpoint(table_name: str, period: str, db: Session = Depends(get_db)):
+    """
+    Endpoint para archivar un periodo (por ejemplo 2021 o 2021q1): la partición se desconecta de la tabla
+    y queda como una tabla independiente, sin borrar filas.
+    """
+    try:
+        return PartitionManagerService(db.get_bind()).detach(table_name, period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error desconectando la partición: {str(e)}")
+
+@router.post("/partitions/{table_name}/{period}/attach")
+def attach_partition_endpoint(table_name: str, period: str, db: Session = Depends(get_db)):
+    """
+    Endpoint para volver a conectar a la tabla la partición archivada de un periodo.
+    """
+    try:
+        return PartitionManagerService(db.get_bind()).attach(table_name, period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error conectando la partición: {str(e)}")
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.schemas.transactions import TransactionBase, TransactionBatch
-from app.services.transactions import insert_transaction, insert_batch
+from app.services.transactions import insert_transaction, insert_batch, TransactionStreamLoader
+from app.services.idempotency import IdempotencyConflict
 from app.database.session import get_db
+from app.config import TRANSACTIONS_COMMIT_EVERY
 
 router = APIRouter()
 
@@ -18,18 +21,57 @@ def create_transaction(transaction: TransactionBase, db: Session = Depends(get_d
         raise HTTPException(status_code=500, detail=f"Error creando la transacción: {str(e)}")
 
 @router.post("/transactions/batch/")
-def create_batch(transactions: TransactionBatch, db: Session = Depends(get_db)):
+def create_batch(
+    transactions: TransactionBatch,
+    idempotency_key: str = Header(None),
+    db: Session = Depends(get_db)
+):
     """
-    Endpoint para crear un lote de transacciones (1 a 1000 transacciones).
+    Endpoint para crear un lote de transacciones en una única transacción. Devuelve los ids generados.
+    Con el encabezado `Idempotency-Key`, reintentar el mismo lote no lo inserta dos veces.
     """
-    if len(transactions.transactions) > 1000:
-        raise HTTPException(
-            status_code=400,
-            detail="El lote excede el límite máximo de 1000 transacciones."
-        )
-
     try:
-        insert_batch(db, transactions.transactions)
-        return {"message": f"Lote de {len(transactions.transactions)} transacciones creado con éxito."}
+        result = insert_batch(db, transactions.transactions, idempotency_key)
+        return {"message": f"Lote de {result['rows']} transacciones creado con éxito.", **result}
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creando el lote de transacciones: {str(e)}")
+
+@router.post("/transactions/batch/stream/")
+async def create_batch_stream(
+    request: Request,
+    commit_every: int = TRANSACTIONS_COMMIT_EVERY,
+    return_ids: bool = False,
+    idempotency_key: str = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint para cargar transacciones desde un cuerpo `application/x-ndjson` de cualquier tamaño
+    (un objeto `{"amount": ..., "description": ...}` por línea), confirmando cada `commit_every` filas.
+    Con `Idempotency-Key`, un reintento tras una falla continúa después de las filas ya confirmadas.
+    """
+    try:
+        loader = TransactionStreamLoader(commit_every, idempotency_key, return_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        replay = await run_in_threadpool(loader.resume, db)
+        if replay is not None:
+            return {"message": "Carga ya procesada con esta llave de idempotencia.", **replay}
+
+        async for chunk in request.stream():
+            for rows in loader.feed(chunk):
+                await run_in_threadpool(loader.write, db, rows)
+        for rows in loader.finish():
+            await run_in_threadpool(loader.write, db, rows)
+
+        result = await run_in_threadpool(loader.complete, db)
+        return {"message": f"Carga de {result['rows']} transacciones completada.", **result}
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{str(e)} Filas confirmadas: {loader.rows_committed}.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error cargando las transacciones: {str(e)}")
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.transactions import TransactionBase, TransactionBatch
+from app.services.transactions import insert_transaction_async, insert_batch_async, TransactionStreamLoader
+from app.services.idempotency import IdempotencyConflict
+from app.database.async_session import get_async_db
+from app.config import TRANSACTIONS_COMMIT_EVERY
+
+# Versión asíncrona de los endpoints de transacciones (DB_MODE=async)
+router = APIRouter()
+
+@router.post("/transactions/")
+async def create_transaction(transaction: TransactionBase, db: AsyncSession = Depends(get_async_db)):
+    """
+    Endpoint para crear una transacción individual.
+    """
+    try:
+        result = await insert_transaction_async(db, transaction)
+        return {"message": "Transacción creada con éxito.", "transaction": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creando la transacción: {str(e)}")
+
+@router.post("/transactions/batch/")
+async def create_batch(
+    transactions: TransactionBatch,
+    idempotency_key: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint para crear un lote de transacciones en una única transacción. Devuelve los ids generados.
+    Con el encabezado `Idempotency-Key`, reintentar el mismo lote no lo inserta dos veces.
+    """
+    try:
+        result = await insert_batch_async(db, transactions.transactions, idempotency_key)
+        return {"message": f"Lote de {result['rows']} transacciones creado con éxito.", **result}
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creando el lote de transacciones: {str(e)}")
+
+@router.post("/transactions/batch/stream/")
+async def create_batch_stream(
+    request: Request,
+    commit_every: int = TRANSACTIONS_COMMIT_EVERY,
+    return_ids: bool = False,
+    idempotency_key: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint para cargar transacciones desde un cuerpo `application/x-ndjson` de cualquier tamaño
+    (un objeto `{"amount": ..., "description": ...}` por línea), confirmando cada `commit_every` filas.
+    Con `Idempotency-Key`, un reintento tras una falla continúa después de las filas ya confirmadas.
+    """
+    try:
+        loader = TransactionStreamLoader(commit_every, idempotency_key, return_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        replay = await db.run_sync(loader.resume)
+        if replay is not None:
+            return {"message": "Carga ya procesada con esta llave de idempotencia.", **replay}
+
+        async for chunk in request.stream():
+            for rows in loader.feed(chunk):
+                await db.run_sync(loader.write, rows)
+        for rows in loader.finish():
+            await db.run_sync(loader.write, rows)
+
+        result = await db.run_sync(loader.complete)
+        return {"message": f"Carga de {result['rows']} transacciones completada.", **result}
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{str(e)} Filas confirmadas: {loader.rows_committed}.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error cargando las transacciones: {str(e)}")
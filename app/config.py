@@ -0,0 +1,112 @@
+import os
+
+# Tamaño (en filas) de cada bloque enviado a la base de datos durante la carga masiva
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", "50000"))
+
+# Tamaño máximo (en bytes) del buffer usado para leer y procesar cada bloque de un archivo subido
+UPLOAD_BUFFER_SIZE = int(os.getenv("UPLOAD_BUFFER_SIZE", str(16 * 1024 * 1024)))
+
+# Número de workers (y conexiones) usados para cargar en paralelo tablas independientes
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", "4"))
+
+# Número de filas leídas por lote desde el cursor del servidor durante un backup
+BACKUP_BATCH_SIZE = int(os.getenv("BACKUP_BATCH_SIZE", "10000"))
+
+# Códec de compresión de los archivos Avro (null, deflate, bzip2, xz, snappy, zstandard, lz4)
+BACKUP_CODEC = os.getenv("BACKUP_CODEC", "deflate")
+
+# Tamaño aproximado (en bytes) de cada bloque Avro antes de escribir un marcador de sincronización
+BACKUP_SYNC_INTERVAL = int(os.getenv("BACKUP_SYNC_INTERVAL", str(256 * 1024)))
+
+# Número de filas por lote (y por commit) al restaurar un backup
+RESTORE_BATCH_SIZE = int(os.getenv("RESTORE_BATCH_SIZE", "50000"))
+
+# Directorio donde se guardan los backups consistentes de la base de datos (snapshots)
+BACKUP_DIR = os.getenv("BACKUP_DIR", "/tmp/backups")
+
+# Número máximo de resultados de métricas en caché y tiempo de vida (en segundos) de cada uno
+METRICS_CACHE_SIZE = int(os.getenv("METRICS_CACHE_SIZE", "256"))
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "300"))
+
+# Número de procesos usados para generar gráficos (0 genera los gráficos en el mismo proceso)
+CHART_MAX_WORKERS = int(os.getenv("CHART_MAX_WORKERS", "2"))
+
+# Tiempo máximo (en segundos) de espera por un gráfico
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "30"))
+
+# Routers montados en la aplicación (separados por comas): transactions, csv_upload, backup_restore, metrics, jobs, partitions.
+# Permite ejecutar con la misma imagen workers solo de carga o solo de métricas
+ENABLED_ROUTERS = [
+    name.strip()
+    for name in os.getenv("ENABLED_ROUTERS", "transactions,csv_upload,backup_restore,metrics,jobs,partitions").split(",")
+    if name.strip()
+]
+
+# Filas leídas del cursor por cada bloque de las exportaciones de métricas en streaming
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+# Tamaño máximo (en bytes) de una exportación que se guarda en la caché de métricas
+METRICS_CACHE_MAX_BODY = int(os.getenv("METRICS_CACHE_MAX_BODY", str(8 * 1024 * 1024)))
+
+# Modo de acceso a la base de datos de los endpoints de transacciones y métricas:
+# 'sync' (sesiones bloqueantes en el pool de hilos) o 'async' (SQLAlchemy asíncrono con asyncpg)
+DB_MODE = os.getenv("DB_MODE", "sync")
+
+# Tamaño del pool de conexiones a la base de datos y conexiones adicionales permitidas
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Nivel y formato de los logs ('text' o 'json', un objeto por línea)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# Agregar a cada respuesta el encabezado `Server-Timing` con la duración de sus etapas
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Filas confirmadas por transacción en la carga de transacciones en streaming (NDJSON)
+TRANSACTIONS_COMMIT_EVERY = int(os.getenv("TRANSACTIONS_COMMIT_EVERY", "10000"))
+
+# Confirmación agrupada de POST /transactions/: las solicitudes concurrentes se escriben juntas en un único INSERT.
+# Tamaño máximo de cada lote y espera máxima (en milisegundos) que se agrega para completarlo
+TRANSACTIONS_GROUP_COMMIT = os.getenv("TRANSACTIONS_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "256"))
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "5"))
+# Espera máxima (en segundos) de una solicitud por la confirmación de su lote; si vence y la fila aún no se
+# escribe, se retira del lote y se inserta directamente
+GROUP_COMMIT_TIMEOUT = float(os.getenv("GROUP_COMMIT_TIMEOUT", "10"))
+
+# Directorio de los archivos de cuarentena con las filas rechazadas por la validación de las cargas
+QUARANTINE_DIR = os.getenv("QUARANTINE_DIR", "/tmp/quarantine")
+
+# Tiempo de vida (en segundos) de los conjuntos de llaves usados para validar las llaves foráneas
+FK_CACHE_TTL = float(os.getenv("FK_CACHE_TTL", "300"))
+
+# Trabajos en segundo plano: workers que los ejecutan y directorio donde se guardan los archivos subidos
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+JOBS_DIR = os.getenv("JOBS_DIR", "/tmp/jobs")
+
+# Intervalo (en segundos) de la señal de vida de los trabajos en ejecución y tiempo sin señal
+# tras el cual un trabajo se considera interrumpido y puede reanudarse
+JOBS_HEARTBEAT_INTERVAL = float(os.getenv("JOBS_HEARTBEAT_INTERVAL", "10"))
+JOBS_STALE_AFTER = float(os.getenv("JOBS_STALE_AFTER", "60"))
+
+# Reanudar al iniciar la aplicación los trabajos interrumpidos o en cola
+JOBS_RESUME_ON_STARTUP = os.getenv("JOBS_RESUME_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# Número de tablas cuyos índices se construyen en paralelo y memoria de trabajo de cada construcción
+# en PostgreSQL (por ejemplo '512MB'; vacío usa la configuración del servidor)
+INDEX_BUILD_WORKERS = int(os.getenv("INDEX_BUILD_WORKERS", "4"))
+INDEX_MAINTENANCE_WORK_MEM = os.getenv("INDEX_MAINTENANCE_WORK_MEM", "")
+
+# Año que usan las métricas cuando la solicitud no indica `year`
+METRICS_DEFAULT_YEAR = int(os.getenv("METRICS_DEFAULT_YEAR", "2021"))
+
+# Preparar las consultas de métricas una vez por conexión (PREPARE/EXECUTE en PostgreSQL) y reutilizarlas
+METRICS_PREPARED_STATEMENTS = os.getenv("METRICS_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+
+# Motor de cálculo de las métricas: 'sql' (consultas sobre el resumen) o 'columnar' (columnas en memoria,
+# pensado para réplicas de solo lectura). Con 'columnar', segundos entre comprobaciones de filas nuevas
+# y segundos entre recargas completas (recogen filas actualizadas o eliminadas por otros procesos)
+METRICS_ENGINE = os.getenv("METRICS_ENGINE", "sql").lower()
+COLUMNAR_REFRESH_INTERVAL = float(os.getenv("COLUMNAR_REFRESH_INTERVAL", "5"))
+COLUMNAR_FULL_RELOAD_INTERVAL = float(os.getenv("COLUMNAR_FULL_RELOAD_INTERVAL", "3600"))
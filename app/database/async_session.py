@@ -0,0 +1,77 @@
+import os
+from typing import TYPE_CHECKING
+from sqlalchemy.engine import make_url
+from app.database.session import DATABASE_URL, TimedCheckoutMixin
+from app.services.instrumentation import instrumentation
+from app.config import DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+
+def to_async_url(url: str) -> str:
+    """
+    Convierte la URL síncrona de PostgreSQL en la equivalente para el driver asyncpg.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+# URL de la base de datos para el motor asíncrono; por defecto se deriva de DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+# El motor y la fábrica de sesiones se crean al primer uso, así el modo síncrono no importa asyncpg
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine() -> "AsyncEngine":
+    """
+    Devuelve el motor asíncrono compartido por el proceso, creándolo la primera vez.
+    """
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+        class InstrumentedAsyncQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+            instrumentation_name = "async"
+
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+        instrumentation.register_pool(InstrumentedAsyncQueuePool.instrumentation_name, _async_engine.pool)
+    return _async_engine
+
+
+def get_async_sessionmaker() -> "async_sessionmaker[AsyncSession]":
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_session_factory = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory
+
+
+# Dependencia para obtener una sesión asíncrona de la base de datos
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """
+    Cierra las conexiones del motor asíncrono si llegó a crearse.
+    """
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
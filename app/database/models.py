@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
 from sqlalchemy.orm import relationship
 from app.database.session import Base
 
@@ -20,3 +20,84 @@ class Metadata(Base):
     is_foreign_key = Column(Boolean, default=False)
     foreign_table = Column(String, nullable=True)
     foreign_column = Column(String, nullable=True)
+    is_indexed = Column(Boolean, default=False)  # Crear un índice secundario sobre la columna
+    partition_by = Column(String, nullable=True)  # 'year' o 'quarter': particionar la tabla por rangos de esta columna
+
+# Modelo para el catálogo de backups completos (base) e incrementales
+class BackupCatalog(Base):
+    __tablename__ = "backup_catalog"
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    table_name = Column(String, index=True, nullable=False)
+    backup_type = Column(String, nullable=False)  # 'base' o 'incremental'
+    base_id = Column(Integer, ForeignKey("backup_catalog.id"), nullable=True)  # Backup base de un incremental
+    file_path = Column(String, nullable=False)
+    watermark_column = Column(String, nullable=False)
+    watermark_from = Column(String, nullable=True)  # Valor exclusivo desde el que se exportó
+    watermark_to = Column(String, nullable=True)  # Máximo valor exportado
+    row_count = Column(Integer, nullable=False, default=0)
+    checksum = Column(String, nullable=False)  # SHA-256 del archivo
+    codec = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+# Modelo para el resumen de contrataciones por año, trimestre, departamento y puesto
+class HiringRollup(Base):
+    __tablename__ = "hiring_rollup"
+    year = Column(Integer, primary_key=True)
+    quarter = Column(Integer, primary_key=True)
+    department_id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, primary_key=True)
+    hires = Column(Integer, nullable=False, default=0)
+
+# Modelo para las llaves de idempotencia de las cargas de transacciones
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)
+    endpoint = Column(String, nullable=False)
+    request_hash = Column(String, nullable=True)  # Huella del cuerpo (en cargas NDJSON, de las filas ya confirmadas)
+    status = Column(String, nullable=False)  # 'in_progress' o 'completed'
+    rows_committed = Column(Integer, nullable=False, default=0)
+    response = Column(Text, nullable=True)  # Respuesta en JSON, para repetirla en los reintentos
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+# Modelo para los trabajos en segundo plano (cargas de CSV, backups y restauraciones)
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)  # 'csv', 'backup', 'snapshot' o 'restore'
+    status = Column(String, nullable=False)  # 'queued', 'running', 'completed' o 'failed'
+    params = Column(Text, nullable=True)  # Parámetros en JSON, para poder reanudar el trabajo
+    result = Column(Text, nullable=True)  # Resultado en JSON
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # Última señal del proceso que lo ejecuta
+
+# Modelo para los archivos de cada trabajo y su último punto de control confirmado
+class JobFile(Base):
+    __tablename__ = "job_files"
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    job_id = Column(String, ForeignKey("jobs.id"), index=True, nullable=False)
+    position = Column(Integer, nullable=False)  # Orden del archivo dentro del trabajo
+    file_name = Column(String, nullable=False)
+    table_name = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=True)  # Tamaño en bytes del archivo de origen
+    status = Column(String, nullable=False)  # 'pending', 'running', 'completed' o 'failed'
+    byte_offset = Column(BigInteger, nullable=False, default=0)  # Bytes del CSV ya confirmados
+    rows_read = Column(BigInteger, nullable=False, default=0)  # Filas del origen ya procesadas
+    rows_loaded = Column(BigInteger, nullable=False, default=0)
+    rejected = Column(BigInteger, nullable=False, default=0)
+    reasons = Column(Text, nullable=True)  # Filas rechazadas por motivo, en JSON
+    quarantine_file = Column(String, nullable=True)
+    seconds = Column(Float, nullable=False, default=0)  # Tiempo acumulado de carga
+    detail = Column(Text, nullable=True)  # Error o resultado del archivo
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+# Modelo para las definiciones de los índices eliminados durante una carga, hasta que se reconstruyen
+class DeferredIndex(Base):
+    __tablename__ = "deferred_indexes"
+    table_name = Column(String, primary_key=True)
+    index_name = Column(String, primary_key=True)
+    definition = Column(Text, nullable=False)  # Sentencia que recrea el índice
+    dropped_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,5 +1,37 @@
-from fastapi import FastAPI
-from app.api import transactions, csv_upload, backup_restore, metrics
+import importlib
+import logging
+import time
+from fastapi import FastAPI, Request
+from app.config import (
+    DB_MODE,
+    ENABLED_ROUTERS,
+    JOBS_RESUME_ON_STARTUP,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    METRICS_ENGINE,
+    SERVER_TIMING_ENABLED,
+)
+from app.services.instrumentation import configure_logging, instrumentation, request_timings, server_timing_header
+from app.api import internal
+
+configure_logging(LOG_LEVEL, LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+# Routers disponibles: nombre -> (módulo, etiqueta)
+ROUTERS = {
+    "transactions": ("app.api.transactions", "Transactions"),
+    "csv_upload": ("app.api.csv_upload", "CSV Management"),
+    "backup_restore": ("app.api.backup_restore", "Backup and Restore"),
+    "metrics": ("app.api.metrics", "Querys"),
+    "jobs": ("app.api.jobs", "Jobs"),
+    "partitions": ("app.api.partitions", "Partitions"),
+}
+
+# Módulos que reemplazan a los anteriores con DB_MODE=async
+ASYNC_ROUTERS = {
+    "transactions": "app.api.transactions_async",
+    "metrics": "app.api.metrics_async",
+}
 
 # Crear la instancia de la aplicación FastAPI
 app = FastAPI(
@@ -11,11 +43,119 @@ app = FastAPI(
     version="1.0.0",
 )
 
-# Incluir los routers de las diferentes funcionalidades
-app.include_router(transactions.router, prefix="/api/v1", tags=["Transactions"])
-app.include_router(csv_upload.router, prefix="/api/v1", tags=["CSV Management"])
-app.include_router(backup_restore.router, prefix="/api/v1", tags=["Backup and Restore"])
-app.include_router(metrics.router, prefix="/api/v1", tags=["Querys"])
+# Incluir solo los routers habilitados; los módulos de los demás no se importan
+unknown_routers = [name for name in ENABLED_ROUTERS if name not in ROUTERS]
+if unknown_routers:
+    raise ValueError(f"Routers desconocidos en ENABLED_ROUTERS: {', '.join(unknown_routers)}.")
+if DB_MODE not in ("sync", "async"):
+    raise ValueError("DB_MODE debe ser 'sync' o 'async'.")
+if METRICS_ENGINE not in ("sql", "columnar"):
+    raise ValueError("METRICS_ENGINE debe ser 'sql' o 'columnar'.")
+
+for name in ENABLED_ROUTERS:
+    module_name, tag = ROUTERS[name]
+    if DB_MODE == "async":
+        module_name = ASYNC_ROUTERS.get(name, module_name)
+    module = importlib.import_module(module_name)
+    app.include_router(module.router, prefix="/api/v1", tags=[tag])
+
+# Estadísticas internas en formato Prometheus (siempre disponibles, fuera de /api/v1)
+app.include_router(internal.router, tags=["Internal"])
+
+# Medir la latencia de cada solicitud por ruta y, opcionalmente, informar sus etapas en `Server-Timing`
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    timings = []
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        request_timings.reset(token)
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        instrumentation.observe(
+            "http_request_duration_seconds",
+            elapsed,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(status),
+        )
+
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+# Reconstruir en segundo plano los índices que una carga interrumpida dejó eliminados
+@app.on_event("startup")
+def rebuild_deferred_indexes():
+    if {"csv_upload", "backup_restore", "jobs"} & set(ENABLED_ROUTERS):
+        import threading
+        from app.database.session import engine
+        from app.services.index_manager import IndexManagerService
+
+        def rebuild():
+            try:
+                IndexManagerService(engine).rebuild_pending()
+            except Exception as e:
+                logger.warning("No se pudieron reconstruir los índices pendientes: %s", e)
+
+        threading.Thread(target=rebuild, name="deferred-index-rebuild", daemon=True).start()
+
+# Reanudar los trabajos en segundo plano que quedaron en cola o interrumpidos
+@app.on_event("startup")
+def resume_jobs():
+    if "jobs" in ENABLED_ROUTERS and JOBS_RESUME_ON_STARTUP:
+        from app.services.jobs import get_job_runner
+        try:
+            get_job_runner().resume_interrupted()
+        except Exception as e:
+            logger.warning("No se pudieron reanudar los trabajos interrumpidos: %s", e)
+
+# Cargar en segundo plano el motor columnar de métricas, para que la primera solicitud no espere la carga completa
+@app.on_event("startup")
+def warm_columnar_metrics():
+    if "metrics" in ENABLED_ROUTERS and METRICS_ENGINE == "columnar":
+        import threading
+        from app.database.session import engine
+        from app.services.columnar_metrics import get_columnar_engine
+
+        def warm():
+            try:
+                get_columnar_engine(engine).refresh()
+            except Exception as e:
+                logger.warning("No se pudo cargar el motor columnar de métricas: %s", e)
+
+        threading.Thread(target=warm, name="columnar-metrics-warmup", daemon=True).start()
+
+# Dejar de aceptar trabajos en segundo plano al apagar la aplicación
+@app.on_event("shutdown")
+def shutdown_job_runner():
+    from app.services.jobs import stop_job_runner
+    stop_job_runner()
+
+# Detener el pool de procesos de gráficos al apagar la aplicación
+@app.on_event("shutdown")
+def shutdown_chart_pool():
+    if "metrics" in ENABLED_ROUTERS:
+        from app.services.chart_renderer import chart_pool
+        chart_pool.shutdown()
+
+# Escribir las transacciones pendientes de la confirmación agrupada al apagar la aplicación
+@app.on_event("shutdown")
+def shutdown_group_commit():
+    if "transactions" in ENABLED_ROUTERS:
+        from app.services.group_commit import stop_group_commit_writer
+        stop_group_commit_writer()
+
+# Cerrar las conexiones del motor asíncrono al apagar la aplicación
+@app.on_event("shutdown")
+async def shutdown_async_engine():
+    if DB_MODE == "async":
+        from app.database.async_session import dispose_async_engine
+        await dispose_async_engine()
 
 # Endpoint raíz para verificar el estado de la API
 @app.get("/")
@@ -24,4 +164,3 @@ def root():
     Verificar el estado de la API.
     """
     return {"message": "API en funcionamiento"}
-
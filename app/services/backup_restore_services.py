@@ -1,8 +1,46 @@
-import fastavro
-from sqlalchemy import Table, MetaData, inspect
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+from sqlalchemy import MetaData, text
 from sqlalchemy.orm import Session
-from sqlalchemy.types import Integer, String, Float, Boolean
+from sqlalchemy.types import Integer, String, Float, Boolean, DateTime
+from app.database.models import BackupCatalog, HiringRollup
 from app.services.csv_loader import CSVLoaderService
+from app.services.bulk_loader import BulkLoaderService
+from app.services.merge_loader import MergeLoaderService
+from app.services.index_manager import IndexManagerService
+from app.services.partition_manager import PartitionManagerService
+from app.services.row_validator import existing_keys
+from app.services.ingest_scheduler import DependencyScheduler
+from app.services.rollup_service import HiringRollupService, SOURCE_TABLE as ROLLUP_SOURCE_TABLE
+from app.services.result_cache import data_versions, rewritten
+from app.services.schema_registry import schema_registry
+from app.services.instrumentation import StageTimer, instrumentation
+from app.config import (
+    BACKUP_BATCH_SIZE,
+    BACKUP_CODEC,
+    BACKUP_DIR,
+    BACKUP_SYNC_INTERVAL,
+    INGEST_MAX_WORKERS,
+    RESTORE_BATCH_SIZE,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Nombre del archivo que describe el contenido de cada snapshot
+SNAPSHOT_MANIFEST = "manifest.json"
+
+logger = logging.getLogger(__name__)
 
 
 class BackupRestoreServices:
@@ -23,96 +61,755 @@ class BackupRestoreServices:
         elif isinstance(sql_type, String):
             return "string"
         elif isinstance(sql_type, Float):
-            return "float"
+            return "double"
         elif isinstance(sql_type, Boolean):
             return "boolean"
+        elif isinstance(sql_type, DateTime):
+            return {"type": "long", "logicalType": "timestamp-micros"}
         else:
             raise ValueError(f"Tipo de dato no soportado para AVRO: {sql_type}.")
 
-    def backup_table(self, table_name: str, file_path: str):
+    def _get_avro_schema(self, table) -> dict:
         """
-        Crea un backup de una tabla específica en formato Avro.
+        Genera el esquema Avro de una tabla; todas las columnas admiten nulos.
         """
-
-        # Validar si la tabla existe
-        inspector = inspect(self.engine)
-        if table_name not in inspector.get_table_names():
-            raise ValueError(f"No se encontró la tabla '{table_name}'.")
-
-        # Obtener la tabla desde la metadata
-        table = Table(table_name, self.metadata, autoload_with=self.engine)
-        
-        # Obtener los datos de la tabla
-        rows = self.db.execute(table.select()).fetchall()
-
-        # Extraer los nombres de las columnas
-        column_names = [col.name for col in table.columns]
-        print(f"Columnas detectadas: {column_names}")
-
-        # Convertir filas a diccionarios
-        try:
-            formatted_rows = [dict(zip(column_names, row)) for row in rows]
-            print(f"Datos formateados: {formatted_rows}")
-        except Exception as e:
-            raise ValueError(f"Error al formatear las filas: {e}")
-
-        # Crear el esquema Avro con los tipos de datos adecuados
         try:
-            schema = {
+            return {
                 "type": "record",
-                "name": table_name,
+                "name": table.name,
                 "fields": [
-                    {
-                        "name": col.name,
-                        "type": ["null", "string"] if str(col.type) == "VARCHAR" else ["null", "int"],
-                    }
+                    {"name": col.name, "type": ["null", self._get_avro_type(col.type)]}
                     for col in table.columns
                 ],
             }
-            print(f"Esquema generado: {schema}")
         except Exception as e:
             raise ValueError(f"Error al generar el esquema Avro: {e}")
 
-        # Escribir los datos en formato Avro
+    def _iter_rows(self, table, connection=None, statement=None, batch_size: int = BACKUP_BATCH_SIZE):
+        """
+        Recorre las filas de la tabla (o de `statement`) mediante un cursor del lado del servidor,
+        leyendo `batch_size` filas a la vez.
+        """
+        connection = connection if connection is not None else self.db.connection()
+        statement = statement if statement is not None else table.select()
+        result = connection.execution_options(stream_results=True, max_row_buffer=batch_size).execute(statement)
+        for partition in result.mappings().partitions(batch_size):
+            for row in partition:
+                yield dict(row)
+
+    def iter_backup_bytes(
+        self,
+        table_name: str,
+        connection=None,
+        codec: str = BACKUP_CODEC,
+        sync_interval: int = BACKUP_SYNC_INTERVAL,
+        statement=None,
+        on_record=None,
+        timer: StageTimer = None,
+    ):
+        """
+        Genera el contenido Avro del backup de una tabla a medida que se escribe cada bloque.
+        Nunca se mantiene en memoria más de un bloque de filas.
+        `statement` permite respaldar solo un subconjunto de filas y `on_record` recibe cada fila escrita.
+        `timer` acumula las etapas de lectura y codificación; si no se indica, se registran al terminar.
+        """
+        from fastavro import parse_schema
+        from fastavro.write import Writer, BLOCK_WRITERS
+
+        if codec not in BLOCK_WRITERS:
+            raise ValueError(f"Códec no soportado: '{codec}'. Usa uno de: {', '.join(BLOCK_WRITERS)}.")
+
+        # Obtener la tabla desde el registro de esquemas (falla si la tabla no existe)
+        table = schema_registry.get_table(self.engine, table_name)
+        schema = parse_schema(self._get_avro_schema(table))
+
+        owns_timer = timer is None
+        timer = timer or StageTimer("backup")
+        start = time.perf_counter()
+        rows = 0
+
+        buffer = io.BytesIO()
+        writer = Writer(buffer, schema, codec=codec, sync_interval=sync_interval)
+        for record in timer.iterate(self._iter_rows(table, connection, statement), "fetch"):
+            encode_start = time.perf_counter()
+            writer.write(record)
+            timer.add("encode", time.perf_counter() - encode_start)
+            rows += 1
+            if on_record is not None:
+                on_record(record)
+            if buffer.tell():
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        with timer.stage("encode"):
+            writer.flush()
+        instrumentation.record_rows(table_name, "backup", rows, time.perf_counter() - start)
+        if owns_timer:
+            timer.record()
+        yield buffer.getvalue()
+
+    def backup_table(
+        self,
+        table_name: str,
+        file_path: str,
+        codec: str = BACKUP_CODEC,
+        sync_interval: int = BACKUP_SYNC_INTERVAL,
+        connection=None,
+        statement=None,
+        on_record=None,
+    ) -> int:
+        """
+        Crea un backup de una tabla específica en formato Avro.
+        El archivo se escribe primero con un nombre temporal y se renombra al terminar,
+        para que nunca quede un backup incompleto en `file_path`. Devuelve los bytes escritos.
+        """
+        partial_path = f"{file_path}.partial"
+        written = 0
+        timer = StageTimer("backup")
         try:
-            with open(file_path, "wb") as f:
-                fastavro.writer(f, schema, formatted_rows)
-            print(f"Backup creado exitosamente para la tabla '{table_name}' en '{file_path}'.")
+            with open(partial_path, "wb") as f:
+                for chunk in self.iter_backup_bytes(
+                    table_name, connection, codec, sync_interval, statement, on_record, timer=timer
+                ):
+                    with timer.stage("write"):
+                        f.write(chunk)
+                    written += len(chunk)
+            os.replace(partial_path, file_path)
         except Exception as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            if isinstance(e, ValueError):
+                raise
             raise ValueError(f"Error al escribir el archivo Avro: {e}")
+        finally:
+            timer.record()
+
+        logger.info(
+            "Backup creado exitosamente para la tabla '%s' en '%s' (%s bytes, códec '%s').",
+            table_name, file_path, written, codec,
+            extra={"table": table_name, "bytes": written, "codec": codec},
+        )
+        return written
+
+    def stream_backup_table(
+        self,
+        table_name: str,
+        file_path: str,
+        codec: str = BACKUP_CODEC,
+        sync_interval: int = BACKUP_SYNC_INTERVAL,
+    ):
+        """
+        Genera el backup bloque a bloque para enviarlo en la respuesta, guardando a la vez una copia en `file_path`.
+        """
+        partial_path = f"{file_path}.partial"
+        try:
+            with open(partial_path, "wb") as f:
+                for chunk in self.iter_backup_bytes(table_name, None, codec, sync_interval):
+                    f.write(chunk)
+                    yield chunk
+            os.replace(partial_path, file_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def backup_database(
+        self,
+        tables: list = None,
+        codec: str = BACKUP_CODEC,
+        sync_interval: int = BACKUP_SYNC_INTERVAL,
+        max_workers: int = INGEST_MAX_WORKERS,
+    ) -> dict:
+        """
+        Crea un backup consistente de todas las tablas de la metadata (o de las indicadas), exportándolas en paralelo.
+        En PostgreSQL todos los workers leen el mismo snapshot exportado (`REPEATABLE READ` + `pg_export_snapshot`),
+        por lo que el conjunto de archivos corresponde a un único instante. Devuelve el manifiesto del snapshot.
+        """
+        tables = list(dict.fromkeys(tables or schema_registry.table_names(self.engine)))
+        if not tables:
+            raise ValueError("No hay tablas definidas en la metadata para respaldar.")
+
+        # Reflejar las tablas antes de iniciar los workers (falla si alguna no existe)
+        for table_name in tables:
+            schema_registry.get_table(self.engine, table_name)
+
+        created_at = datetime.now(timezone.utc)
+        snapshot_name = f"snapshot_{created_at.strftime('%Y%m%dT%H%M%S%fZ')}"
+        snapshot_dir = os.path.join(BACKUP_DIR, snapshot_name)
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+        def backup_with_snapshot(table_name: str, snapshot_id: str = None):
+            file_path = os.path.join(snapshot_dir, f"{table_name}.avro")
+            with self.engine.connect().execution_options(isolation_level="REPEATABLE READ") as connection:
+                if snapshot_id is not None:
+                    connection.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+                size = self.backup_table(table_name, file_path, codec, sync_interval, connection=connection)
+                connection.rollback()
+            return {"file": f"{table_name}.avro", "bytes": size}
+
+        logger.info("Creando snapshot '%s' de las tablas: %s...", snapshot_name, ", ".join(tables))
+        if self.engine.dialect.name == "postgresql":
+            # La transacción coordinadora mantiene vivo el snapshot exportado hasta que terminen los workers
+            with self.engine.connect().execution_options(isolation_level="REPEATABLE READ") as coordinator:
+                snapshot_id = coordinator.execute(text("SELECT pg_export_snapshot()")).scalar()
+                if not re.fullmatch(r"[0-9A-Fa-f-]+", snapshot_id):
+                    raise ValueError(f"Identificador de snapshot inesperado: {snapshot_id}.")
+                with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    files = dict(zip(tables, pool.map(lambda name: backup_with_snapshot(name, snapshot_id), tables)))
+                coordinator.rollback()
+        else:
+            # Sin snapshots exportables: se respaldan secuencialmente dentro de una única transacción
+            snapshot_id = None
+            files = {}
+            with self.engine.connect().execution_options(isolation_level="SERIALIZABLE") as connection:
+                for table_name in tables:
+                    file_path = os.path.join(snapshot_dir, f"{table_name}.avro")
+                    size = self.backup_table(table_name, file_path, codec, sync_interval, connection=connection)
+                    files[table_name] = {"file": f"{table_name}.avro", "bytes": size}
+                connection.rollback()
+
+        manifest = {
+            "snapshot": snapshot_name,
+            "snapshot_id": snapshot_id,
+            "created_at": created_at.isoformat(),
+            "codec": codec,
+            "tables": files,
+        }
+        with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        logger.info("Snapshot '%s' creado exitosamente en '%s'.", snapshot_name, snapshot_dir)
+        return manifest
+
+    def restore_database(
+        self,
+        snapshot_name: str,
+        tables: list = None,
+        mode: str = "append",
+        batch_size: int = RESTORE_BATCH_SIZE,
+        max_workers: int = INGEST_MAX_WORKERS,
+        defer_indexes: bool = False,
+    ) -> dict:
+        """
+        Restaura las tablas de un snapshot (o las indicadas) en paralelo, respetando el orden de las llaves foráneas.
+        Con `defer_indexes`, los índices no únicos se eliminan durante la restauración y se reconstruyen al terminar,
+        en paralelo entre tablas. Devuelve el resultado (o el error) de cada tabla.
+        """
+        if os.path.basename(snapshot_name) != snapshot_name:
+            raise ValueError(f"Nombre de snapshot no válido: '{snapshot_name}'.")
+
+        snapshot_dir = os.path.join(BACKUP_DIR, snapshot_name)
+        manifest_path = os.path.join(snapshot_dir, SNAPSHOT_MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(manifest_path)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        tables = list(dict.fromkeys(tables or manifest["tables"]))
+        missing = [name for name in tables if name not in manifest["tables"]]
+        if missing:
+            raise ValueError(f"El snapshot '{snapshot_name}' no contiene las tablas: {', '.join(missing)}.")
+
+        # Crear primero, en orden y desde una sola sesión, las tablas que aún no existen
+        csv_service = CSVLoaderService(self.db)
+        for table_name in tables:
+            if not schema_registry.table_exists(self.engine, table_name):
+                csv_service.create_table_from_metadata(table_name)
+
+        def restore_task(table_name: str):
+            def task():
+                file_path = os.path.join(snapshot_dir, manifest["tables"][table_name]["file"])
+                with Session(bind=self.engine) as session:
+                    return BackupRestoreServices(session).restore_table(session, table_name, file_path, mode, batch_size)
+            return task
+
+        dependencies = schema_registry.foreign_key_dependencies(self.engine)
+        tasks = [(table_name, restore_task(table_name)) for table_name in tables]
+        with IndexManagerService(self.engine).deferred(tables, defer_indexes):
+            outcomes = DependencyScheduler(dependencies, max_workers).run(tasks)
+
+        results = {}
+        for table_name, outcome in zip(tables, outcomes):
+            if isinstance(outcome, Exception):
+                results[table_name] = {"status": "error", "detail": str(outcome)}
+            else:
+                results[table_name] = {"status": "success", "stats": outcome}
+        return results
+
+    def _ensure_backup_catalog(self):
+        """
+        Crea la tabla del catálogo de backups si no existe.
+        """
+        if not schema_registry.table_exists(self.engine, BackupCatalog.__tablename__):
+            BackupCatalog.__table__.create(self.engine, checkfirst=True)
+            schema_registry.mark_table_created(BackupCatalog.__tablename__)
+
+    def _get_watermark_column(self, table_name: str, watermark_column: str = None) -> str:
+        """
+        Determina la columna de marca de agua: la indicada o la llave primaria registrada en la metadata.
+        """
+        if watermark_column:
+            return watermark_column
+
+        primary_keys = [entry.column_name for entry in schema_registry.get_columns(self.engine, table_name) if entry.is_primary_key]
+        if len(primary_keys) != 1:
+            raise ValueError(
+                f"La tabla '{table_name}' no tiene una única llave primaria en la metadata; indica la columna de marca de agua."
+            )
+        return primary_keys[0]
 
-    def restore_table(self, db, table_name: str, file_path: str):
+    @staticmethod
+    def _parse_watermark(column, value: str):
+        """
+        Convierte una marca de agua guardada como texto al tipo de la columna.
+        """
+        if isinstance(column.type, Integer):
+            return int(value)
+        if isinstance(column.type, Float):
+            return float(value)
+        if isinstance(column.type, DateTime):
+            return datetime.fromisoformat(value)
+        return value
+
+    @staticmethod
+    def _format_watermark(value) -> str:
+        """
+        Convierte una marca de agua a texto para guardarla en el catálogo.
+        """
+        if value is None:
+            return None
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+
+    @staticmethod
+    def _file_checksum(file_path: str) -> str:
+        """
+        Calcula el SHA-256 de un archivo leyéndolo por bloques.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def backup_incremental(
+        self,
+        table_name: str,
+        watermark_column: str = None,
+        full: bool = False,
+        codec: str = BACKUP_CODEC,
+    ) -> dict:
+        """
+        Crea un backup incremental de la tabla con las filas cuya marca de agua supera la del último backup
+        registrado en el catálogo. Si no hay un backup base para esa columna (o `full` es verdadero), crea uno completo.
+        La marca de agua es la llave primaria de la metadata o una columna creciente indicada (por ejemplo, un timestamp).
+        Devuelve la entrada registrada en el catálogo.
+        """
+        self._ensure_backup_catalog()
+        table = schema_registry.get_table(self.engine, table_name)
+        watermark_column = self._get_watermark_column(table_name, watermark_column)
+        if watermark_column not in table.columns:
+            raise ValueError(f"La columna '{watermark_column}' no existe en la tabla '{table_name}'.")
+        column = table.c[watermark_column]
+
+        # Buscar la última entrada de la cadena actual (base + incrementales)
+        base = None
+        if not full:
+            base = (
+                self.db.query(BackupCatalog)
+                .filter(
+                    BackupCatalog.table_name == table_name,
+                    BackupCatalog.backup_type == "base",
+                    BackupCatalog.watermark_column == watermark_column,
+                )
+                .order_by(BackupCatalog.id.desc())
+                .first()
+            )
+
+        statement = table.select().order_by(column)
+        watermark_from = None
+        if base is not None:
+            last = (
+                self.db.query(BackupCatalog)
+                .filter((BackupCatalog.id == base.id) | (BackupCatalog.base_id == base.id))
+                .order_by(BackupCatalog.id.desc())
+                .first()
+            )
+            watermark_from = last.watermark_to
+            if watermark_from is not None:
+                statement = statement.where(column > self._parse_watermark(column, watermark_from))
+
+        backup_type = "incremental" if base is not None else "base"
+        created_at = datetime.now(timezone.utc)
+        directory = os.path.join(BACKUP_DIR, "incremental", table_name)
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f"{table_name}_{backup_type}_{created_at.strftime('%Y%m%dT%H%M%S%fZ')}.avro")
+
+        stats = {"rows": 0, "max": None}
+
+        def track(record: dict):
+            stats["rows"] += 1
+            value = record[watermark_column]
+            if value is not None and (stats["max"] is None or value > stats["max"]):
+                stats["max"] = value
+
+        self.backup_table(table_name, file_path, codec, statement=statement, on_record=track)
+
+        entry = BackupCatalog(
+            table_name=table_name,
+            backup_type=backup_type,
+            base_id=base.id if base is not None else None,
+            file_path=file_path,
+            watermark_column=watermark_column,
+            watermark_from=watermark_from,
+            watermark_to=self._format_watermark(stats["max"]) if stats["max"] is not None else watermark_from,
+            row_count=stats["rows"],
+            checksum=self._file_checksum(file_path),
+            codec=codec,
+            created_at=created_at,
+        )
+        self.db.add(entry)
+        self.db.commit()
+        self.db.refresh(entry)
+        logger.info(
+            "Backup %s de '%s' creado en '%s' (%s filas).", backup_type, table_name, file_path, stats["rows"],
+            extra={"table": table_name, "backup_type": backup_type, "rows": stats["rows"]},
+        )
+        return self._catalog_entry_to_dict(entry)
+
+    @staticmethod
+    def _catalog_entry_to_dict(entry: BackupCatalog) -> dict:
+        return {
+            "id": entry.id,
+            "table_name": entry.table_name,
+            "backup_type": entry.backup_type,
+            "base_id": entry.base_id,
+            "file_path": entry.file_path,
+            "watermark_column": entry.watermark_column,
+            "watermark_from": entry.watermark_from,
+            "watermark_to": entry.watermark_to,
+            "row_count": entry.row_count,
+            "checksum": entry.checksum,
+            "codec": entry.codec,
+            "created_at": entry.created_at.isoformat(),
+        }
+
+    def list_backup_catalog(self, table_name: str) -> list:
+        """
+        Devuelve las entradas del catálogo de backups de una tabla, de la más antigua a la más reciente.
+        """
+        self._ensure_backup_catalog()
+        entries = (
+            self.db.query(BackupCatalog)
+            .filter(BackupCatalog.table_name == table_name)
+            .order_by(BackupCatalog.id)
+            .all()
+        )
+        return [self._catalog_entry_to_dict(entry) for entry in entries]
+
+    def restore_backup_chain(self, table_name: str, base_id: int = None, mode: str = "append") -> dict:
+        """
+        Restaura una tabla reproduciendo un backup base (el indicado o el más reciente) y luego sus incrementales en orden.
+        Antes de cargar nada se verifica el checksum de todos los archivos de la cadena.
+        `mode` se aplica al backup base; los incrementales siempre se agregan.
+        """
+        self._ensure_backup_catalog()
+        query = self.db.query(BackupCatalog).filter(
+            BackupCatalog.table_name == table_name, BackupCatalog.backup_type == "base"
+        )
+        if base_id is not None:
+            query = query.filter(BackupCatalog.id == base_id)
+        base = query.order_by(BackupCatalog.id.desc()).first()
+        if base is None:
+            raise FileNotFoundError(f"No hay un backup base en el catálogo para la tabla '{table_name}'.")
+
+        chain = [base] + (
+            self.db.query(BackupCatalog)
+            .filter(BackupCatalog.base_id == base.id)
+            .order_by(BackupCatalog.id)
+            .all()
+        )
+
+        # Verificar la integridad de toda la cadena antes de restaurar
+        for entry in chain:
+            if not os.path.exists(entry.file_path):
+                raise FileNotFoundError(entry.file_path)
+            if self._file_checksum(entry.file_path) != entry.checksum:
+                raise ValueError(f"El checksum del archivo '{entry.file_path}' no coincide con el catálogo.")
+
+        results = []
+        for entry in chain:
+            entry_mode = mode if entry.backup_type == "base" else "append"
+            stats = self.restore_table(self.db, table_name, entry.file_path, entry_mode)
+            results.append({"id": entry.id, "backup_type": entry.backup_type, "stats": stats})
+        return {"table_name": table_name, "base_id": base.id, "files": results}
+
+    def restore_table(
+        self,
+        db,
+        table_name: str,
+        file_path: str,
+        mode: str = "append",
+        batch_size: int = RESTORE_BATCH_SIZE,
+        progress=None,
+        checkpoint=None,
+        skip_rows: int = 0,
+        defer_indexes: bool = False,
+    ) -> dict:
         """
         Restaura una tabla desde un archivo AVRO.
         Si la tabla no existe, la recrea usando la metadata almacenada.
+        El archivo se lee bloque a bloque y se carga en lotes de `batch_size` filas (COPY en PostgreSQL),
+        confirmando cada lote. Modos:
+        - `append`: agrega las filas directamente a la tabla.
+        - `swap`: carga una tabla auxiliar y reemplaza el contenido de la tabla en una única transacción,
+          de modo que los lectores nunca ven una restauración a medias.
+        - `merge`: carga una tabla auxiliar UNLOGGED y la mezcla con la tabla en una única transacción
+          (`INSERT ... ON CONFLICT DO UPDATE` por la llave primaria de la metadata); las estadísticas
+          incluyen las filas insertadas, actualizadas y sin cambios.
+        `progress` recibe, después de cada lote, un diccionario con filas, bloques y filas por segundo.
+        `checkpoint(connection, stats)` se ejecuta dentro de la transacción de cada lote, con `rows_read` igual a los
+        registros del archivo ya confirmados; en modo `append`, `skip_rows` omite esos registros al reanudar.
+        Con `defer_indexes`, los índices no únicos de la tabla se eliminan durante la carga y se reconstruyen al terminar.
         """
+        if mode not in ("append", "swap", "merge"):
+            raise ValueError("Modo no soportado. Usa 'append', 'swap' o 'merge'.")
+        if skip_rows and mode != "append":
+            raise ValueError("Solo se puede reanudar una restauración en modo 'append'.")
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(file_path)
+
         # Verificar si la tabla existe
-        if not inspect(self.engine).has_table(table_name):
-            print(f"La tabla '{table_name}' no existe. Intentando recrearla a partir de la metadata...")
+        if not schema_registry.table_exists(self.engine, table_name):
+            logger.info("La tabla '%s' no existe. Intentando recrearla a partir de la metadata...", table_name)
             # Inicializar el servicio CSV con la sesión
             csv_service = CSVLoaderService(db)
             # Cargar la metadata desde el archivo
             csv_service.create_table_from_metadata(table_name)
+            # El esquema cambió: descartar lo almacenado en el registro
+            schema_registry.invalidate()
 
         # Leer el archivo AVRO
-        print(f"Restaurando la tabla '{table_name}' desde el archivo '{file_path}'...")
+        timer = StageTimer("restore")
+        logger.info("Restaurando la tabla '%s' desde el archivo '%s' (modo '%s')...", table_name, file_path, mode)
         try:
-            with open(file_path, "rb") as f:
-                reader = fastavro.reader(f)
-                rows = list(reader)
+            # Obtener la tabla SQLAlchemy
+            table = schema_registry.get_table(self.engine, table_name)
+            columns = [col.name for col in table.columns]
+
+            merge_loader = None
+            if mode == "swap":
+                self._check_swap_allowed(table_name)
+                with timer.stage("create_staging"):
+                    target_name = self._create_staging_table(table_name)
+            elif mode == "merge":
+                merge_loader = MergeLoaderService(self.engine, table_name)
+                with timer.stage("create_staging"):
+                    target_name = merge_loader.create_staging()
+            else:
+                target_name = table_name
+
+            # El resumen de contrataciones se actualiza con cada lote o se reconstruye tras el reemplazo
+            rollup_service = HiringRollupService(self.engine) if table_name == ROLLUP_SOURCE_TABLE else None
+            on_batch = None
+            if rollup_service is not None:
+                rollup_service.ensure()
+                on_batch = rollup_service.apply_chunk if mode == "append" else None
 
-                # Validar que hay datos para insertar
-                if not rows:
-                    print(f"El archivo '{file_path}' está vacío. No se restaurará nada.")
-                    return
+            # En una tabla particionada las particiones se crean con cada lote (append) o desde la tabla auxiliar
+            partition_manager = PartitionManagerService(self.engine)
+            partition = partition_manager.spec(table_name)
+            prepare = None
+            if partition is not None and mode == "append":
+                partition_column_name, granularity = partition
+                # La restricción de la tabla incluye la columna de partición: la unicidad de la llave de la metadata
+                # se verifica antes de insertar cada lote, como haría la llave primaria en una tabla sin particiones
+                declared_key = [entry.column_name for entry in schema_registry.get_columns(self.engine, table_name) if entry.is_primary_key]
 
-                # Obtener la tabla SQLAlchemy
-                table = Table(table_name, self.metadata, autoload_with=self.engine)
+                def prepare(df):
+                    if declared_key:
+                        with timer.stage("validate"):
+                            self._check_new_keys(table_name, declared_key, df)
+                    with timer.stage("partitions"):
+                        partition_manager.ensure_partitions(table_name, partition_manager.periods_of(df[partition_column_name], granularity))
 
-                # Insertar los datos en la tabla
-                with self.engine.begin() as connection:
-                    connection.execute(table.insert(), rows)
+            with IndexManagerService(self.engine).deferred([table_name], defer_indexes):
+                try:
+                    stats = self._load_avro_batches(
+                        file_path, target_name, columns, batch_size, progress, on_batch, timer, checkpoint, skip_rows, prepare
+                    )
+                    if partition is not None and mode != "append":
+                        with timer.stage("partitions"):
+                            partition_manager.ensure_from_table(table_name, target_name)
+                    if merge_loader is not None:
+                        with timer.stage("merge"), self.engine.begin() as connection:
+                            stats.update(merge_loader.merge(connection, columns))
+                    if mode == "swap":
+                        with timer.stage("swap"):
+                            self._swap_from_staging(table_name, target_name, columns)
+                finally:
+                    # La tabla auxiliar se elimina aunque la carga falle (tras el reemplazo ya no existe)
+                    if merge_loader is not None:
+                        merge_loader.drop_staging()
+                    elif mode == "swap":
+                        self._drop_staging_table(target_name)
+            instrumentation.record_rows(table_name, "restore", stats["rows"], stats["seconds"])
 
-                print(f"Tabla '{table_name}' restaurada exitosamente desde el archivo '{file_path}'.")
+            if mode != "append" and rollup_service is not None:
+                with timer.stage("rollup"):
+                    rollup_service.rebuild()
+
+            logger.info(
+                "Tabla '%s' restaurada exitosamente desde el archivo '%s': %s.", table_name, file_path, stats,
+                extra={"table": table_name, "mode": mode, **stats},
+            )
+            return stats
         except Exception as e:
-            raise ValueError(f"Error al restaurar la tabla '{table_name}': {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Error al restaurar la tabla '{table_name}': {str(e)}")
+        finally:
+            timer.record()
+            # Los lotes se confirman por separado: invalidar la caché aunque la restauración falle a medias.
+            # Los modos 'swap' y 'merge' además reescriben filas existentes
+            data_versions.bump(
+                table_name,
+                *([HiringRollup.__tablename__] if table_name == ROLLUP_SOURCE_TABLE else []),
+                *([rewritten(table_name)] if mode != "append" else []),
+            )
+
+    def _load_avro_batches(
+        self,
+        file_path: str,
+        target_name: str,
+        columns: list,
+        batch_size: int,
+        progress=None,
+        on_batch=None,
+        timer: StageTimer = None,
+        checkpoint=None,
+        skip_rows: int = 0,
+        prepare=None,
+    ) -> dict:
+        """
+        Lee el archivo Avro bloque a bloque y carga las filas en lotes, confirmando cada lote.
+        `on_batch` y `checkpoint` se ejecutan con cada lote dentro de su misma transacción;
+        `prepare` se ejecuta con cada lote antes de insertarlo (por ejemplo, para crear particiones).
+        Los primeros `skip_rows` registros del archivo se omiten.
+        `timer` acumula el tiempo de lectura, inserción y confirmación de los lotes.
+        """
+        import fastavro
+        import pandas as pd
+
+        bulk_loader = BulkLoaderService(self.engine, chunk_size=batch_size)
+        stats = {"rows": 0, "blocks": 0, "batches": 0, "seconds": 0.0, "rows_per_second": 0.0}
+        start = time.perf_counter()
+
+        timer = timer or StageTimer("restore")
+
+        def flush(batch: list, connection):
+            df = pd.DataFrame(batch, columns=columns)
+            if prepare is not None and not df.empty:
+                prepare(df)
+            with timer.stage("insert"):
+                stats["rows"] += bulk_loader.load_chunk(connection, target_name, columns, df)
+            if on_batch is not None and not df.empty:
+                with timer.stage("rollup"):
+                    on_batch(connection, df)
+            if checkpoint is not None:
+                checkpoint(connection, {**stats, "rows_read": skip_rows + stats["rows"]})
+            with timer.stage("commit"):
+                connection.commit()
+            stats["batches"] += 1
+            stats["seconds"] = round(time.perf_counter() - start, 3)
+            stats["rows_per_second"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+            logger.debug(
+                "'%s': %s filas, %s bloques, %s filas/s", target_name, stats["rows"], stats["blocks"], stats["rows_per_second"]
+            )
+            if progress is not None:
+                progress(dict(stats))
+
+        with open(file_path, "rb") as f, self.engine.connect() as connection:
+            batch = []
+            remaining_skip = skip_rows
+            for block in timer.iterate(fastavro.block_reader(f), "read"):
+                # Los registros de cada bloque se decodifican al recorrerlo
+                with timer.stage("read"):
+                    records = list(block)
+                if remaining_skip:
+                    skipped = min(remaining_skip, len(records))
+                    records = records[skipped:]
+                    remaining_skip -= skipped
+                batch.extend(records)
+                stats["blocks"] += 1
+                if len(batch) >= batch_size:
+                    flush(batch, connection)
+                    batch = []
+            if batch or stats["batches"] == 0:
+                flush(batch, connection)
+
+        if stats["rows"] == 0:
+            logger.warning("El archivo '%s' está vacío. No se restauró nada.", file_path)
+        return stats
+
+    def _check_new_keys(self, table_name: str, primary_key: list, df: "pd.DataFrame"):
+        """
+        Falla si el lote repite una llave primaria de la metadata o si alguna ya existe en la tabla.
+        """
+        if len(primary_key) == 1:
+            keys = df[primary_key[0]].tolist()
+        else:
+            keys = list(df[primary_key].itertuples(index=False, name=None))
+        repeated = [key for key, count in Counter(keys).items() if count > 1]
+        duplicates = repeated or sorted(existing_keys(self.engine, table_name, primary_key, keys), key=str)
+        if duplicates:
+            raise ValueError(
+                f"La llave primaria {', '.join(map(str, duplicates[:5]))} ya existe en '{table_name}'. "
+                "Usa mode=merge para actualizar las filas existentes."
+            )
+
+    def _check_swap_allowed(self, table_name: str):
+        """
+        El reemplazo completo no es posible si otras tablas referencian a esta mediante llaves foráneas.
+        """
+        referencing = [
+            name for name, referenced in schema_registry.foreign_key_dependencies(self.engine).items()
+            if table_name in referenced and schema_registry.table_exists(self.engine, name)
+        ]
+        if referencing:
+            raise ValueError(
+                f"El modo 'swap' no está disponible para '{table_name}' porque la referencian: {', '.join(referencing)}."
+            )
+
+    def _create_staging_table(self, table_name: str) -> str:
+        """
+        Crea (vacía) la tabla auxiliar con las mismas columnas que la tabla a restaurar. El nombre lleva un
+        sufijo aleatorio para que dos restauraciones simultáneas de la misma tabla no compartan la tabla auxiliar.
+        """
+        preparer = self.engine.dialect.identifier_preparer
+        staging_name = f"{table_name}__restore_{uuid.uuid4().hex[:8]}"
+        unlogged = "UNLOGGED " if self.engine.dialect.name == "postgresql" else ""
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE {unlogged}TABLE {preparer.quote(staging_name)} AS "
+                f"SELECT * FROM {preparer.quote(table_name)} WHERE 1 = 0"
+            ))
+        return staging_name
+
+    def _drop_staging_table(self, staging_name: str):
+        preparer = self.engine.dialect.identifier_preparer
+        with self.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {preparer.quote(staging_name)}"))
+
+    def _swap_from_staging(self, table_name: str, staging_name: str, columns: list):
+        """
+        Reemplaza el contenido de la tabla con el de la tabla auxiliar en una única transacción.
+        """
+        preparer = self.engine.dialect.identifier_preparer
+        column_list = ", ".join(preparer.quote(name) for name in columns)
+        with self.engine.begin() as connection:
+            connection.execute(text(f"DELETE FROM {preparer.quote(table_name)}"))
+            connection.execute(text(
+                f"INSERT INTO {preparer.quote(table_name)} ({column_list}) "
+                f"SELECT {column_list} FROM {preparer.quote(staging_name)}"
+            ))
+            connection.execute(text(f"DROP TABLE {preparer.quote(staging_name)}"))
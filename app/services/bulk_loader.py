@@ -0,0 +1,118 @@
+import io
+from typing import TYPE_CHECKING
+from sqlalchemy import table, column
+from sqlalchemy.engine import Engine, Connection
+from app.services.instrumentation import StageTimer
+from app.config import CSV_CHUNK_SIZE
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class BulkLoaderService:
+    def __init__(self, engine: Engine, chunk_size: int = CSV_CHUNK_SIZE):
+        """
+        Inicializa el motor de carga masiva.
+        En PostgreSQL usa `COPY ... FROM STDIN`; en otros motores usa `executemany` por bloques.
+        """
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.is_postgres = engine.dialect.name == "postgresql"
+
+    def load_chunks(self, table_name: str, columns: list, chunks, on_chunk=None, timer: StageTimer = None) -> int:
+        """
+        Carga una secuencia de DataFrames en la tabla dentro de una única transacción.
+        Solo se mantiene en memoria un bloque a la vez. Devuelve el número de filas cargadas.
+        `timer` acumula el tiempo de las etapas de inserción y confirmación.
+        """
+        timer = timer or StageTimer("bulk_loader")
+        total_rows = 0
+        with self.engine.connect() as connection:
+            with connection.begin() as transaction:
+                for chunk in chunks:
+                    with timer.stage("insert"):
+                        total_rows += self.load_chunk(connection, table_name, columns, chunk)
+                    if on_chunk is not None:
+                        with timer.stage("rollup"):
+                            on_chunk(connection, chunk)
+                with timer.stage("commit"):
+                    transaction.commit()
+        return total_rows
+
+    def load_chunks_checkpointed(
+        self, table_name: str, columns: list, chunks, checkpoint, on_chunk=None, timer: StageTimer = None
+    ) -> int:
+        """
+        Carga una secuencia de pares `(DataFrame, posición)` confirmando cada bloque por separado.
+        `checkpoint(connection, posición, filas)` se ejecuta dentro de la transacción de cada bloque con las filas
+        cargadas hasta ese momento, de modo que el punto de control se confirma junto con los datos.
+        Devuelve el número de filas cargadas.
+        """
+        timer = timer or StageTimer("bulk_loader")
+        total_rows = 0
+        with self.engine.connect() as connection:
+            for chunk, position in chunks:
+                with connection.begin() as transaction:
+                    with timer.stage("insert"):
+                        total_rows += self.load_chunk(connection, table_name, columns, chunk)
+                    if on_chunk is not None and not chunk.empty:
+                        with timer.stage("rollup"):
+                            on_chunk(connection, chunk)
+                    checkpoint(connection, position, total_rows)
+                    with timer.stage("commit"):
+                        transaction.commit()
+        return total_rows
+
+    def load_chunk(self, connection: Connection, table_name: str, columns: list, df: "pd.DataFrame") -> int:
+        """
+        Carga un único DataFrame usando la conexión (y transacción) recibida.
+        """
+        if df.empty:
+            return 0
+
+        df = self._normalize_integers(df)
+        if self.is_postgres:
+            self._copy_chunk(connection, table_name, columns, df)
+        else:
+            self._executemany_chunk(connection, table_name, columns, df)
+        return len(df)
+
+    def _normalize_integers(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Convierte a enteros nulables las columnas float que solo contienen valores enteros.
+        pandas lee como float las columnas enteras con nulos, y COPY no acepta '1.0' en una columna INTEGER.
+        """
+        float_columns = [
+            name for name in df.columns
+            if df[name].dtype.kind == "f" and (df[name].dropna() % 1 == 0).all()
+        ]
+        if not float_columns:
+            return df
+        return df.astype({name: "Int64" for name in float_columns})
+
+    def _copy_chunk(self, connection: Connection, table_name: str, columns: list, df: "pd.DataFrame"):
+        """
+        Envía el bloque con `COPY ... FROM STDIN` en formato CSV (los campos vacíos se cargan como NULL).
+        """
+        preparer = connection.dialect.identifier_preparer
+        column_list = ", ".join(preparer.quote(name) for name in columns)
+        statement = f"COPY {preparer.quote(table_name)} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(statement, buffer)
+        finally:
+            cursor.close()
+
+    def _executemany_chunk(self, connection: Connection, table_name: str, columns: list, df: "pd.DataFrame"):
+        """
+        Inserta el bloque con un único `executemany` para motores sin soporte de COPY.
+        """
+        target = table(table_name, *[column(name) for name in columns])
+        records = df.astype(object).where(df.notna(), None)
+        records.columns = columns
+        connection.execute(target.insert(), records.to_dict(orient="records"))
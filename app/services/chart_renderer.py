@@ -0,0 +1,126 @@
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from app.config import CHART_MAX_WORKERS, CHART_RENDER_TIMEOUT
+
+# Formatos de imagen soportados y su tipo de contenido
+CHART_FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+# Rango de DPI permitido para los gráficos
+MIN_DPI = 50
+MAX_DPI = 300
+
+
+def _new_figure(figsize: tuple):
+    """
+    Crea una figura independiente con la API orientada a objetos (sin el estado global de pyplot).
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _save_figure(figure, format: str, dpi: int) -> bytes:
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=format, dpi=dpi)
+    return buffer.getvalue()
+
+
+def render_employees_per_quarter(labels: list, quarters: dict, format: str = "png", dpi: int = 100, year: int = 2021) -> bytes:
+    """
+    Dibuja un gráfico de barras apiladas por trimestre para cada combinación departamento - trabajo.
+    Cada trimestre se apila sobre los anteriores en lugar de superponer una serie completa por trimestre.
+    """
+    import numpy as np
+
+    figure = _new_figure((12, 8))
+    axes = figure.add_subplot()
+
+    positions = np.arange(len(labels))
+    bottom = np.zeros(len(labels))
+    for quarter, values in quarters.items():
+        values = np.asarray(values, dtype=float)
+        axes.bar(positions, values, bottom=bottom, label=quarter)
+        bottom += values
+
+    axes.set_xlabel("Departamento - Trabajo", fontsize=12)
+    axes.set_ylabel("Número de Contrataciones", fontsize=12)
+    axes.set_title(f"Empleados Contratados por Trimestre en {year}", fontsize=14)
+    axes.set_xticks(positions)
+    axes.set_xticklabels(labels, rotation=45, ha="right", fontsize=10)
+    axes.legend(title="Trimestres")
+    figure.tight_layout()
+    return _save_figure(figure, format, dpi)
+
+
+def render_above_average_departments(departments: list, hired: list, format: str = "png", dpi: int = 100, year: int = 2021) -> bytes:
+    """
+    Dibuja un gráfico de barras de los departamentos con contrataciones por encima del promedio.
+    """
+    figure = _new_figure((10, 6))
+    axes = figure.add_subplot()
+
+    positions = range(len(departments))
+    axes.bar(positions, hired, color="skyblue")
+    axes.set_xlabel("Departamento", fontsize=12)
+    axes.set_ylabel("Número de Contrataciones", fontsize=12)
+    axes.set_title(f"Departamentos con Contrataciones por Encima del Promedio ({year})", fontsize=14)
+    axes.set_xticks(list(positions))
+    axes.set_xticklabels(departments, rotation=45, ha="right", fontsize=10)
+    figure.tight_layout()
+    return _save_figure(figure, format, dpi)
+
+
+class ChartRenderPool:
+    def __init__(self, max_workers: int = CHART_MAX_WORKERS, timeout: float = CHART_RENDER_TIMEOUT):
+        """
+        Pool acotado de procesos para generar gráficos fuera de los hilos que atienden las solicitudes.
+        Con `max_workers` igual a 0 los gráficos se generan en el hilo que los solicita.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 'spawn' evita heredar hilos y conexiones del proceso del servidor
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            return self._executor
+
+    def render(self, function, *args) -> bytes:
+        """
+        Ejecuta una función de dibujo en el pool y devuelve la imagen generada.
+        """
+        if self.max_workers <= 0:
+            return function(*args)
+        return self._get_executor().submit(function, *args).result(timeout=self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def validate_chart_options(format: str, dpi: int):
+    """
+    Valida el formato y la resolución solicitados para un gráfico.
+    """
+    if format not in CHART_FORMATS:
+        raise ValueError(f"Formato de gráfico no soportado. Usa {' o '.join(CHART_FORMATS)}.")
+    if not MIN_DPI <= dpi <= MAX_DPI:
+        raise ValueError(f"El DPI debe estar entre {MIN_DPI} y {MAX_DPI}.")
+
+
+# Pool compartido por el proceso
+chart_pool = ChartRenderPool()
@@ -0,0 +1,371 @@
+import io
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.services.instrumentation import instrumentation
+from app.services.result_cache import data_versions, rewritten
+from app.services.rollup_service import SOURCE_TABLE, period_bounds
+from app.services.schema_registry import schema_registry
+from app.config import COLUMNAR_FULL_RELOAD_INTERVAL, COLUMNAR_REFRESH_INTERVAL
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from app.services.metrics_service import MetricFilters
+
+logger = logging.getLogger(__name__)
+
+# Tablas de nombres que el motor mantiene en memoria y su columna de nombre
+DIMENSION_TABLES = {"departments": "department", "jobs": "job"}
+
+
+class _Dictionary:
+    """
+    Diccionario que asigna a cada id un código entero denso (0, 1, 2...) en orden de aparición.
+    Los códigos no cambian al agregar ids nuevos, así los arrays ya codificados siguen siendo válidos.
+    """
+
+    def __init__(self):
+        import numpy as np
+
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def encode(self, values: "np.ndarray") -> "np.ndarray":
+        import numpy as np
+        import pandas as pd
+
+        index = pd.Index(self.ids)
+        codes = index.get_indexer(values)
+        unknown = codes < 0
+        if unknown.any():
+            self.ids = np.concatenate([self.ids, pd.unique(values[unknown]).astype(np.int64)])
+            codes = pd.Index(self.ids).get_indexer(values)
+        return codes.astype(np.int32)
+
+
+class _Snapshot:
+    """
+    Columnas de `hired_employees` en memoria. Cada actualización crea un snapshot nuevo,
+    de modo que los cálculos en curso siguen usando arrays que no cambian.
+    """
+
+    def __init__(self, hired_at, quarter, department, job, department_ids, job_ids, names: dict, source_rows: int, watermark: int):
+        self.hired_at = hired_at  # int64: nanosegundos desde 1970 en UTC
+        self.quarter = quarter  # int8: trimestre de cada contratación
+        self.department = department  # int32: código del departamento
+        self.job = job  # int32: código del puesto
+        self.department_ids = department_ids  # id de cada código de departamento
+        self.job_ids = job_ids  # id de cada código de puesto
+        self.names = names  # {tabla: DataFrame con `id` y `name`}
+        self.source_rows = source_rows  # Filas leídas de la tabla (incluye las descartadas por nulos)
+        self.watermark = watermark  # Mayor llave primaria leída
+
+    @property
+    def nbytes(self) -> int:
+        return self.hired_at.nbytes + self.quarter.nbytes + self.department.nbytes + self.job.nbytes
+
+
+class ColumnarMetricsEngine:
+    def __init__(
+        self,
+        engine: Engine,
+        refresh_interval: float = COLUMNAR_REFRESH_INTERVAL,
+        full_reload_interval: float = COLUMNAR_FULL_RELOAD_INTERVAL,
+    ):
+        """
+        Motor de métricas en memoria para réplicas de solo lectura: mantiene `hired_employees` como columnas
+        NumPy compactas (fecha en int64, departamento y puesto como códigos enteros) y `departments`/`jobs`
+        como tablas de nombres, y calcula las métricas con agregaciones vectorizadas sin consultar la base de datos.
+        Antes de cada cálculo (como máximo cada `refresh_interval` segundos, o de inmediato si una carga
+        de este proceso cambió la tabla) lee solo las filas con llave primaria mayor a la última leída.
+        Vuelve a leer la tabla completa si el número de filas no coincide (filas eliminadas o particiones
+        desconectadas), si una escritura de este proceso reemplazó filas existentes (mezclas y restauraciones
+        con reemplazo) o cambió la tabla sin agregar filas, o si pasaron `full_reload_interval` segundos,
+        lo que también recoge las filas actualizadas en su lugar por otros procesos.
+        """
+        self.engine = engine
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._departments = _Dictionary()
+        self._jobs = _Dictionary()
+        self._versions = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self.primary_key = None
+
+    # Carga y actualización
+
+    def _primary_key(self) -> str:
+        keys = [entry.column_name for entry in schema_registry.get_columns(self.engine, SOURCE_TABLE) if entry.is_primary_key]
+        if len(keys) != 1:
+            raise ValueError(f"El motor columnar requiere una llave primaria entera de una columna en '{SOURCE_TABLE}'.")
+        return keys[0]
+
+    def _read_frame(self, query: str, params: dict = None) -> "pd.DataFrame":
+        """
+        Lee el resultado de una consulta como DataFrame. En PostgreSQL usa `COPY (consulta) TO STDOUT`,
+        así las filas no pasan por objetos `Row` de SQLAlchemy.
+        """
+        import pandas as pd
+
+        with self.engine.connect() as connection:
+            if self.engine.dialect.name != "postgresql":
+                result = connection.execute(text(query), params or {})
+                return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+            statement = text(query).bindparams(**(params or {})).compile(
+                dialect=self.engine.dialect, compile_kwargs={"literal_binds": True}
+            )
+            buffer = io.BytesIO()
+            cursor = connection.connection.cursor()
+            try:
+                cursor.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+            finally:
+                cursor.close()
+            buffer.seek(0)
+            return pd.read_csv(buffer)
+
+    def _load_dimensions(self) -> dict:
+        return {
+            table_name: self._read_frame(f"SELECT id, {column} AS name FROM {table_name}").dropna(subset=["id"])
+            for table_name, column in DIMENSION_TABLES.items()
+        }
+
+    def _snapshot_of(self, columns, source_rows: int, watermark: int) -> _Snapshot:
+        return _Snapshot(
+            *columns,
+            department_ids=self._departments.ids,
+            job_ids=self._jobs.ids,
+            names=self._load_dimensions(),
+            source_rows=source_rows,
+            watermark=watermark,
+        )
+
+    def _read_hires(self, watermark: int = None) -> "pd.DataFrame":
+        quote = self.engine.dialect.identifier_preparer.quote
+        key = quote(self.primary_key)
+        query = f"SELECT {key} AS id, datetime, department_id, job_id FROM {SOURCE_TABLE}"
+        if watermark is None:
+            return self._read_frame(f"{query} ORDER BY {key}")
+        return self._read_frame(f"{query} WHERE {key} > :watermark ORDER BY {key}", {"watermark": watermark})
+
+    def _encode(self, frame: "pd.DataFrame") -> tuple:
+        """
+        Convierte las filas leídas en columnas compactas, descartando (como el resumen) las que tienen nulos.
+        """
+        import numpy as np
+        import pandas as pd
+
+        hired_at = pd.to_datetime(frame["datetime"], utc=True, errors="coerce")
+        department = pd.to_numeric(frame["department_id"], errors="coerce")
+        job = pd.to_numeric(frame["job_id"], errors="coerce")
+        valid = (hired_at.notna() & department.notna() & job.notna()).to_numpy()
+
+        # La resolución que infiere pandas depende de la versión (`ns` o `us`): se fija en nanosegundos
+        hired_at = hired_at[valid].astype("datetime64[ns, UTC]")
+        return (
+            hired_at.astype("int64").to_numpy(),
+            hired_at.dt.quarter.to_numpy(dtype=np.int8),
+            self._departments.encode(department[valid].to_numpy(dtype=np.int64)),
+            self._jobs.encode(job[valid].to_numpy(dtype=np.int64)),
+        )
+
+    def _full_load(self):
+        import numpy as np
+
+        start = time.perf_counter()
+        self.primary_key = self._primary_key()
+        self._departments = _Dictionary()
+        self._jobs = _Dictionary()
+        frame = self._read_hires()
+        columns = self._encode(frame)
+        watermark = int(frame["id"].max()) if not frame.empty else -np.iinfo(np.int64).max
+        self._snapshot = self._snapshot_of(columns, len(frame), watermark)
+        self._loaded_at = time.monotonic()
+
+        elapsed = time.perf_counter() - start
+        instrumentation.observe("stage_duration_seconds", elapsed, component="columnar_metrics", stage="full_load")
+        instrumentation.set_gauge("columnar_metrics_bytes", self._snapshot.nbytes)
+        logger.info(
+            "Motor columnar cargado: %s filas de '%s' (%.1f MB) en %.3f s.",
+            len(columns[0]), SOURCE_TABLE, self._snapshot.nbytes / 1024 / 1024, elapsed,
+        )
+
+    def _incremental_load(self, source_changed: bool = False) -> bool:
+        """
+        Agrega las filas nuevas según la marca de agua. Devuelve False si la tabla cambió de otra forma
+        (filas eliminadas) y hace falta una carga completa. Con `source_changed` (una escritura de este proceso
+        cambió la tabla), no encontrar filas nuevas también exige una carga completa: la escritura
+        actualizó filas existentes.
+        """
+        import numpy as np
+
+        snapshot = self._snapshot
+        quote = self.engine.dialect.identifier_preparer.quote
+        with self.engine.connect() as connection:
+            total, watermark = connection.execute(
+                text(f"SELECT COUNT(*), MAX({quote(self.primary_key)}) FROM {SOURCE_TABLE}")
+            ).one()
+        if watermark is None or watermark <= snapshot.watermark:
+            if total != snapshot.source_rows or source_changed:
+                return False
+            # Sin filas nuevas: solo se actualizan los nombres de departamentos y puestos
+            self._snapshot = self._snapshot_of(
+                (snapshot.hired_at, snapshot.quarter, snapshot.department, snapshot.job), total, snapshot.watermark
+            )
+            return True
+
+        frame = self._read_hires(snapshot.watermark)
+        if snapshot.source_rows + len(frame) != total:
+            return False
+
+        columns = self._encode(frame)
+        self._snapshot = self._snapshot_of(
+            [np.concatenate([current, new]) for current, new in zip(
+                (snapshot.hired_at, snapshot.quarter, snapshot.department, snapshot.job), columns
+            )],
+            total,
+            int(frame["id"].max()),
+        )
+        instrumentation.set_gauge("columnar_metrics_bytes", self._snapshot.nbytes)
+        logger.debug("Motor columnar: %s filas nuevas de '%s'.", len(frame), SOURCE_TABLE)
+        return True
+
+    def refresh(self, force: bool = False) -> _Snapshot:
+        """
+        Actualiza los datos en memoria si corresponde y devuelve el snapshot vigente.
+        """
+        versions = dict(data_versions.snapshot((SOURCE_TABLE, rewritten(SOURCE_TABLE), *DIMENSION_TABLES)))
+        now = time.monotonic()
+        with self._lock:
+            previous = self._versions or {}
+            if (
+                self._snapshot is None
+                or force
+                or now - self._loaded_at >= self.full_reload_interval
+                or versions[rewritten(SOURCE_TABLE)] != previous.get(rewritten(SOURCE_TABLE))
+            ):
+                self._full_load()
+            elif versions != previous or now - self._checked_at >= self.refresh_interval:
+                if not self._incremental_load(source_changed=versions[SOURCE_TABLE] != previous.get(SOURCE_TABLE)):
+                    logger.info("'%s' cambió fuera de la marca de agua: recarga completa.", SOURCE_TABLE)
+                    self._full_load()
+            else:
+                return self._snapshot
+            self._versions = versions
+            self._checked_at = now
+            return self._snapshot
+
+    # Métricas
+
+    @staticmethod
+    def _selection(snapshot: _Snapshot, filters: "MetricFilters"):
+        """
+        Máscara de las contrataciones del periodo (rango semiabierto de timestamps) y de los filtros opcionales.
+        """
+        start, _ = period_bounds(filters.year, filters.quarter_from)
+        _, end = period_bounds(filters.year, filters.quarter_to)
+        mask = (snapshot.hired_at >= int(start.timestamp()) * 10**9) & (snapshot.hired_at < int(end.timestamp()) * 10**9)
+        for ids, codes, value in (
+            (snapshot.department_ids, snapshot.department, filters.department_id),
+            (snapshot.job_ids, snapshot.job, filters.job_id),
+        ):
+            if value is not None:
+                matches = (ids == value).nonzero()[0]
+                mask &= codes == (matches[0] if len(matches) else -1)
+        return mask
+
+    @staticmethod
+    def _names_for(snapshot: _Snapshot, table_name: str, ids: "np.ndarray") -> tuple:
+        """
+        Nombre de cada código y máscara de los códigos con fila en la tabla (equivale al JOIN de la consulta).
+        """
+        import numpy as np
+        import pandas as pd
+
+        names = snapshot.names[table_name]
+        positions = pd.Index(names["id"].astype("int64")).get_indexer(ids)
+        known = positions >= 0
+        labels = np.empty(len(ids), dtype=object)
+        labels[known] = names["name"].to_numpy(dtype=object)[positions[known]]
+        return labels, known
+
+    def employees_per_quarter(self, filters: "MetricFilters") -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
+
+        snapshot = self.refresh()
+        mask = self._selection(snapshot, filters)
+        department_names, department_known = self._names_for(snapshot, "departments", snapshot.department_ids)
+        job_names, job_known = self._names_for(snapshot, "jobs", snapshot.job_ids)
+        quarters = ["Q1", "Q2", "Q3", "Q4"]
+
+        # Conteo por (departamento, puesto, trimestre) con un único bincount sobre una llave combinada
+        jobs = len(snapshot.job_ids)
+        cells = len(snapshot.department_ids) * jobs
+        key = (snapshot.department[mask].astype(np.int64) * jobs + snapshot.job[mask]) * 4 + (snapshot.quarter[mask] - 1)
+        counts = np.bincount(key, minlength=cells * 4).reshape(cells, 4)
+
+        combos = np.flatnonzero(counts.any(axis=1))
+        department_codes, job_codes = np.divmod(combos, max(jobs, 1))
+        joined = department_known[department_codes] & job_known[job_codes]
+        combos, department_codes, job_codes = combos[joined], department_codes[joined], job_codes[joined]
+
+        frame = pd.DataFrame(counts[combos], columns=quarters)
+        frame.insert(0, "job", job_names[job_codes])
+        frame.insert(0, "department", department_names[department_codes])
+        # Igual que la consulta: se agrupa y ordena por nombre
+        return frame.groupby(["department", "job"], as_index=False, sort=True)[quarters].sum()
+
+    def above_average_departments(self, filters: "MetricFilters") -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
+
+        snapshot = self.refresh()
+        mask = self._selection(snapshot, filters)
+        department_names, department_known = self._names_for(snapshot, "departments", snapshot.department_ids)
+
+        # Como la consulta, solo se exige que exista el departamento (no se une `jobs`)
+        counts = np.bincount(snapshot.department[mask], minlength=len(snapshot.department_ids))
+        codes = np.flatnonzero((counts > 0) & department_known)
+        frame = pd.DataFrame({
+            "id": snapshot.department_ids[codes],
+            "department": department_names[codes],
+            "hired": counts[codes],
+        })
+        if frame.empty:
+            return frame
+        frame = frame[frame["hired"] > frame["hired"].mean()]
+        return frame.sort_values("hired", ascending=False, kind="stable").reset_index(drop=True)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"rows": 0, "bytes": 0}
+        return {
+            "rows": len(snapshot.hired_at),
+            "bytes": snapshot.nbytes,
+            "watermark": snapshot.watermark,
+            "departments": len(snapshot.department_ids),
+            "jobs": len(snapshot.job_ids),
+        }
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_columnar_engine(engine: Engine) -> ColumnarMetricsEngine:
+    """
+    Devuelve el motor columnar compartido por el proceso para la base de datos de `engine`.
+    """
+    key = str(engine.url)
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = ColumnarMetricsEngine(engine)
+        return _engines[key]
@@ -1,9 +1,41 @@
+import io
+import logging
 import os
+import time
 from datetime import datetime
-import pandas as pd
-from sqlalchemy import inspect, Table, Column, Integer, String, MetaData, Boolean, ForeignKey
+from typing import TYPE_CHECKING
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, Boolean, ForeignKey, bindparam, inspect, select, text
 from sqlalchemy.orm import Session
-from app.database.models import Metadata
+from app.database.models import Metadata, HiringRollup
+from app.services.bulk_loader import BulkLoaderService
+from app.services.schema_registry import schema_registry
+from app.services.rollup_service import HiringRollupService, SOURCE_TABLE as ROLLUP_SOURCE_TABLE
+from app.services.result_cache import data_versions, rewritten
+from app.services.instrumentation import StageTimer, instrumentation
+from app.services.row_validator import RowValidator
+from app.services.merge_loader import LOAD_MODES, MergeLoaderService
+from app.services.index_manager import IndexManagerService, indexed_columns
+from app.services.partition_manager import PARTITION_GRANULARITIES, PartitionManagerService, partition_column
+from app.config import UPLOAD_BUFFER_SIZE
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Columnas del CSV de metadata y llave usada para sincronizarlas
+METADATA_COLUMNS = [
+    "table_name",
+    "column_name",
+    "data_type",
+    "is_primary_key",
+    "is_foreign_key",
+    "foreign_table",
+    "foreign_column",
+    "is_indexed",
+    "partition_by",
+]
+METADATA_KEY = ["table_name", "column_name"]
+
+logger = logging.getLogger(__name__)
 
 class CSVLoaderService:
     def __init__(self, db: Session):
@@ -13,12 +45,13 @@ class CSVLoaderService:
         self.db = db
         self.engine = db.get_bind()
         self.metadata = MetaData()
+        self.bulk_loader = BulkLoaderService(self.engine)
 
     def create_metadata_table(self):
         """
         Crea la tabla de metadata si no existe.
         """
-        if not inspect(self.engine).has_table("metadata"):
+        if not schema_registry.table_exists(self.engine, "metadata"):
             metadata_table = Table(
                 "metadata",
                 self.metadata,
@@ -30,61 +63,188 @@ class CSVLoaderService:
                 Column("is_foreign_key", Boolean, nullable=False, default=False),
                 Column("foreign_table", String, nullable=True),  # Puede ser nulo
                 Column("foreign_column", String, nullable=True),  # Puede ser nulo
+                Column("is_indexed", Boolean, nullable=False, default=False),  # Índice secundario sobre la columna
+                Column("partition_by", String, nullable=True),  # 'year' o 'quarter' en la columna de partición
             )
             self.metadata.create_all(self.engine)
-            print("Tabla 'metadata' creada correctamente.")
+            schema_registry.mark_table_created("metadata")
+            logger.info("Tabla 'metadata' creada correctamente.")
         else:
-            print("La tabla 'metadata' ya existe.")
+            logger.debug("La tabla 'metadata' ya existe.")
+            self._migrate_metadata_table()
+
+    def _migrate_metadata_table(self):
+        """
+        Agrega a una tabla de metadata existente las columnas incorporadas después de crearla.
+        """
+        existing = {column["name"] for column in inspect(self.engine).get_columns("metadata")}
+        added = {
+            "is_indexed": "BOOLEAN NOT NULL DEFAULT FALSE",
+            "partition_by": "VARCHAR",
+        }
+        for name, definition in added.items():
+            if name in existing:
+                continue
+            with self.engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE metadata ADD COLUMN {name} {definition}"))
+            schema_registry.invalidate()
+            logger.info("Columna '%s' agregada a la tabla 'metadata'.", name)
 
-    def load_table_structures(self, structure_file: str):
+    def load_table_structures(self, structure_file, mode: str = "sync") -> dict:
         """
         Carga la metadata desde un archivo CSV en la tabla 'metadata'.
+        - `sync`: sincroniza la metadata de las tablas del archivo usando (`table_name`, `column_name`) como llave:
+          inserta las columnas nuevas, actualiza las modificadas y elimina las que ya no están (y los duplicados).
+        - `append`: inserta todas las filas del archivo sin comparar con las existentes.
+        Todas las operaciones se aplican en una única transacción. Devuelve un resumen de los cambios.
         """
-        data = pd.read_csv(structure_file)
+        if mode not in ("sync", "append"):
+            raise ValueError("Modo no soportado. Usa 'sync' o 'append'.")
+
+        import pandas as pd
+
+        incoming = self._normalize_metadata(pd.read_csv(structure_file))
 
         # Asegúrate de que la tabla de metadata exista
         self.create_metadata_table()
 
-        # Insertar los datos en la tabla 'metadata'
-        for _, row in data.iterrows():
-            metadata_entry = Metadata(
-                table_name=row["table_name"],
-                column_name=row["column_name"],
-                data_type=row["data_type"],
-                is_primary_key=bool(row["is_primary_key"]),
-                is_foreign_key=bool(row["is_foreign_key"]),
-                foreign_table=row["foreign_table"] if pd.notna(row["foreign_table"]) else None,
-                foreign_column=row["foreign_column"] if pd.notna(row["foreign_column"]) else None,
-            )
-            self.db.add(metadata_entry)
+        metadata_table = Metadata.__table__
+        if mode == "append":
+            to_insert, to_update, delete_ids = incoming, incoming.iloc[0:0], []
+        else:
+            to_insert, to_update, delete_ids = self._diff_metadata(incoming)
 
+        # Aplicar los cambios como sentencias por lotes
+        if not to_insert.empty:
+            self.db.execute(metadata_table.insert(), self._to_records(to_insert[METADATA_COLUMNS]))
+        if not to_update.empty:
+            statement = metadata_table.update().where(metadata_table.c.id == bindparam("metadata_id"))
+            self.db.execute(statement, self._to_records(to_update[["metadata_id"] + METADATA_COLUMNS]))
+        if delete_ids:
+            self.db.execute(metadata_table.delete().where(metadata_table.c.id.in_(delete_ids)))
         self.db.commit()
-        print("Metadata cargada correctamente.")
+
+        # La metadata cambió: descartar las definiciones almacenadas
+        schema_registry.invalidate()
+        data_versions.bump("metadata")
+
+        # Crear en las tablas existentes los índices que la metadata declara y aún no tienen
+        indexes = IndexManagerService(self.engine).ensure_indexes(incoming["table_name"].dropna().unique().tolist())
+
+        summary = {
+            "inserted": len(to_insert),
+            "updated": len(to_update),
+            "deleted": len(delete_ids),
+            "unchanged": len(incoming) - len(to_insert) - len(to_update),
+            "indexed_tables": sorted(indexes),
+        }
+        logger.info("Metadata cargada correctamente: %s.", summary, extra={"mode": mode, **summary})
+        return summary
+
+    def _normalize_metadata(self, data: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Normaliza el CSV de metadata en una sola pasada vectorizada (tipos, nulos y duplicados).
+        """
+        data = data.reindex(columns=METADATA_COLUMNS)
+        for flag in ("is_primary_key", "is_foreign_key", "is_indexed"):
+            data[flag] = data[flag].fillna(False).astype(bool)
+        data = data.drop_duplicates(subset=METADATA_KEY, keep="last").reset_index(drop=True)
+
+        # Particionamiento: como máximo una columna DATETIME por tabla, por año o por trimestre
+        partition_by = data["partition_by"].where(data["partition_by"].notna(), "").astype(str).str.strip().str.lower()
+        data["partition_by"] = partition_by.where(partition_by != "", None)
+        declared = data[data["partition_by"].notna()]
+        invalid = declared[~declared["partition_by"].isin(PARTITION_GRANULARITIES) | (declared["data_type"] != "DATETIME")]
+        if not invalid.empty:
+            row = invalid.iloc[0]
+            raise ValueError(
+                f"Partición no válida en {row['table_name']}.{row['column_name']}: "
+                f"`partition_by` debe ser {' o '.join(PARTITION_GRANULARITIES)} sobre una columna DATETIME."
+            )
+        repeated = declared["table_name"][declared["table_name"].duplicated()]
+        if not repeated.empty:
+            raise ValueError(f"La tabla '{repeated.iloc[0]}' declara más de una columna de partición.")
+        return data
+
+    def _diff_metadata(self, incoming: "pd.DataFrame"):
+        """
+        Compara la metadata recibida con la almacenada y devuelve (filas a insertar, filas a actualizar, ids a eliminar).
+        Solo se eliminan filas de las tablas presentes en el archivo.
+        """
+        import pandas as pd
+
+        metadata_table = Metadata.__table__
+        query = select(metadata_table.c.id, *[metadata_table.c[name] for name in METADATA_COLUMNS]).order_by(metadata_table.c.id)
+        rows = self.db.execute(query).all()
+        existing = pd.DataFrame(rows, columns=["metadata_id"] + METADATA_COLUMNS)
+
+        # Las filas repetidas de una misma columna se eliminan, conservando la más antigua
+        duplicated = existing.duplicated(subset=METADATA_KEY, keep="first")
+        delete_ids = existing.loc[duplicated, "metadata_id"].tolist()
+        existing = existing[~duplicated]
+
+        merged = incoming.merge(existing, on=METADATA_KEY, how="outer", suffixes=("", "_current"), indicator=True)
+
+        to_insert = merged[merged["_merge"] == "left_only"]
+
+        matched = merged[merged["_merge"] == "both"]
+        changed = pd.Series(False, index=matched.index)
+        for name in METADATA_COLUMNS:
+            if name in METADATA_KEY:
+                continue
+            new, current = matched[name], matched[f"{name}_current"]
+            changed |= ~((new == current) | (new.isna() & current.isna()))
+        to_update = matched[changed].astype({"metadata_id": int})
+
+        removed = merged[(merged["_merge"] == "right_only") & merged["table_name"].isin(incoming["table_name"])]
+        delete_ids += removed["metadata_id"].tolist()
+
+        return to_insert, to_update, [int(metadata_id) for metadata_id in delete_ids]
+
+    @staticmethod
+    def _to_records(data: "pd.DataFrame") -> list:
+        """
+        Convierte un DataFrame a una lista de diccionarios, reemplazando los nulos por None.
+        """
+        return data.astype(object).where(data.notna(), None).to_dict(orient="records")
 
     def create_table_from_metadata(self, table_name: str):
         """
         Crea una tabla en la base de datos basada en la metadata.
         """
-        # Actualizar metadata
-        self.metadata.reflect(bind=self.engine)
-
-        if inspect(self.engine).has_table(table_name):
-            print(f"La tabla '{table_name}' ya existe.")
+        if schema_registry.table_exists(self.engine, table_name):
+            logger.debug("La tabla '%s' ya existe.", table_name)
             return
 
         # Obtener metadata para la tabla
-        metadata_entries = self.db.query(Metadata).filter(Metadata.table_name == table_name).all()
+        metadata_entries = schema_registry.get_columns(self.engine, table_name)
+        indexed = indexed_columns(metadata_entries)
+        partition = partition_column(metadata_entries)
+        if partition is not None and self.engine.dialect.name != "postgresql":
+            logger.warning("El particionamiento requiere PostgreSQL: la tabla '%s' se creará sin particiones.", table_name)
+            partition = None
         columns = []
 
-        print(f"Creando tabla '{table_name}'...")
+        logger.info("Creando tabla '%s'...", table_name)
         for entry in metadata_entries:
-            column_type = String if entry.data_type == "STRING" else Integer
+            column_type = self._column_type(entry.data_type)
             kwargs = {}
 
             # Configurar llave primaria
             if entry.is_primary_key:
                 kwargs["primary_key"] = True
-                print(f" - Columna '{entry.column_name}' marcada como PRIMARY KEY.")
+                logger.debug("Columna '%s' marcada como PRIMARY KEY.", entry.column_name)
+
+            # En una tabla particionada la llave primaria debe incluir la columna de partición
+            if partition is not None and entry.column_name == partition.column_name:
+                kwargs["nullable"] = False
+                if any(other.is_primary_key for other in metadata_entries):
+                    kwargs["primary_key"] = True
+
+            # Índice secundario: columnas declaradas en la metadata y llaves foráneas (usadas en los joins)
+            if entry.column_name in indexed:
+                kwargs["index"] = True
+                logger.debug("Columna '%s' tendrá un índice.", entry.column_name)
 
             # Configurar llave foránea
             if entry.is_foreign_key:
@@ -92,57 +252,282 @@ class CSVLoaderService:
                 foreign_column = entry.foreign_column
 
                 # Verifica si la tabla referenciada existe
-                if not inspect(self.engine).has_table(foreign_table):
-                    print(f"Tabla referenciada '{foreign_table}' no encontrada. Creándola primero.")
+                if not schema_registry.table_exists(self.engine, foreign_table):
+                    logger.info("Tabla referenciada '%s' no encontrada. Creándola primero.", foreign_table)
                     self.create_table_from_metadata(foreign_table)
 
+                self._declare_referenced_column(foreign_table, foreign_column)
                 foreign_key = ForeignKey(f"{foreign_table}.{foreign_column}")
-                print(f" - Columna '{entry.column_name}' tendrá FOREIGN KEY -> {foreign_table}({foreign_column}).")
+                logger.debug("Columna '%s' tendrá FOREIGN KEY -> %s(%s).", entry.column_name, foreign_table, foreign_column)
                 column = Column(entry.column_name, column_type, foreign_key, **kwargs)
             else:
                 column = Column(entry.column_name, column_type, **kwargs)
 
             columns.append(column)
 
-        # Crear la tabla
-        table = Table(table_name, self.metadata, *columns)
+        # Crear la tabla (particionada por rangos de la columna declarada; las particiones se crean al cargar)
+        table_kwargs = {}
+        if partition is not None:
+            table_kwargs["postgresql_partition_by"] = f"RANGE ({self.engine.dialect.identifier_preparer.quote(partition.column_name)})"
+            logger.info("Tabla '%s' particionada por %s de '%s'.", table_name, partition.partition_by, partition.column_name)
+        table = Table(table_name, self.metadata, *columns, **table_kwargs)
         try:
-            print(f" - Ejecutando creación de la tabla '{table_name}' con las columnas:")
-            for col in columns:
-                print(f"   > {col.name} ({col.type}) {'PRIMARY KEY' if col.primary_key else ''}")
-            self.metadata.create_all(self.engine)
-            print(f"Tabla '{table_name}' creada correctamente.")
+            logger.debug(
+                "Ejecutando creación de la tabla '%s' con las columnas: %s",
+                table_name,
+                ", ".join(f"{col.name} ({col.type}){' PRIMARY KEY' if col.primary_key else ''}" for col in columns),
+            )
+            table.create(self.engine)
+            schema_registry.mark_table_created(table_name)
+            logger.info("Tabla '%s' creada correctamente.", table_name)
         except Exception as e:
-            print(f"Error al crear la tabla '{table_name}': {str(e)}")
+            logger.error("Error al crear la tabla '%s': %s", table_name, e)
             raise
 
-    def load_csv_to_table(self, csv_path: str):
+    @staticmethod
+    def _column_type(data_type: str):
+        """
+        Convierte el tipo de dato de la metadata a un tipo de SQLAlchemy.
+        """
+        if data_type == "STRING":
+            return String
+        if data_type == "DATETIME":
+            return DateTime(timezone=True)
+        return Integer
+
+    def _declare_referenced_column(self, foreign_table: str, foreign_column: str):
+        """
+        Declara en la metadata local la columna referenciada por una llave foránea para poder
+        resolverla al crear la tabla, sin reflejar la base de datos completa.
+        """
+        if foreign_table in self.metadata.tables:
+            return
+
+        data_type = next(
+            (entry.data_type for entry in schema_registry.get_columns(self.engine, foreign_table) if entry.column_name == foreign_column),
+            "INTEGER",
+        )
+        Table(foreign_table, self.metadata, Column(foreign_column, self._column_type(data_type)))
+
+    @staticmethod
+    def table_name_from_filename(filename: str) -> str:
+        """
+        Determina la tabla de destino a partir del nombre del archivo CSV.
+        """
+        return os.path.splitext(os.path.basename(filename))[0].lower()
+
+    def load_csv_to_table(
+        self,
+        source,
+        table_name: str = None,
+        start_offset: int = 0,
+        start_line: int = 0,
+        checkpoint=None,
+        mode: str = "append",
+    ) -> dict:
         """
         Carga datos desde un archivo CSV en una tabla específica, creando la tabla si no existe basada en la metadata.
+        `source` puede ser una ruta o un archivo binario abierto (por ejemplo, el archivo de un `UploadFile`).
+        El archivo se lee y se envía a la base de datos en bloques acotados por `UPLOAD_BUFFER_SIZE`.
+        Las filas que no pasan la validación se escriben en un archivo de cuarentena y el resto se carga.
+        Devuelve las filas cargadas y las rechazadas por motivo.
+        Sin `checkpoint` todo el archivo se carga en una única transacción. Con `checkpoint`, cada bloque se confirma
+        por separado y `checkpoint(connection, avance)` se ejecuta dentro de su transacción con el avance acumulado
+        (`offset` en bytes, `lines` leídas, `rows` cargadas y el resumen de rechazos); una carga interrumpida
+        se reanuda pasando el último `offset` y `lines` confirmados como `start_offset` y `start_line`.
+        Con `mode="merge"` las filas cuya llave primaria ya existe actualizan a las existentes en lugar de fallar,
+        y el resumen incluye las filas insertadas, actualizadas y sin cambios.
+        Si la tabla está particionada, las particiones que faltan se crean antes de cargar cada bloque.
         """
-        # Leer datos del archivo CSV
-        data = pd.read_csv(csv_path, header=None)
+        if mode not in LOAD_MODES:
+            raise ValueError("Modo no soportado. Usa 'append' o 'merge'.")
 
         # Determinar la tabla a la que pertenece
-        table_name = os.path.splitext(os.path.basename(csv_path))[0].lower()
+        if table_name is None:
+            table_name = self.table_name_from_filename(source)
+
+        timer = StageTimer("csv_loader")
+        start = time.perf_counter()
 
         # Validar si la tabla existe y crearla si es necesario
-        inspector = inspect(self.engine)
-        if table_name not in inspector.get_table_names():
-            print(f"La tabla '{table_name}' no existe. Creándola a partir de la metadata...")
-            self.create_table_from_metadata(table_name)
+        if not schema_registry.table_exists(self.engine, table_name):
+            logger.info("La tabla '%s' no existe. Creándola a partir de la metadata...", table_name)
+            with timer.stage("create_table"):
+                self.create_table_from_metadata(table_name)
 
         # Obtener las columnas desde la metadata
-        metadata_entries = self.db.query(Metadata).filter(Metadata.table_name == table_name).all()
+        metadata_entries = schema_registry.get_columns(self.engine, table_name)
         columns = [entry.column_name for entry in metadata_entries]
 
-        if len(columns) != data.shape[1]:
-            raise ValueError(f"El número de columnas en el archivo ({data.shape[1]}) no coincide con la metadata ({len(columns)}).")
+        # En modo 'merge' las llaves existentes no se rechazan: actualizan sus filas
+        merge_loader = MergeLoaderService(self.engine, table_name) if mode == "merge" else None
+        merged = {}
 
-        # Asignar nombres de columnas basados en la metadata
-        data.columns = columns
+        # Leer datos del archivo CSV por bloques e insertarlos en la tabla
+        stream = open(source, "rb") if isinstance(source, str) else source
+        validator = RowValidator(self.engine, table_name, first_line=start_line, check_existing=merge_loader is None)
+        try:
+            if start_offset:
+                stream.seek(start_offset)
+            blocks = timer.iterate(self.read_csv_blocks(stream), "parse")
+            save = None
+            if checkpoint is None:
+                chunks = self._validate_chunks((chunk for _, chunk in blocks), columns, timer, validator)
+            else:
+                def save(connection, position: dict, loaded: int):
+                    checkpoint(connection, {**position, "rows": loaded, **validator.summary()})
+
+                chunks = self._checkpointed_chunks(blocks, columns, start_offset, start_line, timer, validator)
+
+            # Crear las particiones que necesita cada bloque antes de cargarlo
+            partition_manager = PartitionManagerService(self.engine)
+            if partition_manager.spec(table_name) is not None:
+                chunks = partition_manager.prepare_chunks(table_name, chunks, timer, with_position=save is not None)
+
+            if merge_loader is not None:
+                merged = merge_loader.load_chunks(columns, chunks, save, timer)
+                rows = merged["inserted"] + merged["updated"]
+                if table_name == ROLLUP_SOURCE_TABLE:
+                    # Las filas actualizadas no se pueden sumar como incrementos: el resumen se reconstruye
+                    with timer.stage("rollup"):
+                        HiringRollupService(self.engine).rebuild()
+            elif save is None:
+                rows = self.bulk_loader.load_chunks(
+                    table_name, columns, chunks, on_chunk=self._rollup_hook(table_name), timer=timer
+                )
+            else:
+                rows = self.bulk_loader.load_chunks_checkpointed(
+                    table_name, columns, chunks, save, on_chunk=self._rollup_hook(table_name), timer=timer
+                )
+        finally:
+            if stream is not source:
+                stream.close()
+            validator.close()
+            timer.record()
+
+        # Invalidar los resultados en caché que dependen de la tabla (una mezcla además reescribe filas existentes)
+        data_versions.bump(
+            table_name,
+            *([HiringRollup.__tablename__] if table_name == ROLLUP_SOURCE_TABLE else []),
+            *([rewritten(table_name)] if mode == "merge" else []),
+        )
+        elapsed = time.perf_counter() - start
+        instrumentation.record_rows(table_name, "csv_load", rows, elapsed)
+        summary = {"rows": rows, **merged, **validator.summary()}
+        if summary["rejected"]:
+            logger.warning(
+                "%s filas rechazadas al cargar '%s' (%s), enviadas a %s.",
+                summary["rejected"],
+                table_name,
+                summary["reasons"],
+                summary["quarantine_file"],
+            )
+        logger.info(
+            "Datos cargados exitosamente en la tabla '%s' (%s filas).",
+            table_name,
+            rows,
+            extra={"table": table_name, "rows": rows, "rejected": summary["rejected"], "seconds": round(elapsed, 3)},
+        )
+        return summary
+
+    def _rollup_hook(self, table_name: str):
+        """
+        Devuelve la función que actualiza el resumen de contrataciones con cada bloque cargado,
+        o None si la tabla no alimenta el resumen.
+        """
+        if table_name != ROLLUP_SOURCE_TABLE:
+            return None
+
+        rollup_service = HiringRollupService(self.engine)
+        rollup_service.ensure()
+        return rollup_service.apply_chunk
 
-        # Insertar los datos en la tabla
-        data.to_sql(table_name, self.engine, if_exists="append", index=False)
-        print(f"Datos cargados exitosamente en la tabla '{table_name}'.")
+    def read_csv_chunks(self, stream, buffer_size: int = UPLOAD_BUFFER_SIZE):
+        """
+        Lee un CSV sin encabezado desde un archivo binario en bloques de como máximo `buffer_size` bytes,
+        cortados en el último salto de línea que termina un registro, y los devuelve como DataFrames.
+        Un registro más largo que el buffer se acumula hasta completarse.
+        """
+        for _, chunk in self.read_csv_blocks(stream, buffer_size):
+            yield chunk
+
+    def read_csv_blocks(self, stream, buffer_size: int = UPLOAD_BUFFER_SIZE):
+        """
+        Igual que `read_csv_chunks`, pero devuelve pares `(bytes, DataFrame)` con los bytes del archivo
+        que ocupa cada bloque, para poder registrar hasta dónde se cargó.
+        """
+        import pandas as pd
+
+        pending = b""
+        while True:
+            block = stream.read(buffer_size)
+            if not block:
+                break
+
+            block = pending + block
+            cut = self._record_boundary(block)
+            if cut == 0:
+                pending = block
+                continue
+
+            pending = block[cut:]
+            yield cut, pd.read_csv(io.BytesIO(block[:cut]), header=None)
+
+        if pending.strip():
+            yield len(pending), pd.read_csv(io.BytesIO(pending), header=None)
+
+    @staticmethod
+    def _record_boundary(block: bytes) -> int:
+        """
+        Devuelve la posición siguiente al último salto de línea de `block` que está fuera de un campo
+        entre comillas (0 si no hay ninguno). `block` empieza al inicio de un registro, así que un salto
+        de línea termina un registro cuando el número de comillas anteriores es par (las comillas
+        escapadas `""` suman dos y no cambian la paridad).
+        """
+        end = len(block)
+        quotes = block.count(b'"')
+        position = block.rfind(b"\n")
+        while position >= 0:
+            quotes -= block.count(b'"', position, end)
+            if quotes % 2 == 0:
+                return position + 1
+            end = position
+            position = block.rfind(b"\n", 0, position)
+        return 0
+
+    def _validate_chunks(self, chunks, columns: list, timer: StageTimer = None, validator: RowValidator = None):
+        """
+        Valida que cada bloque tenga el número de columnas definido en la metadata y les asigna sus nombres.
+        Con `validator`, además descarta (y envía a cuarentena) las filas con tipos, llaves primarias
+        o llaves foráneas inválidas; los bloques sin filas válidas se omiten.
+        """
+        timer = timer or StageTimer("csv_loader")
+        for chunk in chunks:
+            with timer.stage("validate"):
+                chunk = self._prepare_chunk(chunk, columns, validator)
+            if not chunk.empty:
+                yield chunk
 
+    def _checkpointed_chunks(self, blocks, columns: list, offset: int, lines: int, timer: StageTimer, validator: RowValidator):
+        """
+        Valida los bloques de `read_csv_blocks` y devuelve pares `(DataFrame, posición)`, donde la posición
+        indica los bytes y filas del archivo procesados al terminar el bloque. Los bloques sin filas válidas
+        también se devuelven, para que su posición se registre.
+        """
+        for size, chunk in blocks:
+            offset += size
+            lines += len(chunk)
+            with timer.stage("validate"):
+                chunk = self._prepare_chunk(chunk, columns, validator)
+            yield chunk, {"offset": offset, "lines": lines}
+
+    @staticmethod
+    def _prepare_chunk(chunk: "pd.DataFrame", columns: list, validator: RowValidator = None) -> "pd.DataFrame":
+        if len(columns) != chunk.shape[1]:
+            raise ValueError(f"El número de columnas en el archivo ({chunk.shape[1]}) no coincide con la metadata ({len(columns)}).")
+
+        # Asignar nombres de columnas basados en la metadata
+        chunk.columns = columns
+        if validator is not None:
+            chunk = validator.validate(chunk)
+        return chunk
@@ -0,0 +1,175 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.database.models import Transaction
+from app.services.instrumentation import SIZE_BUCKETS, instrumentation
+from app.services.result_cache import data_versions
+from app.config import GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_MAX_DELAY_MS, GROUP_COMMIT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter:
+    def __init__(
+        self,
+        engine: Engine,
+        max_batch: int = GROUP_COMMIT_MAX_BATCH,
+        max_delay_ms: float = GROUP_COMMIT_MAX_DELAY_MS,
+    ):
+        """
+        Escritor con confirmación agrupada para transacciones individuales.
+        Las solicitudes se encolan y un hilo en segundo plano las escribe juntas en un único
+        `INSERT ... RETURNING` y una sola confirmación. El lote se cierra al llegar a `max_batch`
+        filas o `max_delay_ms` milisegundos después de la primera fila, lo que ocurra primero.
+        """
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def submit(self, row: dict) -> Future:
+        """
+        Encola una transacción y devuelve un `Future` que se resuelve con su id cuando se confirma el lote.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def wait(self, future: Future, timeout: float = GROUP_COMMIT_TIMEOUT):
+        """
+        Espera el id de una transacción encolada con `submit` como máximo `timeout` segundos.
+        Si vence, ver `expire`.
+        """
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            return self.expire(future)
+
+    def expire(self, future: Future):
+        """
+        Resuelve una espera vencida: si la fila aún no se está escribiendo, la retira del lote y devuelve None
+        (la solicitud debe insertarla por su cuenta); si el lote ya terminó, devuelve su id; si el lote se
+        está escribiendo, lanza `TimeoutError`.
+        """
+        if future.cancel():
+            logger.warning("La confirmación agrupada no respondió en %s s; la transacción se inserta directamente.", GROUP_COMMIT_TIMEOUT)
+            return None
+        if future.done():
+            return future.result()
+        raise TimeoutError("La confirmación agrupada no respondió a tiempo.")
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _insert(self, rows: list) -> list:
+        from app.services.transactions import insert_rows
+
+        with Session(bind=self.engine) as db:
+            ids = insert_rows(db, rows)
+            db.commit()
+        return ids
+
+    def _write(self, batch: list) -> list:
+        """
+        Escribe el lote en una sola confirmación y devuelve pares `(elemento, id)`. Si el lote falla, las filas se
+        reintentan una por una, de modo que solo las solicitudes cuya propia fila falla reciben el error.
+        """
+        try:
+            return list(zip(batch, self._insert([row for row, _, _ in batch])))
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error("Error en la confirmación agrupada de 1 transacción: %s", e)
+                batch[0][1].set_exception(e)
+                return []
+            logger.warning("Error en la confirmación agrupada de %s transacciones, se escriben una por una: %s", len(batch), e)
+
+        written = []
+        for item in batch:
+            row, future, _ = item
+            try:
+                written.append((item, self._insert([row])[0]))
+            except Exception as e:
+                logger.error("Error escribiendo la transacción %s: %s", row, e)
+                future.set_exception(e)
+        return written
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            # Las filas cuya solicitud dejó de esperar (futuro cancelado) no se escriben
+            batch = [item for item in self._collect(first) if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            written = self._write(batch)
+            if not written:
+                continue
+
+            data_versions.bump(Transaction.__tablename__)
+            instrumentation.observe("group_commit_batch_size", len(batch), buckets=SIZE_BUCKETS)
+            now = time.perf_counter()
+            for (_, future, queued_at), transaction_id in written:
+                instrumentation.observe("group_commit_wait_seconds", now - queued_at)
+                future.set_result(transaction_id)
+
+    def stop(self, timeout: float = 5):
+        """
+        Escribe lo que quede en la cola y detiene el hilo.
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_group_commit_writer() -> GroupCommitWriter:
+    """
+    Devuelve el escritor compartido por el proceso, creándolo la primera vez.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            from app.database.session import engine
+
+            _writer = GroupCommitWriter(engine)
+        return _writer
+
+
+def stop_group_commit_writer():
+    with _writer_lock:
+        if _writer is not None:
+            _writer.stop()
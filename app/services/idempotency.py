@@ -0,0 +1,69 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.database.models import IdempotencyKey
+from app.services.schema_registry import schema_registry
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+class IdempotencyConflict(ValueError):
+    """
+    La llave de idempotencia ya se usó con otro endpoint o con un cuerpo distinto.
+    """
+
+
+def ensure_idempotency_table(db: Session):
+    """
+    Crea la tabla de llaves de idempotencia si no existe.
+    """
+    engine = db.get_bind()
+    if not schema_registry.table_exists(engine, IdempotencyKey.__tablename__):
+        IdempotencyKey.__table__.create(engine, checkfirst=True)
+        schema_registry.mark_table_created(IdempotencyKey.__tablename__)
+
+
+def request_hash(rows: list) -> str:
+    """
+    Huella del cuerpo de la solicitud, para detectar que una llave se reutiliza con otros datos.
+    """
+    return hashlib.sha256(json.dumps(rows, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def get_key(db: Session, key: str, endpoint: str, body_hash: str = None):
+    """
+    Devuelve el registro de la llave (o None si no existe), validando que corresponda a la misma solicitud.
+    """
+    ensure_idempotency_table(db)
+    record = db.execute(select(IdempotencyKey).where(IdempotencyKey.key == key)).scalar_one_or_none()
+    if record is None:
+        return None
+    if record.endpoint != endpoint or (body_hash is not None and record.request_hash not in (None, body_hash)):
+        raise IdempotencyConflict(f"La llave de idempotencia '{key}' ya se usó con otra solicitud.")
+    return record
+
+
+def save_key(db: Session, key: str, endpoint: str, status: str, rows_committed: int, response: dict = None, body_hash: str = None):
+    """
+    Guarda el avance de la llave dentro de la transacción en curso, de modo que se confirma junto con las filas.
+    No confirma la transacción.
+    """
+    values = {
+        "endpoint": endpoint,
+        "request_hash": body_hash,
+        "status": status,
+        "rows_committed": rows_committed,
+        "response": json.dumps(response) if response is not None else None,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    updated = db.execute(update(IdempotencyKey).where(IdempotencyKey.key == key).values(**values)).rowcount
+    if not updated:
+        # Si otra solicitud con la misma llave se adelantó, la llave primaria hace fallar esta transacción
+        db.execute(IdempotencyKey.__table__.insert().values(key=key, **values))
+
+
+def stored_response(record) -> dict:
+    return json.loads(record.response) if record.response else {}
@@ -0,0 +1,261 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import Engine
+from app.database.models import DeferredIndex
+from app.services.schema_registry import schema_registry
+from app.services.instrumentation import instrumentation
+from app.config import INDEX_BUILD_WORKERS, INDEX_MAINTENANCE_WORK_MEM
+
+logger = logging.getLogger(__name__)
+
+# Índices no únicos de una tabla en PostgreSQL, con la sentencia que los recrea
+SECONDARY_INDEXES = text("""
+SELECT i.relname AS name, pg_get_indexdef(i.oid) AS definition
+FROM pg_index x
+JOIN pg_class t ON t.oid = x.indrelid
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+WHERE t.relname = :table_name
+  AND n.nspname = current_schema()
+  AND NOT x.indisprimary
+  AND NOT x.indisunique
+ORDER BY i.relname
+""")
+
+
+def indexed_columns(definitions: list) -> list:
+    """
+    Columnas con índice secundario: las marcadas con `is_indexed` en la metadata y las llaves foráneas,
+    salvo que la columna sea por sí sola la llave primaria (que ya tiene su índice).
+    """
+    primary_key = [entry.column_name for entry in definitions if entry.is_primary_key]
+    return [
+        entry.column_name for entry in definitions
+        if (entry.is_indexed or entry.is_foreign_key) and [entry.column_name] != primary_key
+    ]
+
+
+def ensure_deferred_index_table(engine: Engine):
+    """
+    Crea la tabla de índices eliminados durante las cargas si no existe.
+    """
+    if not schema_registry.table_exists(engine, DeferredIndex.__tablename__):
+        DeferredIndex.__table__.create(engine, checkfirst=True)
+        schema_registry.mark_table_created(DeferredIndex.__tablename__)
+
+
+def index_name(table_name: str, column_name: str) -> str:
+    # Mismo nombre que genera SQLAlchemy para `Column(..., index=True)`
+    return f"ix_{table_name}_{column_name}"
+
+
+class IndexManagerService:
+    def __init__(self, engine: Engine, max_workers: int = INDEX_BUILD_WORKERS):
+        """
+        Administra los índices secundarios de las tablas de la metadata: crea los declarados y, durante las
+        cargas grandes, elimina los índices no únicos y los reconstruye al terminar, en paralelo entre tablas.
+        Las definiciones de los índices eliminados se guardan en `deferred_indexes` hasta que se reconstruyen,
+        así una carga interrumpida por una caída del proceso no los pierde.
+        La llave primaria y los índices únicos se conservan siempre.
+        """
+        self.engine = engine
+        self.max_workers = max_workers
+        self.is_postgres = engine.dialect.name == "postgresql"
+
+    def declared_indexes(self, table_name: str) -> list:
+        """
+        Devuelve `(nombre, sentencia)` de los índices que la metadata declara para la tabla.
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        return [
+            (
+                index_name(table_name, column_name),
+                f"CREATE INDEX IF NOT EXISTS {quote(index_name(table_name, column_name))} "
+                f"ON {quote(table_name)} ({quote(column_name)})",
+            )
+            for column_name in indexed_columns(schema_registry.get_columns(self.engine, table_name))
+        ]
+
+    def secondary_indexes(self, table_name: str) -> list:
+        """
+        Devuelve `(nombre, sentencia)` de los índices no únicos que existen en la tabla.
+        Las sentencias usan `IF NOT EXISTS`, para poder repetir la reconstrucción tras una falla.
+        """
+        if self.is_postgres:
+            with self.engine.connect() as connection:
+                rows = connection.execute(SECONDARY_INDEXES, {"table_name": table_name}).all()
+            # En una tabla particionada la definición usa `ON ONLY`, que no crearía el índice en las particiones
+            return [
+                (name, definition.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1).replace(" ON ONLY ", " ON ", 1))
+                for name, definition in rows
+            ]
+
+        quote = self.engine.dialect.identifier_preparer.quote
+        return [
+            (
+                index["name"],
+                f"CREATE INDEX IF NOT EXISTS {quote(index['name'])} ON {quote(table_name)} "
+                f"({', '.join(quote(name) for name in index['column_names'])})",
+            )
+            for index in inspect(self.engine).get_indexes(table_name)
+            if not index.get("unique") and all(index["column_names"])
+        ]
+
+    def pending_indexes(self, table_names: list = None) -> dict:
+        """
+        Devuelve `{tabla: [(nombre, sentencia)]}` con los índices eliminados por cargas que aún no se reconstruyen
+        (de todas las tablas, o solo de `table_names`).
+        """
+        ensure_deferred_index_table(self.engine)
+        query = select(DeferredIndex.table_name, DeferredIndex.index_name, DeferredIndex.definition)
+        if table_names is not None:
+            query = query.where(DeferredIndex.table_name.in_(list(table_names)))
+        pending = {}
+        with self.engine.connect() as connection:
+            for table_name, name, definition in connection.execute(query.order_by(DeferredIndex.table_name, DeferredIndex.index_name)):
+                pending.setdefault(table_name, []).append((name, definition))
+        return pending
+
+    def _forget_pending(self, indexes: dict):
+        """
+        Quita de `deferred_indexes` los índices `{tabla: [(nombre, sentencia)]}` ya reconstruidos.
+        """
+        with self.engine.begin() as connection:
+            for table_name, entries in indexes.items():
+                if entries:
+                    connection.execute(DeferredIndex.__table__.delete().where(
+                        DeferredIndex.table_name == table_name,
+                        DeferredIndex.index_name.in_([name for name, _ in entries]),
+                    ))
+
+    def drop_indexes(self, table_names: list) -> dict:
+        """
+        Elimina los índices no únicos de las tablas y devuelve sus definiciones `{tabla: [(nombre, sentencia)]}`,
+        incluidas las que una carga interrumpida dejó pendientes. Cada definición se guarda en `deferred_indexes`
+        en la misma transacción que elimina el índice.
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        table_names = list(dict.fromkeys(table_names))
+        dropped = self.pending_indexes(table_names)
+        for table_name in table_names:
+            if not schema_registry.table_exists(self.engine, table_name):
+                continue
+            indexes = self.secondary_indexes(table_name)
+            if not indexes:
+                continue
+            now = datetime.now(timezone.utc)
+            with self.engine.begin() as connection:
+                connection.execute(DeferredIndex.__table__.delete().where(
+                    DeferredIndex.table_name == table_name,
+                    DeferredIndex.index_name.in_([name for name, _ in indexes]),
+                ))
+                connection.execute(DeferredIndex.__table__.insert(), [
+                    {"table_name": table_name, "index_name": name, "definition": definition, "dropped_at": now}
+                    for name, definition in indexes
+                ])
+                for name, _ in indexes:
+                    connection.execute(text(f"DROP INDEX IF EXISTS {quote(name)}"))
+            dropped[table_name] = list(dict(dropped.get(table_name, []) + indexes).items())
+            logger.info("Índices de '%s' eliminados durante la carga: %s.", table_name, ", ".join(name for name, _ in indexes))
+        return dropped
+
+    def build_indexes(self, indexes: dict) -> dict:
+        """
+        Crea los índices `{tabla: [(nombre, sentencia)]}` en paralelo entre tablas y en serie dentro de cada tabla,
+        y actualiza las estadísticas de cada tabla. Devuelve los segundos de construcción por tabla.
+        """
+        indexes = {table_name: entries for table_name, entries in indexes.items() if entries}
+        if not indexes:
+            return {}
+
+        quote = self.engine.dialect.identifier_preparer.quote
+
+        def build(table_name: str, entries: list) -> float:
+            start = time.perf_counter()
+            with self.engine.connect() as connection:
+                for _, statement in entries:
+                    if self.is_postgres and INDEX_MAINTENANCE_WORK_MEM:
+                        connection.execute(
+                            text("SELECT set_config('maintenance_work_mem', :value, true)"),
+                            {"value": INDEX_MAINTENANCE_WORK_MEM},
+                        )
+                    connection.execute(text(statement))
+                    connection.commit()
+                if self.is_postgres:
+                    connection.execute(text(f"ANALYZE {quote(table_name)}"))
+                    connection.commit()
+            elapsed = time.perf_counter() - start
+            instrumentation.observe("stage_duration_seconds", elapsed, component="indexes", stage="build")
+            return elapsed
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(indexes)))) as pool:
+            futures = {
+                table_name: pool.submit(contextvars.copy_context().run, build, table_name, entries)
+                for table_name, entries in indexes.items()
+            }
+
+        results, failed = {}, []
+        for table_name, future in futures.items():
+            try:
+                results[table_name] = round(future.result(), 3)
+            except Exception as e:
+                logger.error("Error construyendo los índices de '%s': %s", table_name, e)
+                failed.append(table_name)
+        if failed:
+            raise ValueError(f"No se pudieron construir los índices de: {', '.join(failed)}.")
+
+        logger.info("Índices construidos: %s.", results, extra={"seconds": results})
+        return results
+
+    def ensure_indexes(self, table_names: list) -> dict:
+        """
+        Crea los índices declarados en la metadata que aún no existen en las tablas.
+        """
+        return self.build_indexes({
+            table_name: self.declared_indexes(table_name)
+            for table_name in dict.fromkeys(table_names)
+            if schema_registry.table_exists(self.engine, table_name)
+        })
+
+    def rebuild_pending(self) -> dict:
+        """
+        Reconstruye los índices que quedaron eliminados porque el proceso que cargaba la tabla se detuvo,
+        y los quita de `deferred_indexes`. Si una carga en curso en otro proceso los eliminó, solo se
+        reconstruyen antes de tiempo: esa carga los vuelve a crear (sin efecto) al terminar.
+        """
+        pending = {
+            table_name: entries for table_name, entries in self.pending_indexes().items()
+            if schema_registry.table_exists(self.engine, table_name)
+        }
+        results = self.build_indexes(pending)
+        self._forget_pending(pending)
+        return results
+
+    @contextmanager
+    def deferred(self, table_names: list, enabled: bool = True):
+        """
+        Con `enabled`, elimina los índices no únicos de las tablas durante el bloque y al salir (aunque la carga falle)
+        los reconstruye junto con los declarados en la metadata que falten. Las definiciones guardadas se borran
+        solo cuando la reconstrucción termina; si el proceso se detiene antes, la siguiente carga diferida de la
+        tabla (por ejemplo, el trabajo reanudado) o `rebuild_pending` las reconstruye.
+        """
+        table_names = list(dict.fromkeys(table_names))
+        dropped = self.drop_indexes(table_names) if enabled else {}
+        try:
+            yield
+        finally:
+            if enabled:
+                indexes = {}
+                for table_name in table_names:
+                    if not schema_registry.table_exists(self.engine, table_name):
+                        continue
+                    entries = dict(self.declared_indexes(table_name))
+                    entries.update(dropped.get(table_name, []))
+                    indexes[table_name] = list(entries.items())
+                self.build_indexes(indexes)
+                self._forget_pending(dropped)
@@ -0,0 +1,126 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from sqlalchemy.orm import Session
+from app.services.csv_loader import CSVLoaderService
+from app.services.index_manager import IndexManagerService
+from app.services.schema_registry import schema_registry
+from app.config import INGEST_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyScheduler:
+    def __init__(self, dependencies: dict, max_workers: int = INGEST_MAX_WORKERS):
+        """
+        Inicializa el planificador con las dependencias entre tablas ({tabla: {tablas referenciadas}}).
+        """
+        self.dependencies = dependencies
+        self.max_workers = max_workers
+
+    def run(self, tasks: list) -> list:
+        """
+        Ejecuta tareas `(tabla, función)` en un pool de workers respetando el orden de las llaves foráneas.
+        Una tarea solo se inicia cuando terminaron las tareas de las tablas que referencia
+        (y las tareas anteriores sobre la misma tabla). Las tareas independientes se ejecutan en paralelo.
+        Devuelve, en el orden recibido, el resultado de cada tarea o la excepción que la hizo fallar.
+        """
+        outcomes = [None] * len(tasks)
+        pending = {index: set() for index in range(len(tasks))}
+        dependents = {index: [] for index in range(len(tasks))}
+
+        # Construir el grafo de dependencias entre las tareas recibidas
+        for index, (table_name, _) in enumerate(tasks):
+            referenced = self.dependencies.get(table_name, set())
+            for other, (other_table, _) in enumerate(tasks):
+                if other == index:
+                    continue
+                if other_table in referenced or (other_table == table_name and other < index):
+                    pending[index].add(other)
+                    dependents[other].append(index)
+
+        def skip(index: int, reason: str):
+            # Descartar una tarea (y sus dependientes) que ya no puede ejecutarse
+            if index not in pending:
+                return
+            del pending[index]
+            outcomes[index] = RuntimeError(reason)
+            for dependent in dependents[index]:
+                skip(dependent, f"No se cargó porque falló la carga de la tabla '{tasks[index][0]}'.")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+
+            def submit_ready():
+                for index in [index for index, waiting in pending.items() if not waiting]:
+                    del pending[index]
+                    # Cada tarea corre con una copia del contexto para conservar los tiempos de la solicitud
+                    running[pool.submit(contextvars.copy_context().run, tasks[index][1])] = index
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    error = future.exception()
+                    outcomes[index] = error if error is not None else future.result()
+                    for dependent in dependents[index]:
+                        if error is not None:
+                            skip(dependent, f"No se cargó porque falló la carga de la tabla '{tasks[index][0]}'.")
+                        elif dependent in pending:
+                            pending[dependent].discard(index)
+                submit_ready()
+
+        # Las tareas que siguen pendientes forman un ciclo de llaves foráneas
+        for index in list(pending):
+            skip(index, f"Dependencia circular de llaves foráneas en la tabla '{tasks[index][0]}'.")
+
+        return outcomes
+
+
+class IngestSchedulerService:
+    def __init__(self, db: Session, max_workers: int = INGEST_MAX_WORKERS):
+        """
+        Inicializa el servicio con la sesión de la base de datos.
+        """
+        self.db = db
+        self.engine = db.get_bind()
+        self.max_workers = max_workers
+
+    def get_foreign_key_dependencies(self) -> dict:
+        """
+        Obtiene desde el registro de esquemas (tabla `metadata`) las llaves foráneas y devuelve {tabla: {tablas referenciadas}}.
+        """
+        return schema_registry.foreign_key_dependencies(self.engine)
+
+    def load_files(self, files: list, loader=None, mode: str = "append", defer_indexes: bool = False) -> list:
+        """
+        Carga una lista de archivos `(tabla, archivo binario)` en paralelo siguiendo el orden de las llaves foráneas.
+        Cada tarea usa su propia sesión (y conexión). Devuelve el resultado o la excepción de cada archivo.
+        `loader(session, tabla, archivo)` reemplaza la carga por defecto (`load_csv_to_table` con `mode`).
+        Con `defer_indexes`, los índices no únicos de las tablas se eliminan durante la carga y se reconstruyen
+        al terminar, en paralelo entre tablas.
+        """
+        dependencies = self.get_foreign_key_dependencies()
+
+        # Crear primero, en orden y desde una sola sesión, las tablas que aún no existen
+        csv_service = CSVLoaderService(self.db)
+        for table_name in dict.fromkeys(table_name for table_name, _ in files):
+            if not schema_registry.table_exists(self.engine, table_name):
+                try:
+                    csv_service.create_table_from_metadata(table_name)
+                except Exception as e:
+                    # El error se reportará al cargar el archivo correspondiente
+                    logger.warning("No se pudo crear la tabla '%s' antes de la carga: %s", table_name, e)
+
+        def load_task(table_name: str, stream):
+            def task():
+                with Session(bind=self.engine) as session:
+                    if loader is not None:
+                        return loader(session, table_name, stream)
+                    return CSVLoaderService(session).load_csv_to_table(stream, table_name, mode=mode)
+            return task
+
+        tasks = [(table_name, load_task(table_name, stream)) for table_name, stream in files]
+        with IndexManagerService(self.engine).deferred([table_name for table_name, _ in tasks], defer_indexes):
+            return DependencyScheduler(dependencies, self.max_workers).run(tasks)
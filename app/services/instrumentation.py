@@ -0,0 +1,253 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Límites (en segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Límites de los histogramas de tamaño (filas por lote)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+# Métricas expuestas: nombre -> (tipo, descripción)
+METRICS = {
+    "http_request_duration_seconds": ("histogram", "Latencia de las solicitudes por ruta."),
+    "stage_duration_seconds": ("histogram", "Duración de cada etapa de la carga de CSV, el backup y la restauración."),
+    "db_pool_checkout_wait_seconds": ("histogram", "Espera para obtener una conexión del pool."),
+    "db_pool_checked_out": ("gauge", "Conexiones del pool en uso."),
+    "db_pool_checked_in": ("gauge", "Conexiones del pool disponibles."),
+    "db_pool_size": ("gauge", "Tamaño configurado del pool."),
+    "db_pool_overflow": ("gauge", "Conexiones abiertas por encima del tamaño del pool."),
+    "ingest_rows_total": ("counter", "Filas cargadas o respaldadas por tabla y operación."),
+    "ingest_seconds_total": ("counter", "Segundos dedicados a cargar o respaldar filas por tabla y operación."),
+    "ingest_rows_per_second": ("gauge", "Filas por segundo de la última operación por tabla."),
+    "group_commit_batch_size": ("histogram", "Transacciones escritas por cada confirmación agrupada."),
+    "group_commit_wait_seconds": ("histogram", "Espera de cada transacción hasta que se confirma su lote."),
+}
+
+# Tiempos por etapa de la solicitud en curso, para el encabezado `Server-Timing`
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class Instrumentation:
+    def __init__(self):
+        """
+        Registro en memoria de histogramas, contadores y medidores del proceso,
+        expuestos en formato de texto de Prometheus.
+        """
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._pools = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def register_pool(self, name: str, pool):
+        """
+        Registra un pool de conexiones para reportar sus conexiones en uso y disponibles.
+        """
+        with self._lock:
+            self._pools[name] = pool
+
+    def record_rows(self, table: str, operation: str, rows: int, seconds: float):
+        """
+        Registra las filas procesadas por una carga, backup o restauración y su velocidad.
+        """
+        self.inc("ingest_rows_total", rows, table=table, operation=operation)
+        self.inc("ingest_seconds_total", seconds, table=table, operation=operation)
+        if seconds > 0:
+            self.set_gauge("ingest_rows_per_second", rows / seconds, table=table, operation=operation)
+
+    def _pool_gauges(self) -> dict:
+        gauges = {}
+        for name, pool in self._pools.items():
+            labels = (("pool", name),)
+            for metric, method in (
+                ("db_pool_checked_out", "checkedout"),
+                ("db_pool_checked_in", "checkedin"),
+                ("db_pool_size", "size"),
+                ("db_pool_overflow", "overflow"),
+            ):
+                if hasattr(pool, method):
+                    gauges[(metric, labels)] = getattr(pool, method)()
+        return gauges
+
+    def render(self) -> str:
+        """
+        Devuelve todas las métricas en el formato de texto de Prometheus (versión 0.0.4).
+        """
+        with self._lock:
+            histograms = {key: (list(h.buckets), list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = {**self._gauges, **self._pool_gauges()}
+
+        series = defaultdict(list)
+        for (name, labels), (buckets, counts, total, count) in histograms.items():
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ["+Inf"], counts):
+                cumulative += bucket_count
+                series[name].append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+            series[name].append(f"{name}_sum{_format_labels(labels)} {total}")
+            series[name].append(f"{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in {**counters, **gauges}.items():
+            series[name].append(f"{name}{_format_labels(labels)} {value}")
+
+        lines = []
+        for name in sorted(series):
+            metric_type, description = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(series[name])
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+class StageTimer:
+    def __init__(self, component: str):
+        """
+        Acumula la duración de las etapas de una operación (carga de CSV, backup, restauración)
+        y la registra una sola vez al terminar, para no agregar trabajo por fila al registro compartido.
+        """
+        self.component = component
+        self.totals = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - start
+
+    def add(self, name: str, seconds: float):
+        self.totals[name] += seconds
+
+    def iterate(self, iterable, name: str):
+        """
+        Recorre `iterable` sumando a la etapa `name` el tiempo que tarda en producir cada elemento.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.totals[name] += time.perf_counter() - start
+                return
+            self.totals[name] += time.perf_counter() - start
+            yield item
+
+    def record(self):
+        """
+        Registra las etapas acumuladas en los histogramas y en el `Server-Timing` de la solicitud en curso.
+        """
+        timings = request_timings.get()
+        for name, seconds in self.totals.items():
+            instrumentation.observe("stage_duration_seconds", seconds, component=self.component, stage=name)
+            if timings is not None:
+                timings.append((f"{self.component}.{name}", seconds))
+        self.totals.clear()
+
+
+def server_timing_header(timings: list, total: float) -> str:
+    """
+    Construye el encabezado `Server-Timing` sumando las etapas con el mismo nombre.
+    """
+    totals = defaultdict(float)
+    for name, seconds in timings:
+        totals[name] += seconds
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class JSONLogFormatter(logging.Formatter):
+    """
+    Formatea cada registro como un objeto JSON, incluyendo los campos pasados en `extra`.
+    """
+
+    _standard_fields = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in self._standard_fields})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = "INFO", format: str = "text"):
+    """
+    Configura el logging de la aplicación en texto legible o en JSON (una línea por registro).
+    """
+    handler = logging.StreamHandler()
+    if format == "json":
+        handler.setFormatter(JSONLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    logger = logging.getLogger("app")
+    logger.handlers = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
+# Registro compartido por el proceso
+instrumentation = Instrumentation()
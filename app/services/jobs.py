@@ -0,0 +1,509 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.database.models import Job, JobFile
+from app.services.backup_restore_services import BackupRestoreServices
+from app.services.csv_loader import CSVLoaderService
+from app.services.ingest_scheduler import IngestSchedulerService
+from app.services.schema_registry import schema_registry
+from app.config import (
+    JOBS_DIR,
+    JOBS_HEARTBEAT_INTERVAL,
+    JOBS_MAX_WORKERS,
+    JOBS_STALE_AFTER,
+    UPLOAD_BUFFER_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Estados de los trabajos
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Estado inicial de los archivos de un trabajo (después pasan por 'running', 'completed' o 'failed')
+PENDING = "pending"
+
+# Tipos de trabajo soportados
+JOB_KINDS = ("csv", "backup", "snapshot", "restore")
+
+
+class JobNotResumable(ValueError):
+    """
+    El trabajo ya terminó o sigue en ejecución en otro proceso.
+    """
+
+
+def ensure_job_tables(engine: Engine):
+    """
+    Crea las tablas de trabajos y de sus archivos si no existen.
+    """
+    for model in (Job, JobFile):
+        if not schema_registry.table_exists(engine, model.__tablename__):
+            model.__table__.create(engine, checkfirst=True)
+            schema_registry.mark_table_created(model.__tablename__)
+
+
+def job_reference(job_id: str) -> dict:
+    """
+    Respuesta de los endpoints que encolan un trabajo.
+    """
+    return {"job_id": job_id, "status": QUEUED, "status_url": f"/api/v1/jobs/{job_id}"}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime):
+    # Algunos motores (SQLite) devuelven las fechas sin zona horaria
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class JobService:
+    def __init__(self, engine: Engine, jobs_dir: str = JOBS_DIR, stale_after: float = JOBS_STALE_AFTER):
+        """
+        Registra y ejecuta trabajos en segundo plano: cargas de CSV, backups, snapshots y restauraciones.
+        El estado de cada trabajo y el último punto de control confirmado de cada archivo se guardan en
+        las tablas `jobs` y `job_files`, de modo que un trabajo fallido o interrumpido puede reanudarse.
+        """
+        self.engine = engine
+        self.jobs_dir = jobs_dir
+        self.stale_after = stale_after
+
+    def create_csv_job(self, uploads: list, mode: str = "append", defer_indexes: bool = False) -> str:
+        """
+        Guarda en disco los archivos subidos `(nombre, archivo binario)` y registra el trabajo que los cargará.
+        Los archivos se conservan hasta que el trabajo termina bien, para poder reanudarlo.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        files = []
+        for position, (file_name, stream) in enumerate(uploads):
+            file_path = os.path.join(job_dir, f"{position}_{os.path.basename(file_name)}")
+            with open(file_path, "wb") as f:
+                shutil.copyfileobj(stream, f, UPLOAD_BUFFER_SIZE)
+            files.append({
+                "file_name": file_name,
+                "table_name": CSVLoaderService.table_name_from_filename(file_name),
+                "file_path": file_path,
+                "size": os.path.getsize(file_path),
+            })
+        return self.create_job("csv", {"mode": mode, "defer_indexes": defer_indexes}, files, job_id)
+
+    def create_job(self, kind: str, params: dict, files: list = (), job_id: str = None) -> str:
+        """
+        Registra un trabajo en cola con sus parámetros y sus archivos (`file_name`, `table_name`, `file_path`, `size`).
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Tipo de trabajo no soportado: '{kind}'.")
+
+        ensure_job_tables(self.engine)
+        job_id = job_id or uuid.uuid4().hex
+        now = _now()
+        with Session(bind=self.engine) as db:
+            db.add(Job(id=job_id, kind=kind, status=QUEUED, params=json.dumps(params), created_at=now, heartbeat_at=now))
+            db.flush()
+            db.add_all(
+                JobFile(
+                    job_id=job_id,
+                    position=position,
+                    status=PENDING,
+                    byte_offset=0,
+                    rows_read=0,
+                    rows_loaded=0,
+                    rejected=0,
+                    seconds=0,
+                    updated_at=now,
+                    **entry,
+                )
+                for position, entry in enumerate(files)
+            )
+            db.commit()
+        logger.info("Trabajo '%s' (%s) en cola con %s archivos.", job_id, kind, len(files), extra={"job_id": job_id})
+        return job_id
+
+    def _stale_before(self) -> datetime:
+        return _now() - timedelta(seconds=self.stale_after)
+
+    def claim(self, job_id: str) -> bool:
+        """
+        Marca el trabajo como en ejecución si está en cola, falló o quedó interrumpido (sin señal de vida reciente).
+        La actualización condicional evita que dos procesos ejecuten el mismo trabajo.
+        """
+        now = _now()
+        jobs = Job.__table__
+        statement = (
+            update(jobs)
+            .where(jobs.c.id == job_id)
+            .where(or_(
+                jobs.c.status.in_((QUEUED, FAILED)),
+                and_(jobs.c.status == RUNNING, jobs.c.heartbeat_at < self._stale_before()),
+            ))
+            .values(
+                status=RUNNING,
+                started_at=func.coalesce(jobs.c.started_at, now),
+                heartbeat_at=now,
+                finished_at=None,
+                error=None,
+            )
+        )
+        with self.engine.begin() as connection:
+            return connection.execute(statement).rowcount == 1
+
+    def heartbeat(self, job_ids: list):
+        jobs = Job.__table__
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(jobs).where(jobs.c.id.in_(job_ids), jobs.c.status == RUNNING).values(heartbeat_at=_now())
+            )
+
+    def check_resumable(self, job_id: str) -> bool:
+        """
+        Indica si el trabajo existe; lanza `JobNotResumable` si terminó bien o sigue en ejecución.
+        """
+        ensure_job_tables(self.engine)
+        with Session(bind=self.engine) as db:
+            job = db.get(Job, job_id)
+        if job is None:
+            return False
+        if job.status == COMPLETED:
+            raise JobNotResumable(f"El trabajo '{job_id}' ya terminó.")
+        if job.status == RUNNING and _aware(job.heartbeat_at) >= self._stale_before():
+            raise JobNotResumable(f"El trabajo '{job_id}' sigue en ejecución.")
+        return True
+
+    def interrupted_jobs(self) -> list:
+        """
+        Devuelve los trabajos en cola o en ejecución sin señal de vida reciente (por ejemplo, tras una caída).
+        """
+        ensure_job_tables(self.engine)
+        query = select(Job.id).where(or_(
+            Job.status == QUEUED,
+            and_(Job.status == RUNNING, Job.heartbeat_at < self._stale_before()),
+        )).order_by(Job.created_at)
+        with Session(bind=self.engine) as db:
+            return db.execute(query).scalars().all()
+
+    def execute(self, job_id: str):
+        """
+        Ejecuta un trabajo ya reclamado con `claim` y registra su resultado o su error.
+        """
+        with Session(bind=self.engine) as db:
+            job = db.get(Job, job_id)
+            kind, params = job.kind, json.loads(job.params or "{}")
+
+        logger.info("Ejecutando el trabajo '%s' (%s)...", job_id, kind, extra={"job_id": job_id})
+        try:
+            result = getattr(self, f"_run_{kind}")(job_id, params)
+        except Exception as e:
+            logger.error("El trabajo '%s' falló: %s", job_id, e, extra={"job_id": job_id})
+            self._fail_running_files(job_id, str(e))
+            self._finish(job_id, FAILED, error=str(e))
+            return
+        self._finish(job_id, COMPLETED, result=result)
+        logger.info("Trabajo '%s' terminado.", job_id, extra={"job_id": job_id})
+
+    def _finish(self, job_id: str, status: str, result: dict = None, error: str = None):
+        jobs = Job.__table__
+        values = {"status": status, "finished_at": _now(), "error": error}
+        if result is not None:
+            values["result"] = json.dumps(result, default=str)
+        with self.engine.begin() as connection:
+            connection.execute(update(jobs).where(jobs.c.id == job_id).values(**values))
+
+    def _files(self, job_id: str, pending_only: bool = False) -> list:
+        query = select(JobFile).where(JobFile.job_id == job_id).order_by(JobFile.position)
+        if pending_only:
+            query = query.where(JobFile.status != COMPLETED)
+        with Session(bind=self.engine) as db:
+            return db.execute(query).scalars().all()
+
+    def _update_file(self, file_id: int, connection=None, **values):
+        statement = update(JobFile.__table__).where(JobFile.__table__.c.id == file_id).values(updated_at=_now(), **values)
+        if connection is not None:
+            connection.execute(statement)
+            return
+        with self.engine.begin() as connection:
+            connection.execute(statement)
+
+    def _fail_running_files(self, job_id: str, detail: str):
+        files = JobFile.__table__
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(files)
+                .where(files.c.job_id == job_id, files.c.status == RUNNING)
+                .values(status=FAILED, detail=detail, updated_at=_now())
+            )
+
+    @staticmethod
+    def _progress_values(file: JobFile, progress: dict, seconds: float) -> dict:
+        """
+        Suma el avance de la ejecución en curso al acumulado de las ejecuciones anteriores del archivo.
+        """
+        reasons = Counter(json.loads(file.reasons or "{}"))
+        reasons.update(progress.get("reasons", {}))
+        return {
+            "rows_loaded": file.rows_loaded + progress["rows"],
+            "rejected": file.rejected + progress.get("rejected", 0),
+            "reasons": json.dumps(dict(reasons)),
+            "quarantine_file": progress.get("quarantine_file") or file.quarantine_file,
+            "seconds": file.seconds + seconds,
+        }
+
+    def _run_csv(self, job_id: str, params: dict) -> dict:
+        """
+        Carga los archivos pendientes del trabajo en paralelo (respetando las llaves foráneas), confirmando cada
+        bloque junto con su punto de control. Los archivos que fallaron continúan desde su último bloque confirmado.
+        """
+        files = self._files(job_id, pending_only=True)
+        with Session(bind=self.engine) as db:
+            outcomes = IngestSchedulerService(db).load_files(
+                [(file.table_name, file) for file in files],
+                loader=lambda session, table_name, file: self._load_file(session, table_name, file, params.get("mode", "append")),
+                defer_indexes=params.get("defer_indexes", False),
+            )
+
+        failed = []
+        for file, outcome in zip(files, outcomes):
+            if isinstance(outcome, Exception):
+                failed.append(file.file_name)
+                self._update_file(file.id, status=FAILED, detail=str(outcome))
+        if failed:
+            raise ValueError(f"No se completó la carga de: {', '.join(failed)}.")
+
+        shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+        return {"files": len(files)}
+
+    def _load_file(self, session: Session, table_name: str, file: JobFile, mode: str = "append") -> dict:
+        self._update_file(file.id, status=RUNNING, detail=None)
+        start = time.perf_counter()
+
+        def checkpoint(connection, progress: dict):
+            self._update_file(
+                file.id,
+                connection,
+                byte_offset=progress["offset"],
+                rows_read=progress["lines"],
+                **self._progress_values(file, progress, time.perf_counter() - start),
+            )
+
+        summary = CSVLoaderService(session).load_csv_to_table(
+            file.file_path,
+            table_name,
+            start_offset=file.byte_offset,
+            start_line=file.rows_read,
+            checkpoint=checkpoint,
+            mode=mode,
+        )
+        self._update_file(file.id, status=COMPLETED, **self._progress_values(file, summary, time.perf_counter() - start))
+        return summary
+
+    def _run_backup(self, job_id: str, params: dict) -> dict:
+        """
+        Respalda una tabla. El archivo se escribe de forma atómica, por lo que al reanudarse el backup empieza de nuevo.
+        """
+        file = self._files(job_id)[0]
+        self._update_file(file.id, status=RUNNING, detail=None)
+        start = time.perf_counter()
+        with Session(bind=self.engine) as db:
+            size = BackupRestoreServices(db).backup_table(file.table_name, file.file_path, params["codec"], params["sync_interval"])
+        self._update_file(file.id, status=COMPLETED, size=size, byte_offset=size, seconds=time.perf_counter() - start)
+        return {"file_path": file.file_path, "bytes": size}
+
+    def _run_snapshot(self, job_id: str, params: dict) -> dict:
+        with Session(bind=self.engine) as db:
+            return BackupRestoreServices(db).backup_database(params.get("tables"), params["codec"])
+
+    def _run_restore(self, job_id: str, params: dict) -> dict:
+        """
+        Restaura una tabla confirmando cada lote junto con su punto de control. En modo `append` una restauración
+        interrumpida continúa desde el último lote confirmado; en modo `swap` la tabla auxiliar se vuelve a cargar.
+        """
+        file = self._files(job_id)[0]
+        mode = params["mode"]
+        if mode != "append":
+            self._update_file(file.id, rows_read=0, rows_loaded=0, seconds=0)
+            file.rows_read = file.rows_loaded = 0
+            file.seconds = 0
+
+        self._update_file(file.id, status=RUNNING, detail=None)
+        start = time.perf_counter()
+
+        def checkpoint(connection, stats: dict):
+            self._update_file(
+                file.id,
+                connection,
+                rows_read=stats["rows_read"],
+                **self._progress_values(file, stats, time.perf_counter() - start),
+            )
+
+        with Session(bind=self.engine) as db:
+            stats = BackupRestoreServices(db).restore_table(
+                db,
+                file.table_name,
+                file.file_path,
+                mode,
+                params["batch_size"],
+                checkpoint=checkpoint,
+                skip_rows=file.rows_read,
+                defer_indexes=params.get("defer_indexes", False),
+            )
+        self._update_file(file.id, status=COMPLETED, **self._progress_values(file, stats, time.perf_counter() - start))
+        return stats
+
+    def get_job(self, job_id: str):
+        """
+        Devuelve el estado del trabajo con las filas cargadas, su velocidad y el avance de cada archivo, o None si no existe.
+        """
+        ensure_job_tables(self.engine)
+        with Session(bind=self.engine) as db:
+            job = db.get(Job, job_id)
+        if job is None:
+            return None
+        files = self._files(job_id)
+
+        started_at = _aware(job.started_at)
+        seconds = ((_aware(job.finished_at) or _now()) - started_at).total_seconds() if started_at else 0.0
+        rows = sum(file.rows_loaded for file in files)
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "created_at": job.created_at.isoformat(),
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+            "rows_loaded": rows,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds, 1) if seconds else 0.0,
+            "error": job.error,
+            "result": json.loads(job.result) if job.result else None,
+            "files": [self._file_to_dict(file) for file in files],
+        }
+
+    @staticmethod
+    def _file_to_dict(file: JobFile) -> dict:
+        return {
+            "file_name": file.file_name,
+            "table_name": file.table_name,
+            "status": file.status,
+            "bytes": file.size,
+            "bytes_committed": file.byte_offset,
+            "percent": round(100 * file.byte_offset / file.size, 1) if file.size else None,
+            "rows_read": file.rows_read,
+            "rows_loaded": file.rows_loaded,
+            "rejected": file.rejected,
+            "reasons": json.loads(file.reasons) if file.reasons else {},
+            "quarantine_file": file.quarantine_file,
+            "seconds": round(file.seconds, 3),
+            "rows_per_second": round(file.rows_loaded / file.seconds, 1) if file.seconds else 0.0,
+            "detail": file.detail,
+        }
+
+
+class JobRunner:
+    def __init__(
+        self,
+        engine: Engine,
+        max_workers: int = JOBS_MAX_WORKERS,
+        heartbeat_interval: float = JOBS_HEARTBEAT_INTERVAL,
+    ):
+        """
+        Pool de workers del proceso que ejecuta los trabajos. Mientras un trabajo se ejecuta, un hilo actualiza
+        su señal de vida para que ningún otro proceso lo considere interrumpido y lo reanude.
+        """
+        self.service = JobService(engine)
+        self.heartbeat_interval = heartbeat_interval
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def submit(self, job_id: str):
+        return self._pool.submit(self._run, job_id)
+
+    def _run(self, job_id: str):
+        try:
+            if not self.service.claim(job_id):
+                logger.info("El trabajo '%s' ya está en ejecución o terminó.", job_id)
+                return
+        except Exception as e:
+            logger.error("No se pudo reclamar el trabajo '%s': %s", job_id, e)
+            return
+
+        with self._lock:
+            self._running.add(job_id)
+        try:
+            self.service.execute(job_id)
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+    def _beat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            try:
+                self.service.heartbeat(job_ids)
+            except Exception as e:
+                logger.warning("No se pudo actualizar la señal de vida de los trabajos: %s", e)
+
+    def resume_interrupted(self) -> list:
+        """
+        Encola los trabajos en cola o interrumpidos; cada uno continúa desde sus últimos puntos de control.
+        """
+        job_ids = self.service.interrupted_jobs()
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            logger.info("Reanudando %s trabajos interrumpidos.", len(job_ids))
+        return job_ids
+
+    def shutdown(self):
+        """
+        Deja de aceptar trabajos; los que están en ejecución terminan o se reanudan al volver a iniciar.
+        """
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """
+    Devuelve el pool de trabajos compartido por el proceso, creándolo la primera vez.
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            from app.database.session import engine
+
+            _runner = JobRunner(engine)
+        return _runner
+
+
+def stop_job_runner():
+    with _runner_lock:
+        if _runner is not None:
+            _runner.shutdown()
@@ -0,0 +1,157 @@
+import logging
+import uuid
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, Connection
+from app.services.bulk_loader import BulkLoaderService
+from app.services.instrumentation import StageTimer
+from app.services.schema_registry import schema_registry
+from app.services.partition_manager import physical_primary_key
+
+logger = logging.getLogger(__name__)
+
+# Modos de carga: 'append' inserta las filas; 'merge' inserta las nuevas y actualiza las existentes
+LOAD_MODES = ("append", "merge")
+
+
+class MergeLoaderService:
+    def __init__(self, engine: Engine, table_name: str):
+        """
+        Carga con mezcla (upsert): las filas se cargan con COPY en una tabla auxiliar UNLOGGED y luego se
+        aplican a la tabla con un único `INSERT ... ON CONFLICT (llave primaria) DO UPDATE`.
+        Las filas iguales a las existentes no se reescriben. La llave primaria se toma de la metadata.
+        En una tabla particionada la restricción de la base de datos incluye la columna de partición; una fila
+        cuya llave de la metadata ya existe con otro valor de esa columna se mueve (se elimina la fila anterior
+        y se inserta la nueva en la misma sentencia) y se cuenta como actualizada.
+        """
+        if engine.dialect.name != "postgresql":
+            raise ValueError("El modo 'merge' solo está disponible en PostgreSQL.")
+
+        self.engine = engine
+        self.table_name = table_name
+        definitions = schema_registry.get_columns(engine, table_name)
+        # Llave declarada en la metadata (identifica cada fila) y restricción que existe en la base de datos
+        # (en las tablas particionadas incluye la columna de partición), usada en `ON CONFLICT`
+        self.declared_key = [entry.column_name for entry in definitions if entry.is_primary_key]
+        self.primary_key = physical_primary_key(definitions)
+        if not self.primary_key:
+            raise ValueError(f"El modo 'merge' requiere una llave primaria en la metadata de '{table_name}'.")
+        self.moved_columns = [name for name in self.primary_key if name not in self.declared_key]
+        self.staging_name = f"{table_name}__merge_{uuid.uuid4().hex[:8]}"
+
+    def create_staging(self) -> str:
+        """
+        Crea (vacía) la tabla auxiliar con las columnas de la tabla, sin índices ni llave primaria.
+        """
+        preparer = self.engine.dialect.identifier_preparer
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE UNLOGGED TABLE {preparer.quote(self.staging_name)} "
+                f"(LIKE {preparer.quote(self.table_name)} INCLUDING DEFAULTS)"
+            ))
+        return self.staging_name
+
+    def drop_staging(self):
+        preparer = self.engine.dialect.identifier_preparer
+        with self.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {preparer.quote(self.staging_name)}"))
+
+    def _merge_statement(self, columns: list):
+        preparer = self.engine.dialect.identifier_preparer
+        quote = preparer.quote
+        target, staging = quote(self.table_name), quote(self.staging_name)
+        column_list = ", ".join(quote(name) for name in columns)
+        key_list = ", ".join(quote(name) for name in self.primary_key)
+        declared_list = ", ".join(quote(name) for name in self.declared_key)
+
+        others = [name for name in columns if name not in self.primary_key]
+        if others:
+            assignments = ", ".join(f"{quote(name)} = EXCLUDED.{quote(name)}" for name in others)
+            current = ", ".join(f"{target}.{quote(name)}" for name in others)
+            incoming = ", ".join(f"EXCLUDED.{quote(name)}" for name in others)
+            # Las filas sin cambios no se actualizan ni aparecen en el RETURNING
+            conflict = f"DO UPDATE SET {assignments} WHERE ROW({current}) IS DISTINCT FROM ROW({incoming})"
+        else:
+            conflict = "DO NOTHING"
+
+        # Filas existentes con la misma llave de la metadata pero otro valor de la columna de partición:
+        # se eliminan para que la fila entrante las reemplace en su partición
+        moved, moved_count = "", "0"
+        if self.moved_columns:
+            matches = " AND ".join(f"existing.{quote(name)} = incoming.{quote(name)}" for name in self.declared_key)
+            changed = " OR ".join(
+                f"existing.{quote(name)} IS DISTINCT FROM incoming.{quote(name)}" for name in self.moved_columns
+            )
+            moved = f"""
+, moved AS (
+    DELETE FROM {target} AS existing
+    USING incoming
+    WHERE {matches} AND ({changed})
+    RETURNING 1
+)"""
+            moved_count = "(SELECT COUNT(*) FROM moved)"
+
+        # Si una llave se repite en la tabla auxiliar se conserva su última aparición (la tabla solo recibe COPY)
+        return text(f"""
+WITH incoming AS (
+    SELECT DISTINCT ON ({declared_list}) {column_list}
+    FROM {staging}
+    ORDER BY {declared_list}, ctid DESC
+){moved}, merged AS (
+    INSERT INTO {target} ({column_list})
+    SELECT {column_list} FROM incoming
+    ON CONFLICT ({key_list}) {conflict}
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    (SELECT COUNT(*) FROM incoming) AS total,
+    COUNT(*) FILTER (WHERE inserted) - {moved_count} AS inserted,
+    COUNT(*) FILTER (WHERE NOT inserted) + {moved_count} AS updated
+FROM merged
+""")
+
+    def merge(self, connection: Connection, columns: list) -> dict:
+        """
+        Aplica el contenido de la tabla auxiliar a la tabla en la transacción de `connection` y la vacía.
+        Devuelve las filas insertadas, actualizadas y sin cambios.
+        """
+        total, inserted, updated = connection.execute(self._merge_statement(columns)).one()
+        connection.execute(text(f"TRUNCATE {self.engine.dialect.identifier_preparer.quote(self.staging_name)}"))
+        return {"inserted": inserted, "updated": updated, "unchanged": total - inserted - updated}
+
+    def load_chunks(self, columns: list, chunks, checkpoint=None, timer: StageTimer = None) -> dict:
+        """
+        Carga una secuencia de DataFrames en la tabla auxiliar y los mezcla con la tabla.
+        Sin `checkpoint` todo se aplica en una única transacción al final. Con `checkpoint`, `chunks` son pares
+        `(DataFrame, posición)` y cada bloque se mezcla y se confirma por separado, ejecutando
+        `checkpoint(connection, posición, filas escritas)` dentro de su transacción.
+        """
+        timer = timer or StageTimer("merge_loader")
+        bulk_loader = BulkLoaderService(self.engine)
+        totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+        def apply(connection: Connection):
+            with timer.stage("merge"):
+                for name, value in self.merge(connection, columns).items():
+                    totals[name] += value
+
+        self.create_staging()
+        try:
+            with self.engine.connect() as connection:
+                for item in chunks:
+                    chunk, position = item if checkpoint is not None else (item, None)
+                    with timer.stage("insert"):
+                        bulk_loader.load_chunk(connection, self.staging_name, columns, chunk)
+                    if checkpoint is not None:
+                        apply(connection)
+                        checkpoint(connection, position, totals["inserted"] + totals["updated"])
+                        with timer.stage("commit"):
+                            connection.commit()
+                if checkpoint is None:
+                    apply(connection)
+                with timer.stage("commit"):
+                    connection.commit()
+        finally:
+            self.drop_staging()
+
+        logger.info("Mezcla en la tabla '%s': %s.", self.table_name, totals, extra={"table": self.table_name, **totals})
+        return totals
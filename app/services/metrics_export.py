@@ -0,0 +1,310 @@
+import csv
+import datetime
+import decimal
+import io
+import json
+from html import escape
+from typing import TYPE_CHECKING
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.config import EXPORT_BATCH_SIZE, METRICS_ENGINE
+from app.services.metrics_service import AsyncMetricsService, MetricFilters, MetricsService
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Formatos de exportación soportados y su tipo de contenido
+EXPORT_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "html": "text/html",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _json_default(value):
+    """
+    Serializa los tipos que devuelve el driver y que JSON no soporta directamente.
+    """
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable a JSON: {type(value).__name__}")
+
+
+try:
+    import orjson
+
+    def dumps(value) -> bytes:
+        return orjson.dumps(value, default=_json_default)
+except ImportError:
+    def dumps(value) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def parquet_available() -> bool:
+    """
+    Indica si está instalado pyarrow, necesario para exportar en Parquet.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _ChunkSink:
+    """
+    Archivo de solo escritura que acumula lo escrito por pyarrow para entregarlo por partes.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _JSONEncoder:
+    """
+    Arreglo JSON de objetos, uno por fila.
+    """
+
+    def __init__(self, columns: list):
+        self.columns = columns
+        self._first = True
+
+    def start(self) -> bytes:
+        return b"["
+
+    def encode(self, rows) -> bytes:
+        encoded = [dumps(dict(zip(self.columns, row))) for row in rows]
+        if not encoded:
+            return b""
+        prefix = b"" if self._first else b","
+        self._first = False
+        return prefix + b",".join(encoded)
+
+    def finish(self) -> bytes:
+        return b"]"
+
+
+class _NDJSONEncoder(_JSONEncoder):
+    """
+    Un objeto JSON por línea.
+    """
+
+    def start(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        return b"".join(dumps(dict(zip(self.columns, row))) + b"\n" for row in rows)
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _CSVEncoder:
+    def __init__(self, columns: list):
+        self.columns = columns
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def start(self) -> bytes:
+        self._writer.writerow(self.columns)
+        return self._drain()
+
+    def encode(self, rows) -> bytes:
+        self._writer.writerows(rows)
+        return self._drain()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _HTMLEncoder:
+    """
+    Tabla HTML con el mismo marcado que `DataFrame.to_html`.
+    """
+
+    def __init__(self, columns: list):
+        self.columns = columns
+
+    def start(self) -> bytes:
+        header = "".join(f"<th>{escape(str(name))}</th>" for name in self.columns)
+        return (
+            '<table border="1" class="dataframe">\n'
+            f"  <thead>\n    <tr style=\"text-align: right;\">{header}</tr>\n  </thead>\n  <tbody>\n"
+        ).encode("utf-8")
+
+    def encode(self, rows) -> bytes:
+        return "".join(
+            "    <tr>" + "".join(f"<td>{escape(str(value))}</td>" for value in row) + "</tr>\n"
+            for row in rows
+        ).encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b"  </tbody>\n</table>"
+
+
+class _ParquetEncoder:
+    """
+    Archivo Parquet con un grupo de filas por lote; el esquema se toma del primer lote.
+    """
+
+    def __init__(self, columns: list):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self.columns = columns
+        self._sink = _ChunkSink()
+        self._writer = None
+
+    def start(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        if not rows:
+            return b""
+        data = {name: [row[index] for row in rows] for index, name in enumerate(self.columns)}
+        if self._writer is None:
+            table = self._pa.table(data)
+            self._writer = self._pq.ParquetWriter(self._sink, table.schema)
+        else:
+            table = self._pa.table(data, schema=self._writer.schema)
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        if self._writer is None:
+            # Resultado vacío: se escribe un archivo válido con las columnas y sin filas
+            schema = self._pa.schema([(name, self._pa.string()) for name in self.columns])
+            self._writer = self._pq.ParquetWriter(self._sink, schema)
+        self._writer.close()
+        return self._sink.drain()
+
+
+ENCODERS = {
+    "json": _JSONEncoder,
+    "ndjson": _NDJSONEncoder,
+    "csv": _CSVEncoder,
+    "html": _HTMLEncoder,
+    "parquet": _ParquetEncoder,
+}
+
+
+def validate_export_format(format: str):
+    """
+    Valida el formato de exportación solicitado.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado. Usa {', '.join(EXPORT_FORMATS)}.")
+    if format == "parquet" and not parquet_available():
+        raise ValueError("El formato 'parquet' requiere pyarrow instalado.")
+
+
+class MetricsExporter:
+    def __init__(self, engine: Engine, batch_size: int = EXPORT_BATCH_SIZE):
+        """
+        Exporta el resultado de una métrica leyendo el cursor del servidor por lotes y
+        serializando cada lote directamente, sin DataFrame intermedio ni archivos temporales.
+        """
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def stream(self, metric: str, format: str, filters: MetricFilters = None):
+        """
+        Generador de bytes con la métrica en el formato solicitado, filtrada con `filters` (`MetricFilters`).
+        La consulta se ejecuta antes del primer bloque, así los errores aparecen antes de empezar a responder.
+        """
+        validate_export_format(format)
+
+        # Sesión propia: la respuesta se sigue generando después de que el endpoint devuelve
+        with Session(bind=self.engine) as db:
+            if METRICS_ENGINE == "columnar":
+                frame = getattr(MetricsService(db), f"get_{metric}")(filters)
+                yield from self._encode_frame(frame, format)
+                return
+
+            query, columns = MetricsService(db).metric_query(metric, filters)
+            connection = db.connection().execution_options(stream_results=True)
+            result = connection.execute(query)
+            encoder = ENCODERS[format](columns)
+            yield encoder.start()
+            for batch in result.partitions(self.batch_size):
+                yield encoder.encode(batch)
+            yield encoder.finish()
+
+    def _encode_frame(self, frame, format: str):
+        """
+        Serializa por lotes un resultado ya calculado en memoria (motor columnar).
+        """
+        encoder = ENCODERS[format](list(frame.columns))
+        rows = list(frame.astype(object).itertuples(index=False, name=None))
+        yield encoder.start()
+        for offset in range(0, len(rows), self.batch_size):
+            yield encoder.encode(rows[offset:offset + self.batch_size])
+        yield encoder.finish()
+
+
+class AsyncMetricsExporter(MetricsExporter):
+    def __init__(self, engine: "AsyncEngine", batch_size: int = EXPORT_BATCH_SIZE):
+        """
+        Versión asíncrona del exportador: lee el cursor del servidor con el motor asíncrono
+        sin ocupar un hilo del pool mientras espera a la base de datos.
+        """
+        super().__init__(engine, batch_size)
+
+    async def stream(self, metric: str, format: str, filters: MetricFilters = None):
+        """
+        Generador asíncrono de bytes con la métrica en el formato solicitado.
+        """
+        from sqlalchemy.ext.asyncio import AsyncSession
+
+        validate_export_format(format)
+
+        async with AsyncSession(self.engine) as db:
+            if METRICS_ENGINE == "columnar":
+                frame = await AsyncMetricsService(db).get_metric_frame(metric, filters)
+                for chunk in self._encode_frame(frame, format):
+                    yield chunk
+                return
+
+            # Las verificaciones del registro de esquemas usan la API síncrona sobre la conexión asíncrona
+            query, columns = await db.run_sync(lambda session: MetricsService(session).metric_query(metric, filters))
+            result = await db.stream(query)
+            encoder = ENCODERS[format](columns)
+            yield encoder.start()
+            async for batch in result.partitions(self.batch_size):
+                yield encoder.encode(batch)
+            yield encoder.finish()
@@ -1,51 +1,83 @@
-import pandas as pd
+from typing import TYPE_CHECKING
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from matplotlib import pyplot as plt
 from io import BytesIO
-import base64
+import asyncio
+import hashlib
+from dataclasses import astuple, dataclass
+from app.services.schema_registry import schema_registry
+from app.services.rollup_service import HiringRollupService
+from app.services.result_cache import metrics_cache
+from app.services.prepared_statements import PreparedStatement
+from app.services.chart_renderer import (
+    chart_pool,
+    render_above_average_departments,
+    render_employees_per_quarter,
+    validate_chart_options,
+)
+from app.config import METRICS_DEFAULT_YEAR, METRICS_ENGINE, METRICS_PREPARED_STATEMENTS
 
+if TYPE_CHECKING:
+    import pandas as pd
+    from sqlalchemy.ext.asyncio import AsyncSession
 
-class MetricsService:
-    def __init__(self, db: Session):
-        self.db = db
 
-    def get_employees_per_quarter(self):
-        """
-        Obtiene la cantidad de empleados contratados por trimestre en 2021, agrupados por departamento y trabajo.
-        """
-        query = text("""
+# Parámetros de las consultas de métricas y su tipo en PostgreSQL
+METRIC_PARAMETER_TYPES = {
+    "year": "integer",
+    "quarter_from": "integer",
+    "quarter_end": "integer",
+    "department_id": "integer",
+    "job_id": "integer",
+}
+
+# Filtro común: el periodo es un rango semiabierto [quarter_from, quarter_end) sobre el prefijo (year, quarter)
+# de la llave primaria de `hiring_rollup`, y los filtros opcionales no impiden usar ese índice
+METRIC_FILTER = """
+            r.year = :year
+            AND r.quarter >= :quarter_from AND r.quarter < :quarter_end
+            AND (CAST(:department_id AS INTEGER) IS NULL OR r.department_id = :department_id)
+            AND (CAST(:job_id AS INTEGER) IS NULL OR r.job_id = :job_id)
+"""
+
+# Consultas de cada métrica: (tablas requeridas, sentencia preparada, columnas del resultado).
+# Se calculan desde el resumen `hiring_rollup`, por lo que el costo depende de departamentos × puestos.
+METRIC_QUERIES = {
+    "employees_per_quarter": (
+        ("hired_employees", "departments", "jobs"),
+        PreparedStatement(
+            "metrics_employees_per_quarter",
+            f"""
         SELECT
             d.department,
             j.job,
-            SUM(CASE WHEN EXTRACT(QUARTER FROM CAST(he.datetime AS TIMESTAMPTZ)) = 1 THEN 1 ELSE 0 END) AS Q1,
-            SUM(CASE WHEN EXTRACT(QUARTER FROM CAST(he.datetime AS TIMESTAMPTZ)) = 2 THEN 1 ELSE 0 END) AS Q2,
-            SUM(CASE WHEN EXTRACT(QUARTER FROM CAST(he.datetime AS TIMESTAMPTZ)) = 3 THEN 1 ELSE 0 END) AS Q3,
-            SUM(CASE WHEN EXTRACT(QUARTER FROM CAST(he.datetime AS TIMESTAMPTZ)) = 4 THEN 1 ELSE 0 END) AS Q4
-        FROM hired_employees he
-        JOIN departments d ON he.department_id = d.id
-        JOIN jobs j ON he.job_id = j.id
-        WHERE EXTRACT(YEAR FROM CAST(he.datetime AS TIMESTAMPTZ)) = 2021
+            SUM(CASE WHEN r.quarter = 1 THEN r.hires ELSE 0 END) AS Q1,
+            SUM(CASE WHEN r.quarter = 2 THEN r.hires ELSE 0 END) AS Q2,
+            SUM(CASE WHEN r.quarter = 3 THEN r.hires ELSE 0 END) AS Q3,
+            SUM(CASE WHEN r.quarter = 4 THEN r.hires ELSE 0 END) AS Q4
+        FROM hiring_rollup r
+        JOIN departments d ON r.department_id = d.id
+        JOIN jobs j ON r.job_id = j.id
+        WHERE {METRIC_FILTER}
         GROUP BY d.department, j.job
-        ORDER BY d.department, j.job;
-        """)
-        result = self.db.execute(query).fetchall()
-        df = pd.DataFrame(result, columns=["department", "job", "Q1", "Q2", "Q3", "Q4"])
-        return df
-
-    def get_above_average_departments(self):
-        """
-        Obtiene los departamentos que contrataron más empleados que el promedio en 2021.
-        """
-        query = text("""
+        ORDER BY d.department, j.job
+        """,
+            METRIC_PARAMETER_TYPES,
+        ),
+        ["department", "job", "Q1", "Q2", "Q3", "Q4"],
+    ),
+    "above_average_departments": (
+        ("hired_employees", "departments"),
+        PreparedStatement(
+            "metrics_above_average_departments",
+            f"""
         WITH department_hires AS (
             SELECT
                 d.id,
                 d.department,
-                COUNT(*) AS hired
-            FROM hired_employees he
-            JOIN departments d ON he.department_id = d.id
-            WHERE EXTRACT(YEAR FROM CAST(he.datetime AS TIMESTAMPTZ)) = 2021
+                SUM(r.hires) AS hired
+            FROM hiring_rollup r
+            JOIN departments d ON r.department_id = d.id
+            WHERE {METRIC_FILTER}
             GROUP BY d.id, d.department
         ),
         average_hires AS (
@@ -54,78 +86,240 @@ class MetricsService:
         SELECT dh.id, dh.department, dh.hired
         FROM department_hires dh, average_hires ah
         WHERE dh.hired > ah.avg_hired
-        ORDER BY dh.hired DESC;
-        """)
-        result = self.db.execute(query).fetchall()
-        df = pd.DataFrame(result, columns=["id", "department", "hired"])
-        return df
-
-    def generate_file(self, df: pd.DataFrame, format: str, file_name: str):
-        """
-        Genera un archivo en el formato especificado (json, csv, html).
-        """
-        file_path = f"/tmp/{file_name}"
-        if format == "json":
-            return df.to_dict(orient="records")
-        elif format == "csv":
-            df.to_csv(file_path, index=False)
-            return file_path
-        elif format == "html":
-            df.to_html(file_path, index=False)
-            return file_path
-        else:
-            raise ValueError("Formato no soportado. Usa 'json', 'csv' o 'html'.")
-        
-    def generate_employees_per_quarter_chart_in_memory(self, df: pd.DataFrame):
+        ORDER BY dh.hired DESC
+        """,
+            METRIC_PARAMETER_TYPES,
+        ),
+        ["id", "department", "hired"],
+    ),
+}
+
+
+@dataclass(frozen=True)
+class MetricFilters:
+    """
+    Filtros de las métricas: año, rango de trimestres (inclusivo) y, opcionalmente, departamento y puesto.
+    """
+    year: int = METRICS_DEFAULT_YEAR
+    quarter_from: int = 1
+    quarter_to: int = 4
+    department_id: int = None
+    job_id: int = None
+
+    def __post_init__(self):
+        if not 1 <= self.year <= 9999:
+            raise ValueError("`year` no es válido.")
+        if not 1 <= self.quarter_from <= self.quarter_to <= 4:
+            raise ValueError("El rango de trimestres debe cumplir 1 <= quarter_from <= quarter_to <= 4.")
+
+    def params(self) -> dict:
         """
-        Genera un gráfico de barras apiladas en memoria para empleados contratados por trimestre.
+        Parámetros de las consultas; el fin del rango de trimestres es exclusivo.
         """
-        import matplotlib.pyplot as plt
-        import io
+        return {
+            "year": self.year,
+            "quarter_from": self.quarter_from,
+            "quarter_end": self.quarter_to + 1,
+            "department_id": self.department_id,
+            "job_id": self.job_id,
+        }
 
-        # Configuración de la figura
-        plt.figure(figsize=(12, 8))
-        quarters = ["Q1", "Q2", "Q3", "Q4"]
-        for quarter in quarters:
-            plt.bar(df["department"] + " - " + df["job"], df[quarter], label=quarter)
+    def key(self) -> tuple:
+        """
+        Identifica los filtros en las claves de caché y ETags.
+        """
+        return astuple(self)
 
-        plt.xlabel("Departamento - Trabajo", fontsize=12)
-        plt.ylabel("Número de Contrataciones", fontsize=12)
-        plt.title("Empleados Contratados por Trimestre en 2021", fontsize=14)
-        plt.xticks(rotation=45, ha="right", fontsize=10)
-        plt.legend(title="Trimestres")
-        plt.tight_layout()
 
-        # Guardar en memoria
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format="png")
-        plt.close()
-        buffer.seek(0)  # Reiniciar el cursor al inicio del buffer
-        return buffer
+class MetricsService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.engine = db.get_bind()
+
+    def _require_tables(self, *table_names: str):
+        """
+        Verifica con el registro de esquemas que existan las tablas usadas por una métrica.
+        """
+        missing = [name for name in table_names if not schema_registry.table_exists(self.engine, name)]
+        if missing:
+            raise ValueError(f"No se encontraron las tablas necesarias para la métrica: {', '.join(missing)}.")
+
+    def _ensure_rollup(self):
+        """
+        Garantiza que exista el resumen `hiring_rollup` desde el que se calculan las métricas.
+        """
+        HiringRollupService(self.engine).ensure()
+
+    def rebuild_rollup(self, year: int = None) -> int:
+        """
+        Reconstruye el resumen de contrataciones desde `hired_employees`.
+        Con `year` solo se recalcula ese año, filtrando por rango sobre la columna `datetime` para que
+        PostgreSQL lea únicamente sus particiones; requiere que la columna sea DATETIME en la metadata.
+        """
+        self._require_tables("hired_employees")
+        rollup_service = HiringRollupService(self.engine)
+        if year is None:
+            return rollup_service.rebuild()
+
+        data_type = next(
+            (entry.data_type for entry in schema_registry.get_columns(self.engine, "hired_employees") if entry.column_name == "datetime"),
+            None,
+        )
+        if data_type != "DATETIME":
+            raise ValueError("Recalcular un año requiere que `hired_employees.datetime` sea DATETIME en la metadata.")
+        rollup_service.ensure()
+        return rollup_service.refresh_period(year)
+
+    def _prepared_query(self, metric: str) -> tuple:
+        """
+        Verifica las tablas de una métrica, garantiza el resumen de contrataciones y
+        devuelve (sentencia preparada, columnas).
+        """
+        if metric not in METRIC_QUERIES:
+            raise ValueError(f"Métrica desconocida: {metric}.")
+        tables, statement, columns = METRIC_QUERIES[metric]
+        self._require_tables(*tables)
+        self._ensure_rollup()
+        return statement, columns
+
+    def metric_query(self, metric: str, filters: MetricFilters = None):
+        """
+        Devuelve (consulta con los filtros como parámetros, columnas) lista para ejecutarse o exportarse
+        en streaming. Un cursor del servidor no puede declararse sobre `EXECUTE`, por eso aquí no se usa
+        la sentencia preparada; con asyncpg el controlador ya prepara y reutiliza cada consulta por conexión.
+        """
+        statement, columns = self._prepared_query(metric)
+        return statement.statement((filters or MetricFilters()).params()), columns
 
+    def _metric_frame(self, metric: str, filters: MetricFilters = None) -> "pd.DataFrame":
+        if METRICS_ENGINE == "columnar":
+            return self.columnar_frame(metric, filters)
+        return self.sql_frame(metric, filters)
 
-    def generate_above_average_departments_chart_in_memory(self, df: pd.DataFrame):
+    def sql_frame(self, metric: str, filters: MetricFilters = None) -> "pd.DataFrame":
+        """
+        Calcula la métrica en la base de datos con su sentencia preparada.
+        """
+        import pandas as pd
+
+        statement, columns = self._prepared_query(metric)
+        params = (filters or MetricFilters()).params()
+        result = statement.execute(self.db.connection(), params, METRICS_PREPARED_STATEMENTS).fetchall()
+        return pd.DataFrame(result, columns=columns)
+
+    def columnar_frame(self, metric: str, filters: MetricFilters = None) -> "pd.DataFrame":
+        """
+        Calcula la métrica con el motor columnar en memoria, sin consultar el resumen.
+        """
+        from app.services.columnar_metrics import get_columnar_engine
+
+        if metric not in METRIC_QUERIES:
+            raise ValueError(f"Métrica desconocida: {metric}.")
+        self._require_tables(*METRIC_QUERIES[metric][0])
+        return getattr(get_columnar_engine(self.engine), metric)(filters or MetricFilters())
+
+    def get_employees_per_quarter(self, filters: MetricFilters = None):
+        """
+        Obtiene la cantidad de empleados contratados por trimestre en el año de `filters` (2021 por defecto),
+        agrupados por departamento y trabajo.
+        """
+        return self._metric_frame("employees_per_quarter", filters)
+
+    def get_above_average_departments(self, filters: MetricFilters = None):
+        """
+        Obtiene los departamentos que contrataron más empleados que el promedio en el periodo de `filters`.
+        """
+        return self._metric_frame("above_average_departments", filters)
+
+    @staticmethod
+    def _result_digest(df: "pd.DataFrame") -> str:
+        """
+        Calcula una huella del resultado de una métrica para usarla como clave de caché de sus gráficos.
+        """
+        import pandas as pd
+
+        digest = hashlib.sha1(",".join(map(str, df.columns)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def generate_employees_per_quarter_chart_in_memory(
+        df: "pd.DataFrame", format: str = "png", dpi: int = 100, year: int = METRICS_DEFAULT_YEAR
+    ):
+        """
+        Genera un gráfico de barras apiladas en memoria para empleados contratados por trimestre.
+        El gráfico se dibuja en el pool de procesos y se guarda en caché según el resultado de la métrica.
+        """
+        validate_chart_options(format, dpi)
+        labels = (df["department"] + " - " + df["job"]).tolist()
+        quarters = {quarter: df[quarter].astype(float).tolist() for quarter in ["Q1", "Q2", "Q3", "Q4"]}
+
+        key = ("chart", "employees_per_quarter", format, dpi, year, MetricsService._result_digest(df))
+        image = metrics_cache.get_or_compute(
+            key, lambda: chart_pool.render(render_employees_per_quarter, labels, quarters, format, dpi, year)
+        )
+        return BytesIO(image)
+
+    @staticmethod
+    def generate_above_average_departments_chart_in_memory(
+        df: "pd.DataFrame", format: str = "png", dpi: int = 100, year: int = METRICS_DEFAULT_YEAR
+    ):
         """
         Genera un gráfico de barras en memoria para departamentos con contrataciones por encima del promedio.
+        El gráfico se dibuja en el pool de procesos y se guarda en caché según el resultado de la métrica.
         """
-        import matplotlib.pyplot as plt
-        import io
+        validate_chart_options(format, dpi)
+        departments = df["department"].tolist()
+        hired = df["hired"].astype(float).tolist()
 
-        # Configuración de la figura
-        plt.figure(figsize=(10, 6))
-        plt.bar(df["department"], df["hired"], color="skyblue")
-        plt.xlabel("Departamento", fontsize=12)
-        plt.ylabel("Número de Contrataciones", fontsize=12)
-        plt.title("Departamentos con Contrataciones por Encima del Promedio (2021)", fontsize=14)
-        plt.xticks(rotation=45, ha="right", fontsize=10)
-        plt.tight_layout()
+        key = ("chart", "above_average_departments", format, dpi, year, MetricsService._result_digest(df))
+        image = metrics_cache.get_or_compute(
+            key, lambda: chart_pool.render(render_above_average_departments, departments, hired, format, dpi, year)
+        )
+        return BytesIO(image)
 
-        # Guardar en memoria
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format="png")
-        plt.close()
-        buffer.seek(0)  # Reiniciar el cursor al inicio del buffer
-        return buffer
 
+class AsyncMetricsService:
+    def __init__(self, db: "AsyncSession"):
+        """
+        Versión asíncrona del servicio de métricas. Las consultas se ejecutan con la sesión asíncrona;
+        las verificaciones del registro de esquemas y del resumen reutilizan `MetricsService` mediante `run_sync`.
+        """
+        self.db = db
 
+    async def metric_query(self, metric: str, filters: MetricFilters = None):
+        return await self.db.run_sync(lambda session: MetricsService(session).metric_query(metric, filters))
 
+    async def get_metric_frame(self, metric: str, filters: MetricFilters = None) -> "pd.DataFrame":
+        """
+        Ejecuta la consulta de una métrica y devuelve su resultado como DataFrame.
+        """
+        import pandas as pd
+
+        if METRICS_ENGINE == "columnar":
+            # El motor columnar lee con el motor síncrono (COPY de psycopg2) y calcula en un hilo aparte
+            from sqlalchemy.orm import Session as SyncSession
+            from app.database.session import engine
+
+            def compute():
+                with SyncSession(bind=engine) as session:
+                    return MetricsService(session).columnar_frame(metric, filters)
+
+            return await asyncio.to_thread(compute)
+
+        query, columns = await self.metric_query(metric, filters)
+        result = await self.db.execute(query)
+        return pd.DataFrame(result.fetchall(), columns=columns)
+
+    async def rebuild_rollup(self, year: int = None) -> int:
+        return await self.db.run_sync(lambda session: MetricsService(session).rebuild_rollup(year))
+
+    async def generate_chart_in_memory(
+        self, metric: str, df: "pd.DataFrame", format: str = "png", dpi: int = 100, year: int = METRICS_DEFAULT_YEAR
+    ):
+        """
+        Genera el gráfico de una métrica en un hilo aparte, para no bloquear el bucle de eventos
+        mientras se espera al pool de procesos.
+        """
+        generate = getattr(MetricsService, f"generate_{metric}_chart_in_memory")
+        return await asyncio.to_thread(generate, df, format, dpi, year)
@@ -0,0 +1,248 @@
+import logging
+import re
+import threading
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.exc import DBAPIError
+from app.database.models import HiringRollup
+from app.services.schema_registry import schema_registry
+from app.services.rollup_service import HiringRollupService, SOURCE_TABLE as ROLLUP_SOURCE_TABLE, period_bounds
+from app.services.result_cache import data_versions
+
+logger = logging.getLogger(__name__)
+
+# Granularidades de partición que se pueden declarar en la columna `partition_by` de la metadata
+PARTITION_GRANULARITIES = ("year", "quarter")
+
+# Particiones de una tabla con sus límites y filas estimadas
+LIST_PARTITIONS = text("""
+SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bounds, c.reltuples AS estimated_rows
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+JOIN pg_class p ON p.oid = i.inhparent
+JOIN pg_namespace n ON n.oid = p.relnamespace
+WHERE p.relname = :table_name AND n.nspname = current_schema()
+ORDER BY c.relname
+""")
+
+# Periodo de una partición: un año (2021) o un trimestre (2021q3)
+PERIOD_PATTERN = re.compile(r"^(\d{4})(?:q([1-4]))?$")
+
+# Particiones ya creadas por este proceso: {(tabla, partición)}
+_known_partitions = set()
+_known_lock = threading.Lock()
+
+
+def partition_column(definitions: list):
+    """
+    Devuelve la definición de la columna por la que se particiona la tabla, o None.
+    """
+    return next((entry for entry in definitions if entry.partition_by), None)
+
+
+def physical_primary_key(definitions: list) -> list:
+    """
+    Llave primaria de la tabla en la base de datos. En PostgreSQL la llave primaria de una tabla particionada
+    debe incluir la columna de partición, por lo que se agrega a la llave declarada en la metadata.
+    """
+    keys = [entry.column_name for entry in definitions if entry.is_primary_key]
+    column = partition_column(definitions)
+    if keys and column is not None and column.column_name not in keys:
+        keys.append(column.column_name)
+    return keys
+
+
+def parse_period(period: str, granularity: str) -> tuple:
+    """
+    Convierte '2021' o '2021q3' en (año, trimestre), validando que corresponda a la granularidad.
+    """
+    match = PERIOD_PATTERN.match(period.lower())
+    if match is None:
+        raise ValueError(f"Periodo no válido: '{period}'. Usa AAAA o AAAAqN.")
+    year, quarter = int(match.group(1)), int(match.group(2)) if match.group(2) else None
+    if (granularity == "quarter") != (quarter is not None):
+        raise ValueError(f"La tabla se particiona por '{granularity}': el periodo '{period}' no corresponde.")
+    return year, quarter
+
+
+def partition_name(table_name: str, year: int, quarter: int = None) -> str:
+    return f"{table_name}_{year}" if quarter is None else f"{table_name}_{year}q{quarter}"
+
+
+def archived_name(name: str) -> str:
+    # Nombre de una partición desconectada; así una carga posterior del periodo puede crear una partición nueva
+    return f"{name}__archived"
+
+
+class PartitionManagerService:
+    def __init__(self, engine: Engine):
+        """
+        Administra el particionamiento por rangos de fechas declarado en la metadata (`partition_by`):
+        crea las particiones que necesita cada bloque antes de cargarlo y permite desconectar (archivar)
+        y volver a conectar un periodo completo sin borrar filas una por una.
+        """
+        self.engine = engine
+        self.is_postgres = engine.dialect.name == "postgresql"
+
+    def spec(self, table_name: str):
+        """
+        Devuelve (columna, granularidad) si la tabla está particionada, o None.
+        """
+        if not self.is_postgres:
+            return None
+        column = partition_column(schema_registry.get_columns(self.engine, table_name))
+        return (column.column_name, column.partition_by) if column is not None else None
+
+    def _require_spec(self, table_name: str) -> tuple:
+        spec = self.spec(table_name)
+        if spec is None:
+            raise ValueError(f"La tabla '{table_name}' no está particionada (requiere PostgreSQL y `partition_by` en la metadata).")
+        return spec
+
+    @staticmethod
+    def periods_of(values, granularity: str) -> set:
+        """
+        Periodos (año, trimestre) presentes en una serie de fechas, calculados de forma vectorizada.
+        """
+        import pandas as pd
+
+        stamps = pd.to_datetime(values, utc=True, errors="coerce").dropna()
+        if stamps.empty:
+            return set()
+        if granularity == "year":
+            return {(int(year), None) for year in stamps.dt.year.unique()}
+        frame = pd.DataFrame({"year": stamps.dt.year, "quarter": stamps.dt.quarter}).drop_duplicates()
+        return {(int(year), int(quarter)) for year, quarter in frame.itertuples(index=False, name=None)}
+
+    def ensure_partitions(self, table_name: str, periods: set) -> list:
+        """
+        Crea las particiones que faltan para los periodos indicados, cada una en su propia transacción.
+        Devuelve los nombres de las particiones creadas.
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        created = []
+        for year, quarter in sorted(periods, key=lambda period: (period[0], period[1] or 0)):
+            name = partition_name(table_name, year, quarter)
+            with _known_lock:
+                if (table_name, name) in _known_partitions:
+                    continue
+
+            start, end = period_bounds(year, quarter)
+            statement = text(
+                f"CREATE TABLE IF NOT EXISTS {quote(name)} PARTITION OF {quote(table_name)} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(statement)
+                created.append(name)
+            except DBAPIError:
+                # Otra carga concurrente pudo crearla al mismo tiempo
+                with self.engine.connect() as connection:
+                    if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+                        raise
+
+            with _known_lock:
+                _known_partitions.add((table_name, name))
+
+        if created:
+            logger.info("Particiones creadas en '%s': %s.", table_name, ", ".join(created))
+        return created
+
+    def prepare_chunks(self, table_name: str, chunks, timer=None, with_position: bool = False):
+        """
+        Recorre los bloques de una carga creando antes de cada uno las particiones que necesita.
+        Con `with_position`, los elementos son pares `(DataFrame, posición)`.
+        """
+        column, granularity = self._require_spec(table_name)
+        for item in chunks:
+            chunk = item[0] if with_position else item
+            if not chunk.empty:
+                periods = self.periods_of(chunk[column], granularity)
+                if timer is not None:
+                    with timer.stage("partitions"):
+                        self.ensure_partitions(table_name, periods)
+                else:
+                    self.ensure_partitions(table_name, periods)
+            yield item
+
+    def ensure_from_table(self, table_name: str, source_table: str) -> list:
+        """
+        Crea las particiones que necesitan las filas de `source_table` (por ejemplo, una tabla auxiliar de restauración).
+        """
+        column, granularity = self._require_spec(table_name)
+        quote = self.engine.dialect.identifier_preparer.quote
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(
+                f"SELECT DISTINCT CAST(EXTRACT(YEAR FROM {quote(column)} AT TIME ZONE 'UTC') AS INTEGER), "
+                f"CAST(EXTRACT(QUARTER FROM {quote(column)} AT TIME ZONE 'UTC') AS INTEGER) "
+                f"FROM {quote(source_table)} WHERE {quote(column)} IS NOT NULL"
+            )).all()
+        periods = {(year, quarter if granularity == "quarter" else None) for year, quarter in rows}
+        return self.ensure_partitions(table_name, periods)
+
+    def list_partitions(self, table_name: str) -> list:
+        self._require_spec(table_name)
+        with self.engine.connect() as connection:
+            return [
+                {"name": row.name, "bounds": row.bounds, "estimated_rows": max(int(row.estimated_rows), 0)}
+                for row in connection.execute(LIST_PARTITIONS, {"table_name": table_name})
+            ]
+
+    def _rollup_period(self, connection: Connection, table_name: str, year: int, quarter: int, refresh: bool):
+        # El resumen de contrataciones se ajusta en la misma transacción que la partición
+        if table_name != ROLLUP_SOURCE_TABLE or not schema_registry.table_exists(self.engine, HiringRollup.__tablename__):
+            return
+        rollup_service = HiringRollupService(self.engine)
+        if refresh:
+            rollup_service.refresh_period(year, quarter, connection)
+        else:
+            rollup_service.remove_period(year, quarter, connection)
+
+    def detach(self, table_name: str, period: str) -> dict:
+        """
+        Desconecta la partición de un periodo: sus filas dejan de formar parte de la tabla sin borrarlas,
+        y la partición queda como una tabla independiente (`<partición>__archived`) que se puede respaldar o eliminar.
+        """
+        _, granularity = self._require_spec(table_name)
+        year, quarter = parse_period(period, granularity)
+        name = partition_name(table_name, year, quarter)
+        quote = self.engine.dialect.identifier_preparer.quote
+
+        with self.engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {quote(table_name)} DETACH PARTITION {quote(name)}"))
+            connection.execute(text(f"ALTER TABLE {quote(name)} RENAME TO {quote(archived_name(name))}"))
+            self._rollup_period(connection, table_name, year, quarter, refresh=False)
+
+        with _known_lock:
+            _known_partitions.discard((table_name, name))
+        schema_registry.invalidate()
+        data_versions.bump(table_name, *([HiringRollup.__tablename__] if table_name == ROLLUP_SOURCE_TABLE else []))
+        logger.info("Partición '%s' desconectada de '%s'.", name, table_name)
+        return {"table_name": table_name, "partition": name, "archived_table": archived_name(name), "status": "detached"}
+
+    def attach(self, table_name: str, period: str) -> dict:
+        """
+        Vuelve a conectar la partición archivada de un periodo. Falla si mientras tanto se creó una partición nueva
+        para el mismo periodo.
+        """
+        _, granularity = self._require_spec(table_name)
+        year, quarter = parse_period(period, granularity)
+        name = partition_name(table_name, year, quarter)
+        start, end = period_bounds(year, quarter)
+        quote = self.engine.dialect.identifier_preparer.quote
+
+        with self.engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {quote(archived_name(name))} RENAME TO {quote(name)}"))
+            connection.execute(text(
+                f"ALTER TABLE {quote(table_name)} ATTACH PARTITION {quote(name)} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            self._rollup_period(connection, table_name, year, quarter, refresh=True)
+
+        with _known_lock:
+            _known_partitions.add((table_name, name))
+        schema_registry.invalidate()
+        data_versions.bump(table_name, *([HiringRollup.__tablename__] if table_name == ROLLUP_SOURCE_TABLE else []))
+        logger.info("Partición '%s' conectada a '%s'.", name, table_name)
+        return {"table_name": table_name, "partition": name, "status": "attached"}
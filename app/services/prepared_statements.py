@@ -0,0 +1,74 @@
+import hashlib
+import logging
+import re
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from app.services.instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Clave de `Connection.info` con los nombres de las sentencias ya preparadas en esa conexión.
+# `info` pertenece a la conexión DBAPI del pool, así que sobrevive entre solicitudes y se descarta con ella
+PREPARED_KEY = "prepared_statements"
+
+# Parámetros con nombre (`:year`) de una consulta de `text()`; `::` (conversión de tipos) no es un parámetro
+PARAMETER_PATTERN = re.compile(r"(?<![:\w]):(\w+)")
+
+
+class PreparedStatement:
+    def __init__(self, name: str, sql: str, types: dict):
+        """
+        Consulta con parámetros con nombre que, en PostgreSQL, se prepara una sola vez por conexión
+        (`PREPARE`) y se ejecuta después con `EXECUTE`, sin volver a enviar ni planificar el texto completo.
+        `types` indica el tipo SQL de cada parámetro (por ejemplo {"year": "integer"}).
+        En otros motores se ejecuta como una consulta normal con parámetros.
+        """
+        self.sql = sql
+        self.names = list(dict.fromkeys(PARAMETER_PATTERN.findall(sql)))
+        missing = [parameter for parameter in self.names if parameter not in types]
+        if missing:
+            raise ValueError(f"Falta el tipo de los parámetros: {', '.join(missing)}.")
+
+        # El nombre incluye una huella del texto: una consulta modificada se prepara con otro nombre
+        self.name = f"{name}_{hashlib.sha1(sql.encode('utf-8')).hexdigest()[:8]}"
+        positions = {parameter: index for index, parameter in enumerate(self.names, start=1)}
+        positional = PARAMETER_PATTERN.sub(lambda match: f"${positions[match.group(1)]}", sql)
+        signature = ", ".join(types[parameter] for parameter in self.names)
+        self._prepare = text(f"PREPARE {self.name} ({signature}) AS {positional}") if self.names else text(f"PREPARE {self.name} AS {positional}")
+        arguments = ", ".join(f":{parameter}" for parameter in self.names)
+        self._execute = text(f"EXECUTE {self.name} ({arguments})" if self.names else f"EXECUTE {self.name}")
+        self._plain = text(sql)
+
+    def statement(self, params: dict):
+        """
+        Consulta normal con los parámetros ya asociados, para los casos que no pueden usar `EXECUTE`
+        (por ejemplo, un cursor del servidor: `DECLARE ... CURSOR` solo acepta un SELECT).
+        """
+        return self._plain.bindparams(**{parameter: params[parameter] for parameter in self.names})
+
+    def execute(self, connection: Connection, params: dict, prepared: bool = True):
+        """
+        Ejecuta la consulta en `connection`, preparándola antes si la conexión aún no la tiene.
+        """
+        values = {parameter: params[parameter] for parameter in self.names}
+        if not prepared or connection.dialect.name != "postgresql":
+            return connection.execute(self._plain, values)
+
+        statements = connection.info.setdefault(PREPARED_KEY, set())
+        if self.name not in statements:
+            connection.execute(self._prepare)
+            statements.add(self.name)
+            instrumentation.inc("prepared_statements_total", name=self.name)
+            logger.debug("Sentencia '%s' preparada en la conexión.", self.name)
+        return connection.execute(self._execute, values)
+
+    def explain(self, connection: Connection, params: dict) -> dict:
+        """
+        Devuelve el plan (EXPLAIN en formato JSON) con el que PostgreSQL ejecuta la sentencia preparada.
+        """
+        if connection.dialect.name != "postgresql":
+            raise ValueError("EXPLAIN de sentencias preparadas solo está disponible en PostgreSQL.")
+        self.execute(connection, params).close()
+        values = {parameter: params[parameter] for parameter in self.names}
+        explain = text(f"EXPLAIN (FORMAT JSON) {self._execute.text}")
+        return connection.execute(explain, values).scalar()[0]["Plan"]
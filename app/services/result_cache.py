@@ -0,0 +1,144 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from app.config import METRICS_CACHE_SIZE, METRICS_CACHE_TTL
+
+# Identificador de este proceso: las versiones de datos son locales, por lo que un ETag
+# emitido por otra réplica (o antes de un reinicio) nunca debe coincidir
+BOOT_ID = uuid.uuid4().hex
+
+
+def rewritten(table_name: str) -> str:
+    """
+    Nombre de la versión que solo se incrementa cuando una escritura reemplaza filas existentes de la tabla
+    (mezclas y restauraciones con reemplazo), además de la versión de la tabla.
+    """
+    return f"{table_name}:rewritten"
+
+
+class DataVersions:
+    def __init__(self):
+        """
+        Contadores de versión por tabla. Las rutas de escritura los incrementan y
+        las claves de caché los incluyen, de modo que cualquier escritura invalida los resultados afectados.
+        """
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def bump(self, *table_names: str):
+        """
+        Incrementa la versión de las tablas modificadas.
+        """
+        with self._lock:
+            for table_name in table_names:
+                self._versions[table_name] = self._versions.get(table_name, 0) + 1
+
+    def snapshot(self, table_names) -> tuple:
+        """
+        Devuelve las versiones actuales de las tablas indicadas.
+        """
+        with self._lock:
+            return tuple((table_name, self._versions.get(table_name, 0)) for table_name in table_names)
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = METRICS_CACHE_SIZE, ttl: float = METRICS_CACHE_TTL):
+        """
+        Caché LRU acotada con tiempo de vida por entrada.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Devuelve el valor almacenado para la clave o None si no existe o expiró.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Almacena un valor, descartando la entrada usada hace más tiempo si se supera el tamaño máximo.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Devuelve el valor almacenado o lo calcula con `compute` y lo guarda.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Devuelve el tamaño actual, la tasa de aciertos y los descartes de la caché.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def make_etag(key) -> str:
+    """
+    Genera un ETag a partir de la clave de caché (consulta, parámetros y versiones de datos).
+    """
+    digest = hashlib.sha1(repr((BOOT_ID, key)).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Indica si el encabezado `If-None-Match` incluye el ETag (o `*`).
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+# Instancias compartidas por el proceso
+data_versions = DataVersions()
+metrics_cache = ResultCache()
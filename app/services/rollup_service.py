@@ -0,0 +1,171 @@
+import logging
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, Connection
+from app.database.models import HiringRollup
+from app.services.schema_registry import schema_registry
+from app.services.result_cache import data_versions
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Tabla de origen del resumen de contrataciones
+SOURCE_TABLE = "hired_employees"
+
+ROLLUP_KEY = ["year", "quarter", "department_id", "job_id"]
+
+UPSERT_ROLLUP = text("""
+INSERT INTO hiring_rollup (year, quarter, department_id, job_id, hires)
+VALUES (:year, :quarter, :department_id, :job_id, :hires)
+ON CONFLICT (year, quarter, department_id, job_id)
+DO UPDATE SET hires = hiring_rollup.hires + EXCLUDED.hires
+""")
+
+REBUILD_ROLLUP = text("""
+INSERT INTO hiring_rollup (year, quarter, department_id, job_id, hires)
+SELECT
+    CAST(EXTRACT(YEAR FROM he.hired_at) AS INTEGER),
+    CAST(EXTRACT(QUARTER FROM he.hired_at) AS INTEGER),
+    he.department_id,
+    he.job_id,
+    COUNT(*)
+FROM (
+    SELECT CAST(datetime AS TIMESTAMPTZ) AT TIME ZONE 'UTC' AS hired_at, department_id, job_id
+    FROM hired_employees
+    WHERE datetime IS NOT NULL AND department_id IS NOT NULL AND job_id IS NOT NULL
+) he
+GROUP BY 1, 2, 3, 4
+""")
+
+# Recalcula un periodo con un predicado de rango sobre la columna sin transformar,
+# para que PostgreSQL lea solo las particiones del periodo (requiere `datetime` de tipo timestamp)
+REFRESH_ROLLUP_PERIOD = text("""
+INSERT INTO hiring_rollup (year, quarter, department_id, job_id, hires)
+SELECT
+    CAST(EXTRACT(YEAR FROM he.datetime AT TIME ZONE 'UTC') AS INTEGER),
+    CAST(EXTRACT(QUARTER FROM he.datetime AT TIME ZONE 'UTC') AS INTEGER),
+    he.department_id,
+    he.job_id,
+    COUNT(*)
+FROM hired_employees he
+WHERE he.datetime >= :start AND he.datetime < :end
+  AND he.department_id IS NOT NULL AND he.job_id IS NOT NULL
+GROUP BY 1, 2, 3, 4
+""")
+
+DELETE_ROLLUP_PERIOD = text("""
+DELETE FROM hiring_rollup
+WHERE year = :year AND (CAST(:quarter AS INTEGER) IS NULL OR quarter = :quarter)
+""")
+
+
+def period_bounds(year: int, quarter: int = None) -> tuple:
+    """
+    Límites [inicio, fin) en UTC de un año o de un trimestre.
+    """
+    if quarter is None:
+        return datetime(year, 1, 1, tzinfo=timezone.utc), datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    start = datetime(year, 3 * quarter - 2, 1, tzinfo=timezone.utc)
+    end = datetime(year + 1, 1, 1, tzinfo=timezone.utc) if quarter == 4 else datetime(year, 3 * quarter + 1, 1, tzinfo=timezone.utc)
+    return start, end
+
+
+class HiringRollupService:
+    def __init__(self, engine: Engine):
+        """
+        Inicializa el servicio que mantiene la tabla `hiring_rollup`, un resumen de `hired_employees`
+        por (año, trimestre, departamento, puesto) que se actualiza con cada carga.
+        """
+        self.engine = engine
+
+    def ensure(self):
+        """
+        Crea la tabla de resumen si no existe y, en ese caso, la construye desde `hired_employees`.
+        """
+        if schema_registry.table_exists(self.engine, HiringRollup.__tablename__):
+            return
+
+        HiringRollup.__table__.create(self.engine, checkfirst=True)
+        schema_registry.mark_table_created(HiringRollup.__tablename__)
+        if schema_registry.table_exists(self.engine, SOURCE_TABLE):
+            self.rebuild()
+
+    def rebuild(self) -> int:
+        """
+        Reconstruye el resumen completo en una única transacción. Devuelve el número de filas del resumen.
+        La tabla se bloquea antes de leer `hired_employees`, de modo que las cargas concurrentes
+        esperan y aplican sus incrementos sobre el resumen ya reconstruido.
+        """
+        if not schema_registry.table_exists(self.engine, HiringRollup.__tablename__):
+            HiringRollup.__table__.create(self.engine, checkfirst=True)
+            schema_registry.mark_table_created(HiringRollup.__tablename__)
+
+        with self.engine.begin() as connection:
+            connection.execute(text("LOCK TABLE hiring_rollup IN EXCLUSIVE MODE"))
+            connection.execute(text("DELETE FROM hiring_rollup"))
+            rows = connection.execute(REBUILD_ROLLUP).rowcount
+        data_versions.bump(HiringRollup.__tablename__)
+        logger.info("Resumen 'hiring_rollup' reconstruido (%s filas).", rows, extra={"rows": rows})
+        return rows
+
+    def remove_period(self, year: int, quarter: int = None, connection: Connection = None):
+        """
+        Elimina del resumen las contrataciones de un año (o de un trimestre), usando la transacción de `connection`.
+        """
+        if connection is None:
+            with self.engine.begin() as connection:
+                self.remove_period(year, quarter, connection)
+            data_versions.bump(HiringRollup.__tablename__)
+            return
+        connection.execute(DELETE_ROLLUP_PERIOD, {"year": year, "quarter": quarter})
+
+    def refresh_period(self, year: int, quarter: int = None, connection: Connection = None) -> int:
+        """
+        Recalcula el resumen de un año (o de un trimestre) leyendo solo ese rango de `hired_employees`.
+        Sin `connection` se ejecuta en su propia transacción, con la tabla de resumen bloqueada como en `rebuild`.
+        Devuelve el número de filas del resumen para el periodo.
+        """
+        if connection is None:
+            with self.engine.begin() as connection:
+                connection.execute(text("LOCK TABLE hiring_rollup IN EXCLUSIVE MODE"))
+                rows = self.refresh_period(year, quarter, connection)
+            data_versions.bump(HiringRollup.__tablename__)
+            logger.info("Resumen 'hiring_rollup' recalculado para %s (%s filas).", year if quarter is None else f"{year}q{quarter}", rows)
+            return rows
+
+        start, end = period_bounds(year, quarter)
+        self.remove_period(year, quarter, connection)
+        return connection.execute(REFRESH_ROLLUP_PERIOD, {"start": start, "end": end}).rowcount
+
+    def apply_chunk(self, connection: Connection, df: "pd.DataFrame"):
+        """
+        Suma al resumen las contrataciones de un bloque recién cargado en `hired_employees`,
+        usando la misma conexión (y transacción) que la carga.
+        """
+        import pandas as pd
+
+        hired_at = pd.to_datetime(df["datetime"], utc=True, errors="coerce")
+        frame = pd.DataFrame({
+            "year": hired_at.dt.year,
+            "quarter": hired_at.dt.quarter,
+            "department_id": pd.to_numeric(df["department_id"], errors="coerce"),
+            "job_id": pd.to_numeric(df["job_id"], errors="coerce"),
+        }).dropna()
+        if frame.empty:
+            return
+
+        counts = frame.astype(int).groupby(ROLLUP_KEY).size().reset_index(name="hires")
+        connection.execute(UPSERT_ROLLUP, counts.to_dict(orient="records"))
+
+
+if __name__ == "__main__":
+    # Reconstrucción manual: python -m app.services.rollup_service
+    from app.database.session import engine
+    from app.services.instrumentation import configure_logging
+    from app.config import LOG_FORMAT, LOG_LEVEL
+
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+    HiringRollupService(engine).rebuild()
@@ -0,0 +1,262 @@
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+from sqlalchemy import select, tuple_
+from sqlalchemy.engine import Engine
+from app.services.result_cache import data_versions
+from app.services.schema_registry import schema_registry
+from app.config import FK_CACHE_TTL, QUARANTINE_DIR
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Motivos por los que una fila se envía a cuarentena
+INVALID_TYPE = "invalid_type"
+NULL_PRIMARY_KEY = "null_primary_key"
+NULL_PARTITION_KEY = "null_partition_key"
+DUPLICATE_IN_FILE = "duplicate_in_file"
+DUPLICATE_EXISTING = "duplicate_existing"
+MISSING_FOREIGN_KEY = "missing_foreign_key"
+
+# Columnas agregadas a cada fila del archivo de cuarentena
+QUARANTINE_COLUMNS = ["line", "reason", "detail"]
+
+
+class ForeignKeyCache:
+    def __init__(self, ttl: float = FK_CACHE_TTL):
+        """
+        Conjuntos de llaves de las columnas referenciadas por llaves foráneas, compartidos por el proceso.
+        Cada conjunto se vuelve a leer cuando cambia la versión de su tabla o cuando vence su tiempo de vida.
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, engine: Engine, table_name: str, column_name: str) -> set:
+        version = data_versions.snapshot((table_name,))
+        key = (table_name, column_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                return entry[2]
+
+        table = schema_registry.get_table(engine, table_name)
+        column = table.c[column_name]
+        with engine.connect() as connection:
+            keys = set(connection.execute(select(column).distinct().where(column.isnot(None))).scalars())
+
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, keys)
+        return keys
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class QuarantineWriter:
+    def __init__(self, table_name: str, columns: list, directory: str = QUARANTINE_DIR):
+        """
+        Archivo CSV con las filas rechazadas de una carga, su línea en el archivo original y el motivo.
+        El archivo solo se crea si hay alguna fila rechazada.
+        """
+        self.table_name = table_name
+        self.columns = columns
+        self.directory = directory
+        self.file_path = None
+        self._file = None
+
+    def write(self, rejected: "pd.DataFrame"):
+        if rejected.empty:
+            return
+        header = self._file is None
+        if header:
+            os.makedirs(self.directory, exist_ok=True)
+            timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+            self.file_path = os.path.join(self.directory, f"{self.table_name}_{timestamp}.csv")
+            self._file = open(self.file_path, "w", newline="")
+        rejected[QUARANTINE_COLUMNS + self.columns].to_csv(self._file, index=False, header=header)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def existing_keys(engine: Engine, table_name: str, primary_key: list, keys: list) -> set:
+    """
+    Devuelve cuáles de `keys` (valores, o tuplas si la llave es compuesta) ya existen en la tabla
+    según la llave primaria de la metadata.
+    """
+    if not keys or not schema_registry.table_exists(engine, table_name):
+        return set()
+
+    table = schema_registry.get_table(engine, table_name)
+    columns = [table.c[name] for name in primary_key]
+    target = columns[0] if len(columns) == 1 else tuple_(*columns)
+    found = set()
+    with engine.connect() as connection:
+        for offset in range(0, len(keys), 10000):
+            statement = select(*columns).where(target.in_(keys[offset:offset + 10000]))
+            for row in connection.execute(statement):
+                found.add(row[0] if len(columns) == 1 else tuple(row))
+    return found
+
+
+class RowValidator:
+    def __init__(
+        self,
+        engine: Engine,
+        table_name: str,
+        quarantine: QuarantineWriter = None,
+        first_line: int = 0,
+        check_existing: bool = True,
+    ):
+        """
+        Valida los bloques de un archivo según la metadata de la tabla antes de insertarlos:
+        convierte los tipos de forma vectorizada, verifica la unicidad de la llave primaria
+        (dentro del archivo y contra la tabla), la existencia de las llaves foráneas y que la columna
+        de partición tenga valor.
+        Las filas inválidas se envían a `quarantine` y solo las válidas continúan.
+        `first_line` es el número de filas del archivo ya procesadas (al reanudar una carga).
+        Con `check_existing=False` (cargas con mezcla) no se rechazan las llaves que ya existen en la tabla.
+        """
+        self.engine = engine
+        self.table_name = table_name
+        self.definitions = schema_registry.get_columns(engine, table_name)
+        self.columns = [entry.column_name for entry in self.definitions]
+        self.primary_key = [entry.column_name for entry in self.definitions if entry.is_primary_key]
+        self.foreign_keys = [entry for entry in self.definitions if entry.is_foreign_key]
+        self.partition_columns = [entry.column_name for entry in self.definitions if entry.partition_by]
+        self.quarantine = quarantine or QuarantineWriter(table_name, self.columns)
+        self.reasons = Counter()
+        self.rejected = 0
+        self._seen_keys = set()
+        self._offset = first_line
+        self.check_existing = check_existing
+
+    def validate(self, chunk: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Devuelve las filas válidas del bloque con sus tipos convertidos y envía las demás a cuarentena.
+        """
+        import pandas as pd
+
+        # Línea de cada fila en el archivo original (el CSV no tiene encabezado)
+        lines = pd.RangeIndex(self._offset + 1, self._offset + len(chunk) + 1)
+        self._offset += len(chunk)
+        chunk = chunk.set_axis(lines, axis=0)
+
+        reason = pd.Series(None, index=chunk.index, dtype=object)
+        detail = pd.Series(None, index=chunk.index, dtype=object)
+
+        def reject(mask: "pd.Series", code: str, message: str):
+            mask = mask & reason.isna()
+            reason[mask] = code
+            detail[mask] = message
+
+        coerced = self._coerce_types(chunk, reject)
+        self._check_primary_key(coerced, reason, reject)
+        for name in self.partition_columns:
+            reject(coerced[name].isna(), NULL_PARTITION_KEY, f"'{name}' es nula y la tabla se particiona por ella")
+        self._check_foreign_keys(coerced, reject)
+
+        invalid = reason.notna()
+        if invalid.any():
+            rejected = chunk[invalid].assign(line=chunk.index[invalid], reason=reason[invalid], detail=detail[invalid])
+            self.quarantine.write(rejected)
+            self.reasons.update(reason[invalid].tolist())
+            self.rejected += int(invalid.sum())
+
+        valid = coerced[~invalid]
+        if self.primary_key:
+            self._seen_keys.update(self._keys(valid).tolist())
+        return valid.reset_index(drop=True)
+
+    def _coerce_types(self, chunk: "pd.DataFrame", reject) -> "pd.DataFrame":
+        """
+        Convierte cada columna al tipo de la metadata; los valores no convertibles invalidan la fila.
+        """
+        import pandas as pd
+
+        coerced = {}
+        for entry in self.definitions:
+            values = chunk[entry.column_name]
+            if entry.data_type == "STRING":
+                coerced[entry.column_name] = values.astype("string")
+                continue
+            if entry.data_type == "DATETIME":
+                stamps = pd.to_datetime(values, utc=True, errors="coerce")
+                reject(values.notna() & stamps.isna(), INVALID_TYPE, f"'{entry.column_name}' no es {entry.data_type}")
+                coerced[entry.column_name] = stamps
+                continue
+
+            numbers = pd.to_numeric(values, errors="coerce")
+            bad = (values.notna() & numbers.isna()) | (numbers.notna() & (numbers % 1 != 0))
+            reject(bad, INVALID_TYPE, f"'{entry.column_name}' no es {entry.data_type}")
+            coerced[entry.column_name] = numbers.where(~bad).astype("Int64")
+        return pd.DataFrame(coerced, index=chunk.index)
+
+    def _keys(self, df: "pd.DataFrame") -> "pd.Series":
+        """
+        Devuelve la llave primaria de cada fila (una tupla si la llave es compuesta).
+        """
+        import pandas as pd
+
+        if len(self.primary_key) == 1:
+            return df[self.primary_key[0]]
+        return pd.Series(list(df[self.primary_key].itertuples(index=False, name=None)), index=df.index, dtype=object)
+
+    def _check_primary_key(self, df: "pd.DataFrame", reason: "pd.Series", reject):
+        if not self.primary_key:
+            return
+
+        reject(df[self.primary_key].isna().any(axis=1), NULL_PRIMARY_KEY, "La llave primaria es nula")
+
+        # Solo se comparan las filas que siguen siendo válidas
+        keys = self._keys(df)[reason.isna()]
+        repeated = keys.duplicated(keep="first") | keys.isin(self._seen_keys)
+        reject(repeated.reindex(df.index, fill_value=False), DUPLICATE_IN_FILE, "Llave primaria repetida en el archivo")
+
+        if not self.check_existing:
+            return
+        keys = self._keys(df)[reason.isna()]
+        existing = self._existing_keys(keys.tolist())
+        if existing:
+            reject(keys.isin(existing).reindex(df.index, fill_value=False), DUPLICATE_EXISTING, "La llave primaria ya existe en la tabla")
+
+    def _existing_keys(self, keys: list) -> set:
+        """
+        Busca en la tabla cuáles de las llaves del bloque ya existen.
+        """
+        return existing_keys(self.engine, self.table_name, self.primary_key, keys)
+
+    def _check_foreign_keys(self, df: "pd.DataFrame", reject):
+        for entry in self.foreign_keys:
+            values = df[entry.column_name]
+            known = foreign_key_cache.get(self.engine, entry.foreign_table, entry.foreign_column)
+            missing = values.notna() & ~values.isin(known)
+            reject(
+                missing,
+                MISSING_FOREIGN_KEY,
+                f"'{entry.column_name}' no existe en {entry.foreign_table}({entry.foreign_column})",
+            )
+
+    def summary(self) -> dict:
+        """
+        Resumen de las filas rechazadas por motivo y del archivo de cuarentena.
+        """
+        return {
+            "rejected": self.rejected,
+            "reasons": dict(self.reasons),
+            "quarantine_file": self.quarantine.file_path,
+        }
+
+    def close(self):
+        self.quarantine.close()
+
+
+# Caché compartida por el proceso
+foreign_key_cache = ForeignKeyCache()
@@ -0,0 +1,170 @@
+import threading
+from dataclasses import dataclass
+from sqlalchemy import false, inspect, null, select, Table, MetaData
+from sqlalchemy.engine import Engine
+from app.database.models import Metadata
+
+
+@dataclass(frozen=True)
+class ColumnDefinition:
+    """
+    Definición de una columna tal como está registrada en la tabla `metadata`.
+    """
+    column_name: str
+    data_type: str
+    is_primary_key: bool
+    is_foreign_key: bool
+    foreign_table: str = None
+    foreign_column: str = None
+    is_indexed: bool = False
+    partition_by: str = None
+
+
+class SchemaRegistry:
+    def __init__(self):
+        """
+        Registro en memoria, compartido por todo el proceso, de las definiciones de tablas
+        (desde la tabla `metadata`) y de las tablas existentes en la base de datos.
+        """
+        self._lock = threading.RLock()
+        self._definitions = None
+        self._existing_tables = None
+        self._metadata = MetaData()
+        self.hits = 0
+        self.misses = 0
+
+    def _load_definitions(self, engine: Engine) -> dict:
+        """
+        Carga todas las definiciones de la tabla `metadata` con una única consulta.
+        """
+        with self._lock:
+            if self._definitions is not None:
+                self.hits += 1
+                return self._definitions
+
+            self.misses += 1
+            definitions = {}
+            if "metadata" in self._load_existing_tables(engine, count=False):
+                # Las tablas de metadata creadas antes de `is_indexed` y `partition_by` no tienen esas columnas
+                metadata_columns = {column["name"] for column in inspect(engine).get_columns("metadata")}
+                is_indexed = Metadata.is_indexed if "is_indexed" in metadata_columns else false().label("is_indexed")
+                partition_by = Metadata.partition_by if "partition_by" in metadata_columns else null().label("partition_by")
+                query = select(
+                    Metadata.table_name,
+                    Metadata.column_name,
+                    Metadata.data_type,
+                    Metadata.is_primary_key,
+                    Metadata.is_foreign_key,
+                    Metadata.foreign_table,
+                    Metadata.foreign_column,
+                    is_indexed,
+                    partition_by,
+                ).order_by(Metadata.id)
+                with engine.connect() as connection:
+                    for row in connection.execute(query):
+                        definitions.setdefault(row.table_name, []).append(
+                            ColumnDefinition(
+                                column_name=row.column_name,
+                                data_type=row.data_type,
+                                is_primary_key=bool(row.is_primary_key),
+                                is_foreign_key=bool(row.is_foreign_key),
+                                foreign_table=row.foreign_table,
+                                foreign_column=row.foreign_column,
+                                is_indexed=bool(row.is_indexed),
+                                partition_by=row.partition_by or None,
+                            )
+                        )
+            self._definitions = definitions
+            return definitions
+
+    def _load_existing_tables(self, engine: Engine, count: bool = True) -> set:
+        """
+        Carga los nombres de las tablas existentes en el catálogo de la base de datos.
+        """
+        with self._lock:
+            if self._existing_tables is not None:
+                if count:
+                    self.hits += 1
+                return self._existing_tables
+
+            if count:
+                self.misses += 1
+            self._existing_tables = set(inspect(engine).get_table_names())
+            return self._existing_tables
+
+    def get_columns(self, engine: Engine, table_name: str) -> list:
+        """
+        Devuelve las definiciones de columnas de una tabla, en el orden de la metadata.
+        """
+        return list(self._load_definitions(engine).get(table_name, []))
+
+    def table_names(self, engine: Engine) -> list:
+        """
+        Devuelve las tablas definidas en la metadata.
+        """
+        return list(self._load_definitions(engine))
+
+    def foreign_key_dependencies(self, engine: Engine) -> dict:
+        """
+        Devuelve las llaves foráneas de la metadata como {tabla: {tablas referenciadas}}.
+        """
+        dependencies = {}
+        for table_name, columns in self._load_definitions(engine).items():
+            for column in columns:
+                if column.is_foreign_key and column.foreign_table and column.foreign_table != table_name:
+                    dependencies.setdefault(table_name, set()).add(column.foreign_table)
+        return dependencies
+
+    def table_exists(self, engine: Engine, table_name: str) -> bool:
+        """
+        Indica si la tabla existe en la base de datos.
+        """
+        return table_name in self._load_existing_tables(engine)
+
+    def get_table(self, engine: Engine, table_name: str) -> Table:
+        """
+        Devuelve la tabla reflejada desde la base de datos, reflejándola solo la primera vez.
+        """
+        with self._lock:
+            if table_name in self._metadata.tables:
+                self.hits += 1
+                return self._metadata.tables[table_name]
+
+            if not self.table_exists(engine, table_name):
+                raise ValueError(f"No se encontró la tabla '{table_name}'.")
+
+            self.misses += 1
+            return Table(table_name, self._metadata, autoload_with=engine)
+
+    def mark_table_created(self, table_name: str):
+        """
+        Registra una tabla recién creada sin volver a consultar el catálogo.
+        """
+        with self._lock:
+            if self._existing_tables is not None:
+                self._existing_tables.add(table_name)
+
+    def invalidate(self):
+        """
+        Descarta todo lo almacenado. Se usa cuando cambia la metadata o el esquema de la base de datos.
+        """
+        with self._lock:
+            self._definitions = None
+            self._existing_tables = None
+            self._metadata = MetaData()
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de aciertos y fallos del registro.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+# Instancia compartida por todos los servicios del proceso
+schema_registry = SchemaRegistry()
@@ -1,21 +1,274 @@
+import asyncio
+import hashlib
+import json
+from typing import TYPE_CHECKING
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.database.models import Transaction
 from app.schemas.transactions import TransactionBase
+from app.services.result_cache import data_versions
+from app.services.idempotency import (
+    COMPLETED,
+    IN_PROGRESS,
+    IdempotencyConflict,
+    get_key,
+    request_hash,
+    save_key,
+    stored_response,
+)
+from app.services.group_commit import get_group_commit_writer
+from app.config import GROUP_COMMIT_TIMEOUT, TRANSACTIONS_COMMIT_EVERY, TRANSACTIONS_GROUP_COMMIT
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# Inserción de varias filas en una sola sentencia que devuelve los ids en el orden de las filas
+INSERT_RETURNING_IDS = Transaction.__table__.insert().returning(
+    Transaction.__table__.c.id, sort_by_parameter_order=True
+)
 
 def insert_transaction(db: Session, transaction: TransactionBase):
     """
     Inserta una transacción individual en la base de datos.
+    Con `TRANSACTIONS_GROUP_COMMIT` la transacción se escribe junto con las de otras solicitudes concurrentes
+    en una sola confirmación, y se espera a que esa confirmación termine (como máximo `GROUP_COMMIT_TIMEOUT`
+    segundos; si la fila no alcanzó a escribirse, se inserta directamente).
     """
+    if TRANSACTIONS_GROUP_COMMIT:
+        row = transaction.dict()
+        writer = get_group_commit_writer()
+        transaction_id = writer.wait(writer.submit(row))
+        if transaction_id is not None:
+            return {"id": transaction_id, **row}
+
     db_transaction = Transaction(**transaction.dict())
     db.add(db_transaction)
     db.commit()
+    data_versions.bump(Transaction.__tablename__)
     db.refresh(db_transaction)
     return db_transaction
 
-def insert_batch(db: Session, transactions: list[TransactionBase]):
+def insert_rows(db: Session, rows: list) -> list:
     """
-    Inserta un lote de transacciones en la base de datos.
+    Inserta filas (diccionarios con `amount` y `description`) con un `INSERT` de Core sin pasar por la
+    unidad de trabajo del ORM, y devuelve los ids generados en el mismo orden. No confirma la transacción.
     """
-    db_transactions = [Transaction(**t.dict()) for t in transactions]
-    db.add_all(db_transactions)
-    db.commit()
+    if not rows:
+        return []
+    return db.execute(INSERT_RETURNING_IDS, rows).scalars().all()
+
+def insert_batch(db: Session, transactions: list[TransactionBase], idempotency_key: str = None) -> dict:
+    """
+    Inserta un lote de transacciones en una única transacción y devuelve sus ids.
+    Con `idempotency_key`, un reintento del mismo lote devuelve la respuesta original sin volver a insertarlo.
+    """
+    rows = [t.dict() for t in transactions]
+    endpoint = "transactions/batch"
+    body_hash = request_hash(rows) if idempotency_key else None
+
+    if idempotency_key:
+        record = get_key(db, idempotency_key, endpoint, body_hash)
+        if record is not None and record.status == COMPLETED:
+            return {**stored_response(record), "replayed": True}
+
+    ids = insert_rows(db, rows)
+    response = {"rows": len(ids), "ids": ids}
+    try:
+        if idempotency_key:
+            save_key(db, idempotency_key, endpoint, COMPLETED, len(ids), response, body_hash)
+        db.commit()
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        # Un reintento concurrente con la misma llave confirmó primero: se descarta este lote
+        db.rollback()
+        return {**stored_response(get_key(db, idempotency_key, endpoint, body_hash)), "replayed": True}
+    data_versions.bump(Transaction.__tablename__)
+    return {**response, "replayed": False}
+
+
+class TransactionStreamLoader:
+    def __init__(
+        self,
+        commit_every: int = TRANSACTIONS_COMMIT_EVERY,
+        idempotency_key: str = None,
+        return_ids: bool = False,
+    ):
+        """
+        Carga un cuerpo NDJSON (una transacción por línea) de cualquier tamaño, confirmando cada `commit_every` filas.
+        Con `idempotency_key`, cada confirmación guarda también el avance y la huella de las filas confirmadas:
+        un reintento con la misma llave verifica que el cuerpo empiece con esas mismas filas, las omite
+        y continúa desde ahí.
+        Los métodos que usan la base de datos reciben la sesión como primer argumento, así pueden ejecutarse
+        en el pool de hilos (sesión síncrona) o con `AsyncSession.run_sync`.
+        """
+        if commit_every < 1:
+            raise ValueError("`commit_every` debe ser mayor que cero.")
+        self.commit_every = commit_every
+        self.idempotency_key = idempotency_key
+        self.return_ids = return_ids
+        self.endpoint = "transactions/batch/stream"
+        self.skip_rows = 0
+        self.rows_committed = 0
+        self.batches = 0
+        self.ids = []
+        self._prefix_hash = hashlib.sha256()
+        self._expected_prefix_hash = None
+        self._pending = b""
+        self._line_number = 0
+        self._row_number = 0
+        self._rows = []
+
+    def resume(self, db: Session):
+        """
+        Consulta la llave de idempotencia. Devuelve la respuesta original si la carga ya terminó;
+        si quedó a medias, prepara el cargador para verificar y omitir las filas ya confirmadas.
+        """
+        if not self.idempotency_key:
+            return None
+        record = get_key(db, self.idempotency_key, self.endpoint)
+        db.commit()
+        if record is None:
+            return None
+        if record.status == COMPLETED:
+            return {**stored_response(record), "replayed": True}
+
+        progress = stored_response(record)
+        self.skip_rows = self.rows_committed = record.rows_committed
+        self.batches = progress.get("batches", 0)
+        self._expected_prefix_hash = record.request_hash
+        if self.return_ids:
+            self.ids = progress.get("ids", [])
+        return None
+
+    def _parse_line(self, line: bytes):
+        self._line_number += 1
+        if not line.strip():
+            return
+        self._row_number += 1
+        try:
+            row = TransactionBase(**json.loads(line)).dict()
+        except (ValueError, ValidationError) as e:
+            if self._row_number <= self.skip_rows:
+                self._prefix_conflict()
+            raise ValueError(f"Línea {self._line_number} inválida: {e}")
+
+        if self._row_number <= self.skip_rows:
+            # Fila ya confirmada por un intento anterior: solo se acumula en la huella para verificarla
+            self._prefix_hash.update(self._row_fingerprint(row))
+            if self._row_number == self.skip_rows and self._expected_prefix_hash not in (None, self._prefix_hash.hexdigest()):
+                self._prefix_conflict()
+            return
+        self._rows.append(row)
+
+    @staticmethod
+    def _row_fingerprint(row: dict) -> bytes:
+        return json.dumps(row, sort_keys=True, default=str).encode("utf-8") + b"\n"
+
+    def _prefix_conflict(self):
+        raise IdempotencyConflict(
+            f"La llave de idempotencia '{self.idempotency_key}' ya se usó con otro cuerpo: "
+            f"las primeras {self.skip_rows} filas no coinciden con las ya confirmadas."
+        )
+
+    def _ready_batches(self) -> list:
+        batches = []
+        while len(self._rows) >= self.commit_every:
+            batches.append(self._rows[:self.commit_every])
+            self._rows = self._rows[self.commit_every:]
+        return batches
+
+    def feed(self, chunk: bytes) -> list:
+        """
+        Procesa un fragmento del cuerpo y devuelve los lotes completos listos para `write`.
+        """
+        data = self._pending + chunk
+        lines = data.split(b"\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._parse_line(line)
+        return self._ready_batches()
+
+    def finish(self) -> list:
+        """
+        Procesa la última línea (sin salto de línea final) y devuelve los lotes restantes.
+        """
+        if self._pending:
+            self._parse_line(self._pending)
+            self._pending = b""
+        if self._row_number < self.skip_rows:
+            self._prefix_conflict()
+        batches = self._ready_batches()
+        if self._rows:
+            batches.append(self._rows)
+            self._rows = []
+        return batches
+
+    def _progress(self) -> dict:
+        response = {"rows": self.rows_committed, "batches": self.batches}
+        if self.return_ids:
+            response["ids"] = self.ids
+        return response
+
+    def write(self, db: Session, rows: list):
+        """
+        Inserta y confirma un lote, guardando el avance de la llave de idempotencia (filas confirmadas
+        y su huella acumulada) en la misma transacción.
+        """
+        ids = insert_rows(db, rows)
+        for row in rows:
+            self._prefix_hash.update(self._row_fingerprint(row))
+        self.rows_committed += len(ids)
+        self.batches += 1
+        if self.return_ids:
+            self.ids.extend(ids)
+        if self.idempotency_key:
+            save_key(
+                db, self.idempotency_key, self.endpoint, IN_PROGRESS, self.rows_committed, self._progress(),
+                self._prefix_hash.hexdigest(),
+            )
+        db.commit()
+        data_versions.bump(Transaction.__tablename__)
+
+    def complete(self, db: Session) -> dict:
+        """
+        Marca la carga como terminada y devuelve el resumen.
+        """
+        response = self._progress()
+        if self.idempotency_key:
+            save_key(
+                db, self.idempotency_key, self.endpoint, COMPLETED, self.rows_committed, response,
+                self._prefix_hash.hexdigest(),
+            )
+            db.commit()
+        return {**response, "replayed": False}
+
+async def insert_transaction_async(db: "AsyncSession", transaction: TransactionBase):
+    """
+    Inserta una transacción individual usando una sesión asíncrona.
+    """
+    if TRANSACTIONS_GROUP_COMMIT:
+        row = transaction.dict()
+        writer = get_group_commit_writer()
+        future = writer.submit(row)
+        try:
+            # `shield` evita que vencer la espera cancele el futuro: lo resuelve `expire`
+            transaction_id = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), GROUP_COMMIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            transaction_id = writer.expire(future)
+        if transaction_id is not None:
+            return {"id": transaction_id, **row}
+
+    db_transaction = Transaction(**transaction.dict())
+    db.add(db_transaction)
+    await db.commit()
+    data_versions.bump(Transaction.__tablename__)
+    await db.refresh(db_transaction)
+    return db_transaction
+
+async def insert_batch_async(db: "AsyncSession", transactions: list[TransactionBase], idempotency_key: str = None) -> dict:
+    """
+    Inserta un lote de transacciones usando una sesión asíncrona.
+    """
+    return await db.run_sync(insert_batch, transactions, idempotency_key)
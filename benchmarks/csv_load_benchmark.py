@@ -0,0 +1,96 @@
+"""
+Compara el rendimiento (filas/segundo) de la carga con `DataFrame.to_sql` frente al
+motor de carga masiva `BulkLoaderService` (COPY en PostgreSQL, executemany en otros motores).
+
+Uso:
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.csv_load_benchmark --rows 200000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import Table, Column, Integer, String, MetaData, text
+from app.database.session import engine
+from app.services.bulk_loader import BulkLoaderService
+
+TABLE_NAME = "benchmark_hired_employees"
+COLUMNS = ["id", "name", "datetime", "department_id", "job_id"]
+
+
+def build_dataframe(rows: int) -> pd.DataFrame:
+    """
+    Genera un DataFrame sintético con la forma de `hired_employees`.
+    """
+    rng = np.random.default_rng(42)
+    timestamps = pd.Timestamp("2021-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, rows), unit="s")
+    return pd.DataFrame({
+        "id": np.arange(1, rows + 1),
+        "name": [f"Employee {i}" for i in range(rows)],
+        "datetime": timestamps.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "department_id": rng.integers(1, 13, rows),
+        "job_id": rng.integers(1, 184, rows),
+    })
+
+
+def reset_table():
+    """
+    Recrea la tabla de pruebas vacía.
+    """
+    metadata = MetaData()
+    benchmark_table = Table(
+        TABLE_NAME,
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String),
+        Column("datetime", String),
+        Column("department_id", Integer),
+        Column("job_id", Integer),
+    )
+    metadata.drop_all(engine, tables=[benchmark_table])
+    metadata.create_all(engine, tables=[benchmark_table])
+    return benchmark_table
+
+
+def run_to_sql(df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    df.to_sql(TABLE_NAME, engine, if_exists="append", index=False)
+    return time.perf_counter() - start
+
+
+def run_bulk_loader(df: pd.DataFrame, chunk_size: int) -> float:
+    loader = BulkLoaderService(engine, chunk_size=chunk_size)
+    chunks = (df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size))
+    start = time.perf_counter()
+    loader.load_chunks(TABLE_NAME, COLUMNS, chunks)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    df = build_dataframe(args.rows)
+    results = {}
+
+    reset_table()
+    results["to_sql"] = run_to_sql(df)
+
+    benchmark_table = reset_table()
+    results["bulk_loader"] = run_bulk_loader(df, args.chunk_size)
+
+    with engine.begin() as connection:
+        loaded = connection.execute(text(f"SELECT COUNT(*) FROM {TABLE_NAME}")).scalar()
+    assert loaded == args.rows, f"Se esperaban {args.rows} filas y se cargaron {loaded}."
+
+    print(f"Motor: {engine.dialect.name} | filas: {args.rows} | bloque: {args.chunk_size}")
+    for name, seconds in results.items():
+        print(f"{name:>12}: {seconds:8.3f} s  {args.rows / seconds:12,.0f} filas/s")
+    print(f"Aceleración: x{results['to_sql'] / results['bulk_loader']:.1f}")
+
+    benchmark_table.drop(engine)
+
+
+if __name__ == "__main__":
+    main()
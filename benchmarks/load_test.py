@@ -0,0 +1,127 @@
+"""
+Prueba de carga que compara solicitudes por segundo y latencia p99 de los endpoints de
+transacciones y métricas entre DB_MODE=sync y DB_MODE=async contra un PostgreSQL local.
+
+Para cada modo se levanta un servidor uvicorn con la caché de métricas desactivada
+(METRICS_CACHE_SIZE=0), de modo que cada solicitud llega a la base de datos.
+Requiere httpx y que las tablas de métricas ya estén cargadas.
+
+Uso:
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.load_test --requests 2000 --concurrency 64
+    python -m benchmarks.load_test --scenario metrics --modes async
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+SCENARIOS = {
+    "transactions": [("POST", "/api/v1/transactions/")],
+    "metrics": [
+        ("GET", "/api/v1/metrics/employees-per-quarter"),
+        ("GET", "/api/v1/metrics/above-average-departments"),
+    ],
+}
+SCENARIOS["mixed"] = SCENARIOS["transactions"] + SCENARIOS["metrics"]
+
+
+def start_server(mode: str, port: int, workers: int) -> subprocess.Popen:
+    """
+    Levanta la aplicación con el modo indicado y espera a que responda.
+    """
+    import httpx
+
+    env = {**os.environ, "DB_MODE": mode, "METRICS_CACHE_SIZE": "0"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"El servidor en modo {mode} no respondió a tiempo.")
+
+
+async def run_load(base_url: str, scenario: str, total: int, concurrency: int) -> dict:
+    """
+    Envía `total` solicitudes con `concurrency` clientes simultáneos y devuelve RPS, latencias y errores.
+    """
+    import httpx
+
+    endpoints = SCENARIOS[scenario]
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for index in range(total):
+        queue.put_nowait(endpoints[index % len(endpoints)])
+
+    async def client(http: httpx.AsyncClient):
+        nonlocal errors
+        while not queue.empty():
+            method, path = queue.get_nowait()
+            body = {"amount": round(random.uniform(1, 1000), 2), "description": "load test"} if method == "POST" else None
+            start = time.perf_counter()
+            try:
+                response = await http.request(method, path, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for mode in args.modes:
+        server = start_server(mode, args.port, args.workers)
+        try:
+            asyncio.run(run_load(base_url, args.scenario, args.warmup, args.concurrency))
+            results[mode] = asyncio.run(run_load(base_url, args.scenario, args.requests, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"Escenario: {args.scenario}, {args.requests} solicitudes, concurrencia {args.concurrency}")
+    for mode, result in results.items():
+        print(
+            f"{mode:>5}: {result['rps']:,.0f} req/s, p50 {result['p50_ms']:.1f} ms, "
+            f"p99 {result['p99_ms']:.1f} ms, errores {result['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
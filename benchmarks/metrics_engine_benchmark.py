@@ -0,0 +1,95 @@
+"""
+Compara la latencia y la memoria de las métricas calculadas con SQL (sentencias preparadas sobre `hiring_rollup`,
+resultado convertido a DataFrame) frente al motor columnar en memoria (`METRICS_ENGINE=columnar`).
+Usa las tablas `hired_employees`, `departments` y `jobs` de la base de datos configurada.
+
+Uso:
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.metrics_engine_benchmark --runs 200 --year 2021
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+from sqlalchemy.orm import Session
+from app.database.session import engine
+from app.services.columnar_metrics import ColumnarMetricsEngine
+from app.services.metrics_service import METRIC_QUERIES, MetricFilters, MetricsService
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(compute, runs: int) -> dict:
+    """
+    Ejecuta `compute` `runs` veces y devuelve la latencia (p50, p95) en milisegundos y el pico de memoria
+    asignada por Python durante una ejecución.
+    """
+    compute()  # Calentamiento: preparación de sentencias, cachés del registro y del pool
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        compute()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    compute()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": percentile(samples, 0.95),
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--year", type=int, default=MetricFilters().year)
+    args = parser.parse_args()
+
+    filters = MetricFilters(year=args.year)
+
+    # Carga completa del motor columnar: tiempo y memoria de los arrays
+    columnar = ColumnarMetricsEngine(engine, refresh_interval=3600, full_reload_interval=float("inf"))
+    tracemalloc.start()
+    start = time.perf_counter()
+    columnar.refresh()
+    load_seconds = time.perf_counter() - start
+    _, load_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = columnar.stats()
+    print(
+        f"Motor columnar: {stats['rows']} filas cargadas en {load_seconds:.3f} s, "
+        f"{stats['bytes'] / 1024 / 1024:.2f} MB en columnas (pico durante la carga {load_peak / 1024 / 1024:.1f} MB)"
+    )
+
+    # Comprobación de filas nuevas por marca de agua (sin cambios en la tabla)
+    columnar.refresh_interval = 0
+    start = time.perf_counter()
+    columnar.refresh()
+    print(f"Comprobación incremental: {(time.perf_counter() - start) * 1000:.2f} ms")
+    columnar.refresh_interval = 3600
+
+    print(f"{'métrica':<28}{'motor':<10}{'p50 ms':>10}{'p95 ms':>10}{'pico MB':>10}")
+    with Session(bind=engine) as db:
+        metrics_service = MetricsService(db)
+        for metric in METRIC_QUERIES:
+            expected = metrics_service.sql_frame(metric, filters)
+            result = getattr(columnar, metric)(filters)
+            if len(expected) != len(result):
+                print(f"AVISO: '{metric}' devuelve {len(expected)} filas con SQL y {len(result)} con el motor columnar.")
+
+            for name, compute in (
+                ("sql", lambda: metrics_service.sql_frame(metric, filters)),
+                ("columnar", lambda: getattr(columnar, metric)(filters)),
+            ):
+                result = measure(compute, args.runs)
+                print(f"{metric:<28}{name:<10}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['peak_mb']:>10.2f}")
+            db.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Verifica con `EXPLAIN` que las consultas de métricas pueden usar índices y particiones en lugar de recorrer
+tablas completas, y falla (código de salida 1) si algún plan hace un `Seq Scan` sobre las tablas vigiladas
+o lee particiones fuera del periodo consultado.
+
+Los planes se obtienen con `enable_seqscan = off` dentro de una transacción que se descarta: en tablas
+pequeñas el planificador prefiere un recorrido secuencial aunque exista un índice, y lo que se verifica aquí
+es que el predicado *pueda* resolverse con un índice (un `Seq Scan` solo aparece si ningún índice sirve).
+
+Uso:
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.metrics_explain_check --year 2021
+"""
+import argparse
+import json
+import sys
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database.session import engine
+from app.services.metrics_service import METRIC_QUERIES, MetricFilters, MetricsService
+from app.services.partition_manager import PartitionManagerService, partition_name
+from app.services.rollup_service import REFRESH_ROLLUP_PERIOD, SOURCE_TABLE, period_bounds
+
+# Tablas que no deben recorrerse completas en las consultas de métricas
+WATCHED_TABLES = ("hiring_rollup", SOURCE_TABLE)
+
+
+def plan_nodes(plan: dict):
+    """
+    Recorre todos los nodos de un plan de EXPLAIN en formato JSON.
+    """
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def sequential_scans(plan: dict) -> list:
+    return sorted({
+        node["Relation Name"] for node in plan_nodes(plan)
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name", "").startswith(WATCHED_TABLES)
+    })
+
+
+def scanned_relations(plan: dict) -> list:
+    return sorted({node["Relation Name"] for node in plan_nodes(plan) if "Relation Name" in node})
+
+
+def check_metrics(connection, filters: MetricFilters) -> list:
+    """
+    Revisa el plan de la sentencia preparada de cada métrica.
+    """
+    failures = []
+    for metric, (_, statement, _) in METRIC_QUERIES.items():
+        plan = statement.explain(connection, filters.params())
+        scans = sequential_scans(plan)
+        print(f"{metric}: {', '.join(scanned_relations(plan))}")
+        if scans:
+            failures.append(f"{metric}: Seq Scan sobre {', '.join(scans)}")
+    return failures
+
+
+def check_partition_pruning(connection, year: int) -> list:
+    """
+    Revisa que recalcular un año del resumen lea solo las particiones de ese año.
+    """
+    spec = PartitionManagerService(engine).spec(SOURCE_TABLE)
+    if spec is None:
+        print(f"'{SOURCE_TABLE}' no está particionada: se omite la verificación de particiones.")
+        return []
+
+    _, granularity = spec
+    allowed = (
+        {partition_name(SOURCE_TABLE, year)} if granularity == "year"
+        else {partition_name(SOURCE_TABLE, year, quarter) for quarter in range(1, 5)}
+    )
+    start, end = period_bounds(year)
+    plan = connection.execute(
+        text(f"EXPLAIN (FORMAT JSON) {REFRESH_ROLLUP_PERIOD.text}"), {"start": start, "end": end}
+    ).scalar()[0]["Plan"]
+
+    partitions = [name for name in scanned_relations(plan) if name.startswith(f"{SOURCE_TABLE}_")]
+    print(f"rollup {year}: {', '.join(partitions) or 'sin particiones'}")
+    failures = [f"rollup {year}: Seq Scan sobre {name}" for name in sequential_scans(plan) if name == SOURCE_TABLE]
+    outside = sorted(set(partitions) - allowed)
+    if outside:
+        failures.append(f"rollup {year}: lee particiones fuera del año ({', '.join(outside)})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, default=MetricFilters().year)
+    parser.add_argument("--quarter-from", type=int, default=1)
+    parser.add_argument("--quarter-to", type=int, default=4)
+    parser.add_argument("--department-id", type=int, default=None)
+    parser.add_argument("--job-id", type=int, default=None)
+    parser.add_argument("--show-plans", action="store_true", help="Imprime los planes completos")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print("La verificación de planes requiere PostgreSQL.")
+        sys.exit(1)
+
+    filters = MetricFilters(args.year, args.quarter_from, args.quarter_to, args.department_id, args.job_id)
+    with Session(bind=engine) as db:
+        # Garantiza las tablas y el resumen antes de revisar los planes
+        MetricsService(db).metric_query("employees_per_quarter", filters)
+        db.commit()
+
+    with engine.connect() as connection:
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        failures = check_metrics(connection, filters) + check_partition_pruning(connection, args.year)
+        if args.show_plans:
+            for metric, (_, statement, _) in METRIC_QUERIES.items():
+                print(json.dumps(statement.explain(connection, filters.params()), indent=2))
+        connection.rollback()
+
+    if failures:
+        for failure in failures:
+            print(f"FALLA: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Mide el arranque en frío de la aplicación (tiempo de importación de `app.main` y memoria residente)
+en un proceso nuevo, y falla (código de salida 1) si supera el presupuesto o si se cargan
+dependencias pesadas (pandas, matplotlib, fastavro) antes de la primera solicitud.
+
+Uso:
+    python -m benchmarks.startup_benchmark --max-import-seconds 1.5 --max-rss-mb 120
+    ENABLED_ROUTERS=transactions python -m benchmarks.startup_benchmark
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "fastavro"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({
+    "import_seconds": elapsed,
+    "rss_mb": rss_mb,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure(runs: int) -> dict:
+    """
+    Importa la aplicación en `runs` procesos nuevos y devuelve la mejor medición de tiempo y la peor de memoria.
+    """
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            check=True,
+            capture_output=True,
+            text=True,
+            env=os.environ.copy(),
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {
+        "import_seconds": min(sample["import_seconds"] for sample in samples),
+        "rss_mb": max(sample["rss_mb"] for sample in samples),
+        "heavy_modules": sorted({name for sample in samples for name in sample["heavy_modules"]}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, default=float(os.getenv("STARTUP_MAX_IMPORT_SECONDS", "1.5")))
+    parser.add_argument("--max-rss-mb", type=float, default=float(os.getenv("STARTUP_MAX_RSS_MB", "120")))
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(f"Routers: {os.getenv('ENABLED_ROUTERS', 'todos')}")
+    print(f"Importación: {result['import_seconds']:.3f} s (presupuesto {args.max_import_seconds} s)")
+    print(f"Memoria residente: {result['rss_mb']:.1f} MB (presupuesto {args.max_rss_mb} MB)")
+    print(f"Dependencias pesadas cargadas: {', '.join(result['heavy_modules']) or 'ninguna'}")
+
+    failures = []
+    if result["import_seconds"] > args.max_import_seconds:
+        failures.append("tiempo de importación")
+    if result["rss_mb"] > args.max_rss_mb:
+        failures.append("memoria residente")
+    if result["heavy_modules"]:
+        failures.append("dependencias pesadas cargadas al arrancar")
+
+    if failures:
+        print(f"FALLA: se superó el presupuesto de {', '.join(failures)}.")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
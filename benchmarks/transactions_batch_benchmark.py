@@ -0,0 +1,72 @@
+"""
+Compara el rendimiento (filas/segundo) de la inserción de lotes de transacciones con el ORM
+(`add_all`, la ruta anterior de `/transactions/batch/`) frente al `INSERT ... RETURNING` de Core
+que usa ahora `insert_rows`. Las filas insertadas se eliminan al terminar cada medición.
+
+Uso:
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.transactions_batch_benchmark --rows 100000 --batch-size 10000
+"""
+import argparse
+import time
+from sqlalchemy import delete
+from app.database.models import Transaction
+from app.database.session import SessionLocal, engine
+from app.services.transactions import insert_rows
+
+
+def build_rows(rows: int) -> list:
+    return [{"amount": float(i % 1000) + 0.5, "description": f"benchmark {i}"} for i in range(rows)]
+
+
+def orm_load(db, batch: list) -> list:
+    transactions = [Transaction(**row) for row in batch]
+    db.add_all(transactions)
+    db.commit()
+    return [transaction.id for transaction in transactions]
+
+
+def core_load(db, batch: list) -> list:
+    ids = insert_rows(db, batch)
+    db.commit()
+    return ids
+
+
+def measure(load, rows: list, batch_size: int) -> float:
+    """
+    Inserta las filas en lotes con `load`, elimina lo insertado y devuelve las filas por segundo.
+    """
+    inserted = []
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        for offset in range(0, len(rows), batch_size):
+            inserted.extend(load(db, rows[offset:offset + batch_size]))
+        elapsed = time.perf_counter() - start
+
+        for offset in range(0, len(inserted), 50000):
+            db.execute(delete(Transaction).where(Transaction.id.in_(inserted[offset:offset + 50000])))
+        db.commit()
+    return len(rows) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    Transaction.__table__.create(engine, checkfirst=True)
+    rows = build_rows(args.rows)
+
+    results = {
+        "ORM add_all": measure(orm_load, rows, args.batch_size),
+        "Core INSERT ... RETURNING": measure(core_load, rows, args.batch_size),
+    }
+    print(f"Motor: {engine.dialect.name}, {args.rows} filas en lotes de {args.batch_size}")
+    for name, rows_per_second in results.items():
+        print(f"{name:>26}: {rows_per_second:,.0f} filas/s")
+    baseline = results["ORM add_all"]
+    print(f"Mejora: {results['Core INSERT ... RETURNING'] / baseline:.1f}x")
+
+
+if __name__ == "__main__":
+    main()